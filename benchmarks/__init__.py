@@ -0,0 +1 @@
+"""Benchmarks for the storage engine. Run them with `make bench`."""
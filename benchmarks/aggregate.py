@@ -0,0 +1,44 @@
+"""Full-table aggregates in one process and on the worker processes.
+
+Usage: uv run python -m benchmarks.aggregate [rows]
+"""
+
+import sys
+
+from core.storage_engine import Tuple
+
+from .common import COLUMNS, Timer, make_row, report, setup
+
+AGGREGATES = {
+    "rows": ("count", None),
+    "total": ("sum", "price"),
+    "first": ("min", "created_at"),
+    "last_id": ("max", "id"),
+}
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 500_000
+    setup()
+
+    table = Tuple("aggregate")
+    table.write_tuples((make_row(i) for i in range(rows)), COLUMNS)
+
+    results = []
+    for parallel in (False, True):
+        name = "parallel" if parallel else "serial"
+        with Timer() as timer:
+            totals = table.aggregate(COLUMNS, AGGREGATES, parallel=parallel)
+        report(f"{name} aggregate", rows, timer.elapsed, "rows")
+        with Timer() as timer:
+            groups = table.aggregate(
+                COLUMNS, AGGREGATES, group_by="active", parallel=parallel
+            )
+        report(f"{name} group by", rows, timer.elapsed, "rows")
+        results.append((totals, groups))
+
+    assert results[0] == results[1]
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+"""Dedup on ingest: checking which keys of a batch are new, by scan and by Bloom filters.
+
+Usage: uv run python -m benchmarks.bloom_filter [rows]
+"""
+
+import sys
+
+from core.storage_engine import Tuple
+
+from .common import COLUMNS, Timer, make_row, report, setup
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 500_000
+    setup()
+
+    table = Tuple("bloom_filter")
+    table.write_tuples((make_row(i) for i in range(rows)), COLUMNS)
+    # a batch of mostly new keys, one in a hundred already stored
+    batch = [rows + i if i % 100 else i for i in range(1_000)]
+
+    with Timer() as timer:
+        wanted = set(batch)
+        stored = {
+            row["id"]
+            for row in table.scan(COLUMNS, names=["id"])
+            if row["id"] in wanted
+        }
+    report("scan membership", len(batch), timer.elapsed, "keys")
+
+    table.create_bloom_filter("id", COLUMNS)
+    with Timer() as timer:
+        found = table.contains_many("id", batch)
+    report("bloom filter membership", len(batch), timer.elapsed, "keys")
+
+    assert found == stored
+    assert len(found) == len(batch) // 100
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Row encode/decode throughput on a wide row.
+
+Usage: uv run python -m benchmarks.codec [rows]
+"""
+
+import datetime
+import sys
+from decimal import Decimal
+
+from core.constants import ROW_FORMAT_COMPACT, ROW_FORMAT_FIXED
+from core.storage_engine.binary import get_codec, pack_row, unpack_row
+
+from . import baseline_codec
+from .common import Timer, report, setup
+
+WIDE_COLUMNS = [
+    (f"{base}_{i}", col_type)
+    for i in range(8)
+    for base, col_type in (
+        ("id", "INTEGER"),
+        ("price", "DECIMAL"),
+        ("name", "VARCHAR(16)"),
+        ("active", "BOOL"),
+        ("created_at", "DATETIME"),
+    )
+]
+
+SAMPLE_VALUES = {
+    "id": 42,
+    "price": Decimal("19.99"),
+    "name": "Abhishek",
+    "active": True,
+    "created_at": datetime.datetime(2025, 10, 28, 12, 0, 0),
+}
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    setup()
+
+    row = {name: SAMPLE_VALUES[name.rsplit("_", 1)[0]] for name, _ in WIDE_COLUMNS}
+    packed = pack_row(row, WIDE_COLUMNS)
+    assert baseline_codec.pack_row(row, WIDE_COLUMNS) == packed
+
+    # the same fixed row format, before and after codecs were compiled per schema
+    for label, pack, unpack in (
+        ("baseline pack_row", baseline_codec.pack_row, baseline_codec.unpack_row),
+        ("pack_row", pack_row, unpack_row),
+    ):
+        with Timer() as timer:
+            for _ in range(rows):
+                pack(row, WIDE_COLUMNS)
+        report(label, rows, timer.elapsed, "rows")
+
+        with Timer() as timer:
+            for _ in range(rows):
+                unpack(packed, WIDE_COLUMNS)
+        report(label.replace("pack_row", "unpack_row"), rows, timer.elapsed, "rows")
+
+    for label, row_format in (
+        ("RowCodec", ROW_FORMAT_FIXED),
+        ("CompactRowCodec", ROW_FORMAT_COMPACT),
+    ):
+        codec = get_codec(WIDE_COLUMNS, row_format)
+        raw = codec.pack(row)
+        print(f"{label} row size: {len(raw)} bytes")
+
+        with Timer() as timer:
+            for _ in range(rows):
+                codec.pack(row)
+        report(f"{label}.pack", rows, timer.elapsed, "rows")
+
+        with Timer() as timer:
+            for _ in range(rows):
+                codec.unpack(raw)
+        report(f"{label}.unpack", rows, timer.elapsed, "rows")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+"""Row-at-a-time scan versus NumPy batch scan, summing one column.
+
+Usage: uv run --extra numpy python -m benchmarks.columnar [rows]
+"""
+
+import sys
+
+from core.storage_engine import Tuple
+
+from .common import COLUMNS, Timer, make_row, report, setup
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 500_000
+    setup()
+
+    table = Tuple("columnar")
+    table.write_tuples((make_row(i) for i in range(rows)), COLUMNS)
+
+    with Timer() as timer:
+        total = sum(row["id"] for row in table.scan(COLUMNS))
+    report("scan + sum", rows, timer.elapsed, "rows")
+
+    with Timer() as timer:
+        batch_total = sum(
+            int(batch["id"].sum()) for batch in table.scan_batches(COLUMNS, ["id"])
+        )
+    report("scan_batches + sum", rows, timer.elapsed, "rows")
+
+    with Timer() as timer:
+        for _ in table.scan_batches(COLUMNS):
+            pass
+    report("scan_batches all columns", rows, timer.elapsed, "rows")
+
+    assert total == batch_total
+
+
+if __name__ == "__main__":
+    main()
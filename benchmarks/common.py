@@ -0,0 +1,50 @@
+import datetime
+import logging
+import os
+import tempfile
+import time
+from decimal import Decimal
+
+from core.utils import logger
+
+COLUMNS = [
+    ("id", "INTEGER"),
+    ("price", "DECIMAL"),
+    ("name", "VARCHAR(20)"),
+    ("active", "BOOL"),
+    ("created_at", "DATETIME"),
+]
+
+
+def make_row(i):
+    """Build the i-th benchmark row for COLUMNS."""
+    return {
+        "id": i,
+        "price": Decimal("19.99"),
+        "name": f"name-{i}",
+        "active": i % 2 == 0,
+        "created_at": datetime.datetime(2025, 10, 28, 12, 0, 0),
+    }
+
+
+def setup():
+    """Silence debug logging and move into a scratch directory for the data files."""
+    logger.setLevel(logging.WARNING)
+    os.chdir(tempfile.mkdtemp(prefix="storage-engine-bench-"))
+
+
+def report(name, count, elapsed, unit="inserts"):
+    """Print one benchmark result line."""
+    rate = count / elapsed if elapsed else float("inf")
+    print(f"{name:<28} {count:>8} {unit:<8} {elapsed:>8.3f}s {rate:>12.1f} {unit}/sec")
+
+
+class Timer:
+    """Context manager measuring wall-clock time in seconds."""
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.start
@@ -0,0 +1,58 @@
+"""Bulk load and scan of uncompressed and compressed relations, with their size on disk.
+
+Usage: uv run python -m benchmarks.compression [rows]
+"""
+
+import os
+import sys
+
+from core.constants import COMPRESSION_LZMA, COMPRESSION_ZLIB, RELATION_FILE_NAME_FORMAT
+from core.storage_engine import Tuple
+
+from .common import COLUMNS, Timer, make_row, report, setup
+
+CODECS = [
+    ("uncompressed", None, 0),
+    ("zlib level 1", COMPRESSION_ZLIB, 1),
+    ("zlib level 6", COMPRESSION_ZLIB, 6),
+    ("lzma level 0", COMPRESSION_LZMA, 0),
+    ("lzma level 6", COMPRESSION_LZMA, 6),
+]
+
+
+def data_size(table):
+    """Return the bytes in the segment files of a table."""
+    prefix = RELATION_FILE_NAME_FORMAT.split("{}")[0]
+    folder = table.page.relation.folder
+    return sum(
+        os.path.getsize(os.path.join(folder, name))
+        for name in os.listdir(folder)
+        if name.startswith(prefix)
+    )
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    setup()
+
+    uncompressed_size = None
+    for name, codec, level in CODECS:
+        table_id = name.replace(" ", "-")
+        table = Tuple(table_id, compression=codec, compression_level=level)
+        with Timer() as timer:
+            table.write_tuples((make_row(i) for i in range(rows)), COLUMNS)
+        report(f"{name} write", rows, timer.elapsed)
+
+        with Timer() as timer:
+            count = sum(1 for _ in table.scan(COLUMNS, names=["id"]))
+        report(f"{name} scan", count, timer.elapsed, "rows")
+
+        size = data_size(table)
+        uncompressed_size = uncompressed_size or size
+        print(
+            f"{name + ' on disk':<28} {size:>8} bytes {uncompressed_size / size:>8.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""Insert throughput for each durability mode.
+
+Usage: uv run python -m benchmarks.durability [rows] [threads]
+"""
+
+import sys
+import threading
+
+from core.constants import DURABILITY_MODES
+from core.storage_engine import Tuple
+
+from .common import COLUMNS, Timer, make_row, report, setup
+
+
+def run_serial(durability, rows):
+    table = Tuple(f"durability-{durability}", durability)
+    with Timer() as timer:
+        for i in range(rows):
+            table.write_tuple(make_row(i), COLUMNS)
+    return timer.elapsed
+
+
+def run_concurrent(durability, rows, threads):
+    per_thread = rows // threads
+    table = Tuple(f"durability-{durability}-concurrent", durability)
+
+    def writer(n):
+        for i in range(per_thread):
+            table.write_tuple(make_row(n * per_thread + i), COLUMNS)
+
+    workers = [threading.Thread(target=writer, args=(n,)) for n in range(threads)]
+    with Timer() as timer:
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+    return timer.elapsed, per_thread * threads
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    setup()
+
+    for durability in DURABILITY_MODES:
+        report(durability, rows, run_serial(durability, rows))
+
+    for durability in DURABILITY_MODES:
+        elapsed, count = run_concurrent(durability, rows, threads)
+        report(f"{durability} x{threads} threads", count, elapsed)
+
+
+if __name__ == "__main__":
+    main()
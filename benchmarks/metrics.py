@@ -0,0 +1,45 @@
+"""Cost of the storage metrics: inserts and scans with metrics disabled and enabled.
+
+Usage: uv run python -m benchmarks.metrics [rows]
+"""
+
+import sys
+
+from core.constants import DURABILITY_ASYNC
+from core.storage_engine import Tuple
+from core.utils import metrics
+
+from .common import COLUMNS, Timer, make_row, report, setup
+
+
+def run(label, rows):
+    table = Tuple(f"metrics-{label}", durability=DURABILITY_ASYNC)
+    with Timer() as timer:
+        for i in range(rows):
+            table.write_tuple(make_row(i), COLUMNS)
+    report(f"insert, metrics {label}", rows, timer.elapsed)
+    with Timer() as timer:
+        count = sum(1 for _ in table.scan(COLUMNS))
+    report(f"scan, metrics {label}", count, timer.elapsed, "rows")
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    setup()
+
+    metrics.disable()
+    run("disabled", rows)
+    metrics.reset()
+    metrics.enable()
+    run("enabled", rows)
+
+    snapshot = metrics.snapshot()
+    for name, value in sorted(snapshot["counters"].items()):
+        print(f"{name:<28} {value:>12}")
+    for name, histogram in sorted(snapshot["histograms"].items()):
+        mean = histogram["sum"] / histogram["count"] * 1e6
+        print(f"{name:<28} {histogram['count']:>12} calls {mean:>10.1f}µs mean")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""Range scans with conditions, without and with a zone map on the filtered column.
+
+Usage: uv run python -m benchmarks.zone_map [rows]
+"""
+
+import sys
+
+from core.storage_engine import Tuple
+
+from .common import COLUMNS, Timer, make_row, report, setup
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 500_000
+    setup()
+
+    table = Tuple("zone_map")
+    table.write_tuples((make_row(i) for i in range(rows)), COLUMNS)
+    # one percent of the rows, stored together since ids grow with every insert
+    where = [("id", "between", (rows // 2, rows // 2 + rows // 100 - 1))]
+
+    results = []
+    for zoned in (False, True):
+        if zoned:
+            table.create_zone_map("id", COLUMNS)
+        name = "zone map" if zoned else "no zone map"
+        with Timer() as timer:
+            matches = sum(1 for _ in table.scan(COLUMNS, names=["id"], where=where))
+        report(f"{name} scan", rows, timer.elapsed, "rows")
+        with Timer() as timer:
+            totals = table.aggregate(
+                COLUMNS, {"total": ("sum", "price")}, where=where, parallel=False
+            )
+        report(f"{name} aggregate", rows, timer.elapsed, "rows")
+        results.append((matches, totals))
+
+    assert results[0] == results[1]
+    assert results[0][0] == rows // 100
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,125 @@
 # Common
 PAGE_SIZE = 8 * 1024
+DATA_FOLDER = "./data"
+
+# File storage
+MAX_OPEN_FILES = 64  # descriptors kept open by FileStorage before LRU closing
+
+# Durability
+DURABILITY_FSYNC = "fsync"  # fsync every file touched by a commit before returning
+DURABILITY_FDATASYNC = "fdatasync"  # like fsync, but skip flushing file metadata
+DURABILITY_GROUP = "group"  # concurrent commits wait for one shared fsync
+DURABILITY_ASYNC = "async"  # commits return at once, a background thread fsyncs
+DURABILITY_MODES = (
+    DURABILITY_FSYNC,
+    DURABILITY_FDATASYNC,
+    DURABILITY_GROUP,
+    DURABILITY_ASYNC,
+)
+GROUP_COMMIT_WINDOW = 0.002  # seconds a group commit waits for more commits
+GROUP_COMMIT_BYTES = 1024 * 1024  # sync a group early once this much is pending
+ASYNC_FLUSH_INTERVAL = 0.2  # seconds between background flushes in async mode
 
 # Relation
 META_FORMAT = "<HHIQQQ"  # version, page_size, segment_count, total_pages, tail_page_id, created_at
-RELATION_FILE_VERSION = 1
+RELATION_FILE_VERSION = 2  # version 1 relations cannot be read, see RelationHandle
 RELATION_METADATA_FILE_NAME = "metadata.pydb"
+RELATION_FILE_NAME_FORMAT = "data{}.pydb"  # segments are data1.pydb, data2.pydb, ...
+RELATION_SEGMENT_SIZE = 1024 * 1024 * 1024  # 1GB per segment, a multiple of PAGE_SIZE
+SCAN_WORKERS = 4  # threads used by parallel segment scans
+
+# Rows
+ROW_FORMAT_FIXED = 1  # every column at a fixed offset, VARCHAR(n) padded to n bytes
+ROW_FORMAT_COMPACT = 2  # null bitmap, fixed-width columns, then variable-length values
+ROW_OFFSET_FORMAT = "H"  # entries of the offset array of a compact row
+
+# Compression
+COMPRESSION_ZLIB = "zlib"
+COMPRESSION_LZMA = "lzma"
+COMPRESSION_CODECS = (COMPRESSION_ZLIB, COMPRESSION_LZMA)
+COMPRESSION_LEVEL = 6  # zlib level or lzma preset, 0 (fastest) to 9 (smallest)
+PAGE_MAP_FILE_NAME = "pagemap.pydb"  # page -> extent map of a compressed relation
+PAGE_MAP_HEADER_FORMAT = "<H8sB"  # version, codec, level
+PAGE_MAP_ENTRY_FORMAT = "<QI"  # extent offset, stored length (0: no extent)
+PAGE_MAP_VERSION = 1
+EXTENT_ALIGN = 512  # extents are allocated in multiples of this many bytes
+
+# Free space map
+FSM_FILE_NAME = "fsm.pydb"
+FSM_CATEGORIES = 256  # one byte per page, category c means >= c * PAGE_SIZE / 256 free
+
+# Zone maps
+ZONE_MAP_FILE_NAME = "zonemap.pydb"  # min and max of selected columns in every page
+ZONE_MAP_HEADER_FORMAT = "<HBHI"  # version, clean, column_count, page_count
+ZONE_MAP_COLUMN_FORMAT = "<64s16sHH"  # column, key_type, key_offset, null_bit
+ZONE_MAP_VERSION = 1
+
+# Bloom filters
+BLOOM_FILE_NAME_FORMAT = "bloom_{}.pydb"  # page Bloom filters of one column per file
+BLOOM_HEADER_FORMAT = "<HB16sHHHBHI"  # version, clean, key_type, key_offset, null_bit, key_length, hash_count, filter_bytes, page_count
+BLOOM_FILTER_BYTES = 512  # filter size of one page, 0.03% false positives at 200 keys
+BLOOM_HASH_COUNT = 6  # bits set per key
+BLOOM_VERSION = 1
+
+# Index
+INDEX_META_FORMAT = "<HHBIQ16s64sH"  # version, key_offset, clean, total_pages, entry_count, key_type, column, null_bit
+INDEX_VERSION = 1
+INDEX_NODE_HEADER_FORMAT = "<BHI"  # kind, count, link (next page or leftmost child)
+INDEX_BTREE = "btree"
+INDEX_HASH = "hash"
+BTREE_FILE_NAME_FORMAT = "index_{}.pydb"  # one B+tree file per indexed column
+BTREE_META_FORMAT = "<I"  # root_page_id
+BTREE_FILL_FACTOR = 0.9  # how full bulk-built B+tree nodes are
+HASH_FILE_NAME_FORMAT = "hash_{}.pydb"  # one hash index file per indexed column
+HASH_META_FORMAT = (
+    "<HIIII32I"  # key_length, max_bucket, low_mask, high_mask, free_page, spares
+)
+HASH_FILL_FACTOR = 0.75  # split a bucket once buckets are this full on average
 
 # Page
 PAGE_HEADER_FORMAT = (
-    "<IHHHIQ"  # page_id, lower, upper, free_space, tuple_count, created_at
+    "<IHHHIQQ"  # page_id, lower, upper, free_space, tuple_count, created_at, lsn
+)
+SLOT_FORMAT = "<HH"  # tuple offset, tuple length with the slot state in the top 2 bits
+SLOT_NORMAL = 0  # a tuple stored in its home slot
+SLOT_MOVED = 1  # a tuple moved here by an update, prefixed with its home location
+SLOT_REDIRECT = 2  # the home slot of a moved tuple, holds the location it moved to
+SLOT_DEAD = 3  # a deleted tuple, the slot is reused by later inserts
+PAGE_COMPACT_THRESHOLD = 0.2  # compact a page once this share of it is dead space
+BULK_WRITE_SIZE = 1024 * 1024  # bulk inserts write new pages in runs of this size
+READAHEAD_PAGES = 32  # pages read per syscall by sequential scans
+SCAN_BATCH_SIZE = 65536  # rows per batch returned by columnar batch scans
+
+# Out-of-line storage
+TOAST_FOLDER_NAME = (
+    "toast"  # toast relation of a table, a folder inside the table folder
 )
-SLOT_FORMAT = "<H"  # 2 bytes offset to tuple start
+TOAST_THRESHOLD = PAGE_SIZE // 4  # rows larger than this move TEXT values out of line
+TOAST_POINTER_FORMAT = "<IHQ"  # first chunk page_id, first chunk slot_id, value length
+
+# Buffer pool
+BUFFER_POOL_SIZE = 16 * 1024 * 1024  # 16MB of page frames shared by all relations
+
+# Async API
+ASYNC_IO_WORKERS = 4  # threads running the blocking storage calls of AsyncTuple
+ASYNC_SCAN_CHUNK = 1024  # rows an async scan fetches per executor call
+
+# Parallel aggregates
+AGGREGATE_WORKERS = (
+    None  # worker processes shared by parallel aggregates, None: one per CPU
+)
+AGGREGATE_CHUNK_PAGES = 1024  # pages a worker aggregates per task
+AGGREGATE_START_METHOD = (
+    "spawn"  # workers start fresh, forking a threaded process is unsafe
+)
+
+# Write-ahead log
+WAL_FILE_NAME = "wal.pydb"
+WAL_HEADER_FORMAT = "<HQ"  # version, start_lsn
+WAL_VERSION = 1
+WAL_RECORD_FORMAT = "<IIBQHH"  # length, crc32, type, page_id, slot, table_id length
+WAL_INSERT = 1  # payload is the tuple data inserted at slot of page_id
+WAL_UPDATE = 2  # payload is the new slot state byte and the data stored at slot
+WAL_DELETE = 3  # no payload, slot of page_id is marked dead
+WAL_COMPACT = 4  # no payload, page_id is compacted
+WAL_CHECKPOINT_SIZE = 16 * 1024 * 1024  # checkpoint once the log grows past this
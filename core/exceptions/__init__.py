@@ -7,6 +7,7 @@ from .exceptions import (
     FileCorruptionError,
     DirectoryAccessError,
     CurrentlyNotSupported,
+    BufferPoolExhausted,
 )
 
 __all__ = [
@@ -16,4 +17,5 @@ __all__ = [
     "FileCorruptionError",
     "DirectoryAccessError",
     "CurrentlyNotSupported",
+    "BufferPoolExhausted",
 ]
@@ -35,3 +35,7 @@ class CurrentlyNotSupported(StorageException):
     """Raised when some feature is not yet supported"""
 
     pass
+
+
+class BufferPoolExhausted(StorageException):
+    """Raised when every frame in the buffer pool is pinned and none can be evicted."""
@@ -1 +1,4 @@
+from .async_tuple import AsyncTuple as AsyncTuple
+from .buffer_pool import BufferPool as BufferPool
+from .buffer_pool import buffer_pool as buffer_pool
 from .tuple import Tuple as Tuple
@@ -0,0 +1,401 @@
+import itertools
+import multiprocessing
+import operator
+import os
+import struct
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from core.constants import (
+    AGGREGATE_CHUNK_PAGES,
+    AGGREGATE_START_METHOD,
+    AGGREGATE_WORKERS,
+    PAGE_SIZE,
+    READAHEAD_PAGES,
+    SLOT_NORMAL,
+    TOAST_FOLDER_NAME,
+)
+from core.utils import logger
+
+from .binary import ToastPointer, get_codec
+from .file_manager import FileStorage
+from .page import (
+    LOCATION_FORMAT,
+    home_slot,
+    is_uninitialized,
+    moved_offset,
+    page_runs,
+    page_tuples,
+)
+from .page_map import page_maps, page_maps_lock
+from .predicate import Predicate
+from .relation import open_relation
+from .toast import read_value
+
+# function -> (lift(value), combine(state, state), finish(state)), states start as None
+FUNCTIONS = {
+    "count": (lambda value: 1, operator.add, lambda state: state or 0),
+    "sum": (lambda value: value, operator.add, lambda state: state),
+    "min": (lambda value: value, min, lambda state: state),
+    "max": (lambda value: value, max, lambda state: state),
+    "avg": (
+        lambda value: (value, 1),
+        lambda a, b: (a[0] + b[0], a[1] + b[1]),
+        lambda state: None if state is None else state[0] / state[1],
+    ),
+}
+NUMERIC_FUNCTIONS = ("sum", "avg")
+NUMERIC_TYPES = ("integer", "decimal")
+
+# Worker processes shared by every parallel aggregate, started on first use
+executor = None
+executor_lock = threading.Lock()
+snapshots = itertools.count()
+
+
+def get_executor():
+    """Return the shared pool of AGGREGATE_WORKERS processes, starting it on first use."""
+    global executor
+    with executor_lock:
+        if executor is None:
+            executor = ProcessPoolExecutor(
+                max_workers=AGGREGATE_WORKERS,
+                mp_context=multiprocessing.get_context(AGGREGATE_START_METHOD),
+                initializer=logger.setLevel,
+                initargs=(logger.level,),
+            )
+        return executor
+
+
+class AggregateQuery:
+    """Computes aggregates over the tuples of a relation, optionally in parallel.
+
+    A query filters tuples with a conjunction of `(column, operator, value)`
+    conditions, see Predicate, groups them on one column and computes count, sum,
+    min, max and avg aggregates per group. Conditions on fixed-width columns are
+    checked before a tuple is decoded, and only the columns the query uses are
+    decoded. NULLs never match a condition and are skipped by the aggregates, except
+    count(*).
+
+    Every aggregate keeps a partial state that merges with the state of another part
+    of the relation, so the page range can be split into chunks of
+    AGGREGATE_CHUNK_PAGES pages that are aggregated on their own. run_parallel hands
+    the chunks to a shared pool of worker processes, sidestepping the GIL: workers
+    open the relation files themselves, read their pages without the buffer pool and
+    send back only the partial states, which the caller merges. The relation must be
+    flushed first, see Page.flush. Workers are spawned, so a script using parallel
+    aggregates must guard its entry point with `if __name__ == "__main__":`.
+    """
+
+    def __init__(self, columns, row_format, aggregates, group_by=None, where=None):
+        """Compile a query for a schema.
+
+        Args:
+            columns (list): The (name, type) pairs of the schema.
+            row_format (int): Format of the rows, see Relation.row_format.
+            aggregates (dict): {result_name: (function, column)} where function is one
+                of FUNCTIONS and column is None for count(*).
+            group_by (str, optional): Column to group on. Defaults to None (one group).
+            where (Iterable[tuple], optional): (column, operator, value) conditions that
+                must all hold, see Predicate. Defaults to None.
+
+        Raises:
+            KeyError: If a column is not in the schema.
+            ValueError: If a function or operator is unknown, or there are no aggregates.
+            TypeError: If sum or avg is asked of a column that is not a number.
+        """
+        self.codec = get_codec(columns, row_format)
+        self.aggregates = dict(aggregates)
+        self.group_by = group_by
+        if not self.aggregates:
+            raise ValueError("An aggregate query needs at least one aggregate")
+        self.predicate = Predicate(self.codec, where)
+        self.where = self.predicate.conditions
+
+        used = list(self.predicate.columns)
+        for function, column in self.aggregates.values():
+            if function not in FUNCTIONS:
+                raise ValueError(
+                    f"Unknown aggregate function {function!r}, expected one of {tuple(FUNCTIONS)}"
+                )
+            if column is None:
+                if function != "count":
+                    raise ValueError(f"Aggregate {function} needs a column")
+                continue
+            self.__check_column(column)
+            base_type = self.codec.base_types[self.codec.names.index(column)]
+            if function in NUMERIC_FUNCTIONS and base_type not in NUMERIC_TYPES:
+                raise TypeError(
+                    f"Cannot compute {function} of {base_type.upper()} column '{column}'"
+                )
+            used.append(column)
+        if group_by is not None:
+            used.append(group_by)
+        for column in used:
+            self.__check_column(column)
+        # the columns decoded from every tuple
+        self.names = tuple(dict.fromkeys(used))
+
+    def __check_column(self, column):
+        if column not in self.codec.names:
+            raise KeyError(f"Unknown column '{column}'")
+
+    def __reduce__(self):
+        # codecs do not pickle, workers compile the query again
+        return (
+            AggregateQuery,
+            (
+                self.codec.columns,
+                self.codec.row_format,
+                self.aggregates,
+                self.group_by,
+                self.where,
+            ),
+        )
+
+    def partial(self, pages, fetch):
+        """Aggregate the tuples of some pages into partial states.
+
+        Args:
+            pages (Iterable[tuple]): (page_id, page) pairs, e.g. from Page.scan_pages.
+            fetch (Callable): Returns the bytes of a TEXT value stored out of line from
+                its ToastPointer, like ToastStore.fetch.
+
+        Returns:
+            dict: {group_value: [state of every aggregate]}, with the group value None
+                when the query has no group_by.
+        """
+        codec = self.codec
+        names = self.names
+        texts = [name for name in codec.text_names if name in names]
+        predicate = self.predicate
+        steps = [
+            (FUNCTIONS[function][0], FUNCTIONS[function][1], column)
+            for function, column in self.aggregates.values()
+        ]
+        group_by = self.group_by
+        groups = {}
+
+        for page_id, page in pages:
+            for _, _, offset, _ in page_tuples(page_id, page):
+                if not predicate.matches_raw(page, offset):
+                    continue
+                row = codec.unpack(page, offset, names) if names else {}
+                for name in texts:
+                    if isinstance(row[name], ToastPointer):
+                        row[name] = fetch(row[name]).decode("utf-8")
+                if not predicate.matches(row):
+                    continue
+
+                key = None if group_by is None else row[group_by]
+                states = groups.get(key)
+                if states is None:
+                    states = groups[key] = [None] * len(steps)
+                for i, (lift, combine, column) in enumerate(steps):
+                    value = True if column is None else row[column]
+                    if value is None:
+                        continue
+                    value = lift(value)
+                    states[i] = (
+                        value if states[i] is None else combine(states[i], value)
+                    )
+        return groups
+
+    def merge(self, groups, partial):
+        """Merge partial states into the states of the groups seen so far.
+
+        Args:
+            groups (dict): {group_value: states}, updated in place.
+            partial (dict): {group_value: states} from partial.
+        """
+        combines = [FUNCTIONS[function][1] for function, _ in self.aggregates.values()]
+        for key, states in partial.items():
+            merged = groups.get(key)
+            if merged is None:
+                groups[key] = states
+                continue
+            for i, combine in enumerate(combines):
+                if merged[i] is None:
+                    merged[i] = states[i]
+                elif states[i] is not None:
+                    merged[i] = combine(merged[i], states[i])
+
+    def finish(self, groups):
+        """Turn the merged states into results.
+
+        Args:
+            groups (dict): {group_value: states}.
+
+        Returns:
+            dict: {result_name: value} without group_by, otherwise
+                {group_value: {result_name: value}} for every group with tuples.
+        """
+        if self.group_by is None:
+            return self.__results(groups.get(None, [None] * len(self.aggregates)))
+        return {key: self.__results(states) for key, states in groups.items()}
+
+    def __results(self, states):
+        return {
+            name: FUNCTIONS[function][2](state)
+            for (name, (function, _)), state in zip(self.aggregates.items(), states)
+        }
+
+    def run(self, pages, fetch):
+        """Run the query in this process, see partial.
+
+        Returns:
+            dict: The results, see finish.
+        """
+        return self.finish(self.partial(pages, fetch))
+
+    def run_parallel(
+        self,
+        table_id,
+        total_pages,
+        chunk_pages=AGGREGATE_CHUNK_PAGES,
+        page_filter=None,
+    ):
+        """Run the query on the worker processes, one chunk of pages at a time.
+
+        Pages the page filter rejects are left out of the chunks, and a chunk left with
+        no pages is not sent to the workers.
+
+        Args:
+            table_id (str): The table, already flushed.
+            total_pages (int): Number of pages of the relation.
+            chunk_pages (int, optional): Pages per task. Defaults to AGGREGATE_CHUNK_PAGES.
+            page_filter (Callable, optional): Returns whether to read a page from its ID,
+                see Page.zone_filter. Defaults to None (every page).
+
+        Returns:
+            dict: The results, see finish.
+
+        Raises:
+            RuntimeError: If a worker hits an unrecoverable I/O error.
+        """
+        chunk_pages = max(1, chunk_pages)
+        snapshot = next(snapshots)
+        cwd = os.getcwd()
+        logger.debug(
+            "AggregateQuery: Aggregating %s pages of %s in chunks of %s",
+            total_pages,
+            table_id,
+            chunk_pages,
+        )
+        chunks = (
+            list(
+                page_runs(
+                    first_page_id,
+                    min(first_page_id + chunk_pages, total_pages),
+                    page_filter,
+                )
+            )
+            for first_page_id in range(0, total_pages, chunk_pages)
+        )
+        pool = get_executor()
+        futures = [
+            pool.submit(aggregate_chunk, self, table_id, cwd, snapshot, runs)
+            for runs in chunks
+            if runs
+        ]
+        groups = {}
+        try:
+            for future in as_completed(futures):
+                self.merge(groups, future.result())
+        finally:
+            for future in futures:
+                future.cancel()
+        return self.finish(groups)
+
+
+# Relations opened by a worker process, valid for one snapshot, see aggregate_chunk
+worker_snapshot = None
+worker_relations = {}
+
+
+def aggregate_chunk(query, table_id, cwd, snapshot, runs):
+    """Aggregate runs of pages of a relation in a worker process, see AggregateQuery.
+
+    Args:
+        query (AggregateQuery): The query.
+        table_id (str): The table.
+        cwd (str): Working directory of the caller, where the data folder is.
+        snapshot (int): Identifies the flush of the relation by the caller.
+        runs (list): (first_page_id, last_page_id) of every run of consecutive pages
+            to aggregate, the last page excluded.
+
+    Returns:
+        dict: The partial states, see AggregateQuery.partial.
+    """
+    global worker_snapshot
+    if snapshot != worker_snapshot:
+        # the caller flushed again, page maps and descriptors opened before may be stale
+        os.chdir(cwd)
+        with page_maps_lock:
+            page_maps.clear()
+        FileStorage.descriptors.close_all()
+        worker_relations.clear()
+        worker_snapshot = snapshot
+
+    relation = worker_relation(table_id)
+    toast_id = os.path.join(table_id, TOAST_FOLDER_NAME)
+
+    def fetch(pointer):
+        toast = worker_relation(toast_id)
+        return read_value(
+            lambda page_id, slot_id: view_stored_tuple(toast, page_id, slot_id),
+            pointer,
+        )
+
+    pages = itertools.chain.from_iterable(
+        read_pages(relation, first_page_id, last_page_id)
+        for first_page_id, last_page_id in runs
+    )
+    return query.partial(pages, fetch)
+
+
+def worker_relation(table_id):
+    """Return a relation opened by the worker process, opening it on first use."""
+    relation = worker_relations.get(table_id)
+    if relation is None:
+        relation = worker_relations[table_id] = open_relation(table_id)
+    return relation
+
+
+def read_pages(relation, first_page_id, last_page_id, readahead=READAHEAD_PAGES):
+    """Iterate over a range of pages read straight from the relation files.
+
+    Like Page.scan_pages, without the buffer pool.
+
+    Yields:
+        tuple: (page_id, page) where page is a read-only buffer of PAGE_SIZE bytes.
+    """
+    start = first_page_id
+    while start < last_page_id:
+        count = min(readahead, last_page_id - start)
+        chunk = memoryview(relation.read_data(start * PAGE_SIZE, count * PAGE_SIZE))
+        for i in range(count):
+            page = chunk[i * PAGE_SIZE : (i + 1) * PAGE_SIZE]
+            if len(page) < PAGE_SIZE or is_uninitialized(page):
+                continue
+            yield start + i, page
+        start += count
+
+
+def view_stored_tuple(relation, page_id, slot_id):
+    """Find the data of a tuple in the relation files, like Page.view_tuple.
+
+    Raises:
+        KeyError: If there is no tuple at the location.
+    """
+    page = relation.read_data(page_id * PAGE_SIZE, PAGE_SIZE)
+    offset, _, state = home_slot(page, page_id, slot_id)
+    if state == SLOT_NORMAL:
+        return page, offset
+
+    moved_page_id, moved_slot_id = struct.unpack_from(LOCATION_FORMAT, page, offset)
+    moved_page = relation.read_data(moved_page_id * PAGE_SIZE, PAGE_SIZE)
+    offset = moved_offset(moved_page, moved_slot_id, page_id, slot_id)
+    if offset is None:
+        raise KeyError(f"No tuple at page {page_id} slot {slot_id}")
+    return moved_page, offset
@@ -0,0 +1,215 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from core.constants import (
+    ASYNC_IO_WORKERS,
+    ASYNC_SCAN_CHUNK,
+    COMPRESSION_LEVEL,
+    DURABILITY_FSYNC,
+    READAHEAD_PAGES,
+)
+from core.exceptions import StorageException
+from core.utils import logger
+
+from .tuple import Tuple
+
+# Executor running the blocking calls of every AsyncTuple, started on first use
+executor = None
+executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Return the shared executor of ASYNC_IO_WORKERS threads, starting it on first use."""
+    global executor
+    with executor_lock:
+        if executor is None:
+            executor = ThreadPoolExecutor(
+                max_workers=ASYNC_IO_WORKERS, thread_name_prefix="aio"
+            )
+        return executor
+
+
+async def run_blocking(func, *args):
+    """Run a blocking function on the shared executor and await its result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(), func, *args)
+
+
+class AsyncTuple:
+    """An asyncio façade over Tuple.
+
+    Every blocking call of Tuple, file I/O and fsyncs included, runs on a shared
+    executor of ASYNC_IO_WORKERS threads, so the event loop never waits on the disk.
+    The executor is bounded: a burst of requests queues up instead of starting more
+    threads. Calls on one table run concurrently on the executor threads, see Page.
+
+    Reads of one page that are awaited at the same time are coalesced. The first read
+    of a page schedules a job for it, reads issued before the job starts join it, and
+    the job reads the page once and answers all of them.
+
+    Open a table with `await AsyncTuple.open(table_id)`.
+    """
+
+    def __init__(self, table):
+        """Wrap an open Tuple. See open.
+
+        Args:
+            table (Tuple): The table.
+        """
+        self.table = table
+        self.pending_reads = {}  # page_id -> [(slot_id, columns, names, future)]
+        self.read_jobs = set()
+
+    @classmethod
+    async def open(
+        cls,
+        table_id,
+        durability=DURABILITY_FSYNC,
+        use_mmap=False,
+        compression=None,
+        compression_level=COMPRESSION_LEVEL,
+    ):
+        """Open a table, creating its relation if needed, without blocking the loop.
+
+        Args:
+            table_id (str): The unique identifier for the table.
+            durability (str, optional): Durability mode of the table. Defaults to DURABILITY_FSYNC.
+            use_mmap (bool, optional): Read the relation through a memory mapping. Defaults to False.
+            compression (str, optional): Codec of a new relation. Defaults to None.
+            compression_level (int, optional): Compression level of a new relation.
+                Defaults to COMPRESSION_LEVEL.
+
+        Returns:
+            AsyncTuple: The table.
+        """
+        table = await run_blocking(
+            Tuple, table_id, durability, use_mmap, compression, compression_level
+        )
+        return cls(table)
+
+    async def __run(self, func, *args):
+        """Run a Tuple call on the executor."""
+        return await run_blocking(func, *args)
+
+    async def read_tuple(self, page_id, slot_id, columns, names=None):
+        """Read a tuple, see Tuple.read_tuple.
+
+        Raises:
+            KeyError: If there is no tuple at the location.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        requests = self.pending_reads.get(page_id)
+        if requests is None:
+            requests = self.pending_reads[page_id] = []
+            job = loop.create_task(self.__read_page(page_id))
+            self.read_jobs.add(job)
+            job.add_done_callback(self.read_jobs.discard)
+        requests.append((slot_id, columns, names, future))
+        return await future
+
+    async def __read_page(self, page_id):
+        """Answer every read of a page issued so far with one executor call and one page view."""
+        requests = self.pending_reads.pop(page_id)
+        logger.debug("AsyncTuple: Reading %s tuples of page %s", len(requests), page_id)
+
+        def read_all():
+            page = self.table.page.view_page(page_id)
+            results = []
+            for slot_id, columns, names, _ in requests:
+                try:
+                    row = self.table.read_tuple(page_id, slot_id, columns, names, page)
+                    results.append((row, None))
+                except (KeyError, RuntimeError, StorageException) as e:
+                    results.append((None, e))
+            return results
+
+        try:
+            results = await self.__run(read_all)
+        except (RuntimeError, StorageException) as e:
+            results = [(None, e)] * len(requests)
+        except BaseException:
+            # cancel the reads rather than leave them waiting forever
+            for _, _, _, future in requests:
+                future.cancel()
+            raise
+        for (_, _, _, future), (row, error) in zip(requests, results):
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(row)
+
+    async def write_tuple(self, record: dict, columns: list[dict]):
+        """Insert a tuple and commit, see Tuple.write_tuple.
+
+        Returns:
+            tuple: (page_id, slot_id) of the new tuple.
+        """
+        return await self.__run(self.table.write_tuple, record, columns)
+
+    async def write_tuples(self, records, columns: list[dict]):
+        """Insert many tuples and commit once, see Tuple.write_tuples.
+
+        Returns:
+            list: (page_id, slot_id) of every new tuple, in order.
+        """
+        return await self.__run(self.table.write_tuples, records, columns)
+
+    async def update_tuple(self, page_id, slot_id, record: dict, columns: list[dict]):
+        """Replace a tuple and commit, see Tuple.update_tuple."""
+        return await self.__run(
+            self.table.update_tuple, page_id, slot_id, record, columns
+        )
+
+    async def delete_tuple(self, page_id, slot_id, columns: list[dict]):
+        """Delete a tuple and commit, see Tuple.delete_tuple."""
+        return await self.__run(self.table.delete_tuple, page_id, slot_id, columns)
+
+    async def scan(
+        self,
+        columns,
+        readahead=READAHEAD_PAGES,
+        names=None,
+        chunk_size=ASYNC_SCAN_CHUNK,
+        where=None,
+    ):
+        """Iterate over every tuple, see Tuple.scan.
+
+        Rows are fetched chunk_size at a time on the executor, one chunk at a time.
+
+        Args:
+            columns (list): The (name, type) pairs of the schema.
+            readahead (int, optional): Pages read per syscall. Defaults to READAHEAD_PAGES.
+            names (Iterable[str], optional): Columns to return. Defaults to None (every column).
+            chunk_size (int, optional): Rows fetched per executor call. Defaults to ASYNC_SCAN_CHUNK.
+            where (Iterable[tuple], optional): (column, operator, value) conditions rows
+                must all match, see Predicate. Defaults to None.
+
+        Yields:
+            dict: {column_name: value} for every matching tuple.
+        """
+        rows = self.table.scan(columns, readahead, names, where)
+        lock = threading.Lock()
+
+        def fetch():
+            with lock:
+                return list(islice(rows, chunk_size))
+
+        def close():
+            with lock:
+                rows.close()
+
+        try:
+            while True:
+                chunk = await self.__run(fetch)
+                if not chunk:
+                    return
+                for row in chunk:
+                    yield row
+        finally:
+            # a chunk may still be fetched on the executor, close the scan after it
+            await self.__run(close)
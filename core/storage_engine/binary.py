@@ -1,8 +1,533 @@
 import struct
+from collections import namedtuple
 from decimal import Decimal
-from datetime import date, datetime, timedelta
+from datetime import date, datetime
+from functools import lru_cache
 import re
 
+from core.constants import (
+    ROW_FORMAT_COMPACT,
+    ROW_FORMAT_FIXED,
+    ROW_OFFSET_FORMAT,
+    TOAST_POINTER_FORMAT,
+    TOAST_THRESHOLD,
+)
+
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+# set in the stored length of a TEXT value that was moved out of line
+TOAST_FLAG = 1 << 31
+TOAST_POINTER_SIZE = struct.calcsize(TOAST_POINTER_FORMAT)
+
+ROW_OFFSET_SIZE = struct.calcsize("<" + ROW_OFFSET_FORMAT)
+# set in the end offset of a compact row value that was moved out of line
+VAR_TOAST_FLAG = 1 << (8 * ROW_OFFSET_SIZE - 1)
+VAR_OFFSET_MASK = VAR_TOAST_FLAG - 1
+# set in the key offset of a variable-length column, which points into the offset array
+VARIABLE_KEY = 1 << 15
+# the null bit of columns that cannot be NULL
+NO_NULL_BIT = 0xFFFF
+
+# A TEXT value stored out of line: where its first chunk is and its length in bytes
+ToastPointer = namedtuple("ToastPointer", ["page_id", "slot_id", "length"])
+
+FIXED_FORMATS = {
+    "integer": "q",
+    "decimal": "d",
+    "bool": "?",
+    "date": "i",
+    "datetime": "q",
+}
+
+
+def parse_column_type(col_name, col_type):
+    """Split a column type like "VARCHAR(20)" into its base type and optional length.
+
+    Args:
+        col_name (str): The column name, used in error messages.
+        col_type (str): The column type.
+
+    Returns:
+        tuple: (base_type, length) with base_type lower-cased and length None if absent.
+
+    Raises:
+        TypeError: If the type is invalid or unsupported.
+        ValueError: If a VARCHAR column has no length.
+    """
+    col_type = col_type.lower().strip()
+
+    match = re.match(r"([a-z]+)(?:\((\d+)\))?", col_type)
+    if not match:
+        raise TypeError(f"Invalid column type: {col_type}")
+
+    base_type = match.group(1)
+    length = int(match.group(2)) if match.group(2) else None
+
+    if base_type not in FIXED_FORMATS and base_type not in ("varchar", "text"):
+        raise TypeError(f"Unsupported column type: {col_type}")
+    if base_type == "varchar" and length is None:
+        raise ValueError(f"VARCHAR column '{col_name}' requires length")
+
+    return base_type, length
+
+
+def _encode_decimal(value):
+    return float(Decimal(value)) if isinstance(value, str) else float(value)
+
+
+def _encode_date(value):
+    if isinstance(value, str):
+        value = date.fromisoformat(value)
+    return value.toordinal() - EPOCH_ORDINAL
+
+
+def _encode_datetime(value):
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return int(value.timestamp())
+
+
+def _decode_decimal(value):
+    return Decimal(str(value))
+
+
+def _decode_date(value):
+    return date.fromordinal(EPOCH_ORDINAL + value)
+
+
+def _decode_varchar(value):
+    return value.rstrip(b"\x00").decode("utf-8")
+
+
+ENCODERS = {
+    "integer": int,
+    "decimal": _encode_decimal,
+    "bool": bool,
+    "date": _encode_date,
+    "datetime": _encode_datetime,
+}
+
+DECODERS = {
+    "decimal": _decode_decimal,
+    "date": _decode_date,
+    "datetime": datetime.fromtimestamp,
+    "varchar": _decode_varchar,
+}
+
+
+def varchar_encoder(col_name, length):
+    """Return a function encoding VARCHAR(length) values to UTF-8, checking their length."""
+
+    def encode(value):
+        encoded = value.encode("utf-8")
+        if len(encoded) > length:
+            raise ValueError(f"Value too long for column '{col_name}' (max {length})")
+        return encoded  # struct pads it to the column length with NULs
+
+    return encode
+
+
+class RowCodec:
+    """Packs and unpacks rows of one schema in ROW_FORMAT_FIXED with a precompiled struct.
+
+    A row starts with a fixed-length section holding every column in order, where a
+    TEXT column stores only its byte length. The TEXT bytes follow the fixed section
+    in column order. The layout is parsed once per schema; packing a row is then one
+    Struct.pack plus cheap per-column conversions. A TEXT value moved out of line (see
+    pack) is replaced by a pointer to it, and TOAST_FLAG is set in its stored length.
+    Columns cannot be NULL.
+
+    Attributes:
+        columns (tuple): The (name, type) pairs of the schema.
+        names (tuple): Column names in order.
+        base_types (tuple): Lower-cased base type of every column.
+        lengths (tuple): Declared length of every column, None if it has none.
+        fixed (struct.Struct): Struct of the fixed-length section.
+        offsets (tuple): Offset of every column inside the fixed-length section.
+        key_offsets (tuple): Where indexes find every column, the same as offsets.
+        null_bits (tuple): NO_NULL_BIT for every column.
+        text_names (tuple): Names of the TEXT columns.
+    """
+
+    row_format = ROW_FORMAT_FIXED
+
+    def __init__(self, columns):
+        """Compile the codec for a schema.
+
+        Args:
+            columns (Iterable[tuple]): List of (name, type) pairs.
+
+        Raises:
+            TypeError: If a column type is invalid or unsupported.
+            ValueError: If a VARCHAR column has no length.
+        """
+        self.columns = tuple(tuple(column) for column in columns)
+        self.names = tuple(col_name for col_name, _ in self.columns)
+
+        base_types = []
+        lengths = []
+        formats = []
+        offsets = []
+        encoders = []
+        decoders = []
+        text_indexes = []
+        size = 0
+
+        for i, (col_name, col_type) in enumerate(self.columns):
+            base_type, length = parse_column_type(col_name, col_type)
+
+            if base_type == "varchar":
+                fmt = f"{length}s"
+                encoders.append((i, varchar_encoder(col_name, length)))
+            elif base_type == "text":
+                fmt = "I"  # byte length, the text itself follows the fixed section
+                text_indexes.append(i)
+            else:
+                fmt = FIXED_FORMATS[base_type]
+                encoders.append((i, ENCODERS[base_type]))
+
+            if base_type in DECODERS:
+                decoders.append((i, DECODERS[base_type]))
+
+            base_types.append(base_type)
+            lengths.append(length)
+            formats.append(fmt)
+            offsets.append(size)
+            size += struct.calcsize("<" + fmt)
+
+        self.base_types = tuple(base_types)
+        self.lengths = tuple(lengths)
+        self.offsets = tuple(offsets)
+        self.key_offsets = self.offsets
+        self.null_bits = (NO_NULL_BIT,) * len(self.names)
+        self.fixed = struct.Struct("<" + "".join(formats))
+        self.encoders = tuple(encoders)
+        self.decoders = tuple(decoders)
+        self.text_indexes = tuple(text_indexes)
+        self.text_names = tuple(self.names[i] for i in text_indexes)
+
+    def pack(self, row, toast=None):
+        """Pack a row dict into binary form.
+
+        Args:
+            row (dict): column_name -> value.
+            toast (Callable, optional): Stores a value out of line and returns the packed
+                pointer to it. When given, the largest TEXT values of rows bigger than
+                TOAST_THRESHOLD are moved out of line until the row is small enough.
+                Defaults to None.
+
+        Returns:
+            bytes: binary representation of the row.
+
+        Raises:
+            ValueError: If a value is missing or too long for its column.
+        """
+        values = [row.get(col_name) for col_name in self.names]
+        if None in values:
+            missing = self.names[values.index(None)]
+            raise ValueError(f"Missing value for column '{missing}'")
+
+        for i, encode in self.encoders:
+            values[i] = encode(values[i])
+
+        if not self.text_indexes:
+            return self.fixed.pack(*values)
+
+        texts = []
+        for i in self.text_indexes:
+            encoded = values[i].encode("utf-8")
+            values[i] = len(encoded)
+            texts.append(encoded)
+        if toast is not None:
+            self.__toast(values, texts, toast)
+        return self.fixed.pack(*values) + b"".join(texts)
+
+    def __toast(self, values, texts, toast):
+        """Move the largest TEXT values out of line until the row fits TOAST_THRESHOLD."""
+        size = self.fixed.size + sum(map(len, texts))
+        by_size = sorted(range(len(texts)), key=lambda k: len(texts[k]), reverse=True)
+        for k in by_size:
+            if size <= TOAST_THRESHOLD or len(texts[k]) <= TOAST_POINTER_SIZE:
+                break
+            pointer = toast(texts[k])
+            size -= len(texts[k]) - len(pointer)
+            texts[k] = pointer
+            values[self.text_indexes[k]] = len(pointer) | TOAST_FLAG
+
+    def unpack(self, raw_data, offset=0, names=None):
+        """Unpack a row from a buffer.
+
+        TEXT values stored out of line are returned as ToastPointer, see Tuple for
+        fetching them.
+
+        Args:
+            raw_data (bytes | bytearray | memoryview): Buffer holding the row.
+            offset (int, optional): Offset of the row in the buffer. Defaults to 0.
+            names (Iterable[str], optional): Columns to return. Defaults to None
+                (every column).
+
+        Returns:
+            dict: {column_name: value}
+
+        Raises:
+            KeyError: If a column is not in the schema.
+        """
+        values = list(self.fixed.unpack_from(raw_data, offset))
+
+        for i, decode in self.decoders:
+            values[i] = decode(values[i])
+
+        if self.text_indexes:
+            position = offset + self.fixed.size
+            for i in self.text_indexes:
+                text_len = values[i]
+                if text_len & TOAST_FLAG:
+                    text_len &= ~TOAST_FLAG
+                    values[i] = ToastPointer._make(
+                        struct.unpack_from(TOAST_POINTER_FORMAT, raw_data, position)
+                    )
+                else:
+                    values[i] = bytes(raw_data[position : position + text_len]).decode(
+                        "utf-8"
+                    )
+                position += text_len
+
+        row = dict(zip(self.names, values))
+        if names is not None:
+            return {name: row[name] for name in names}
+        return row
+
+
+class CompactRowCodec:
+    """Packs and unpacks rows of one schema in ROW_FORMAT_COMPACT.
+
+    A row starts with a null bitmap, one bit per column in column order. The
+    fixed-width columns follow at fixed offsets, with NULL ones zero-filled. Then comes
+    an offset array: the offset of the variable-length area followed by the end offset
+    of every VARCHAR and TEXT value, all relative to the start of the row. The values
+    themselves fill the variable-length area in column order, so a VARCHAR(n) takes
+    only the bytes of its value rather than n. Everything up to the end of the offset
+    array is packed with one precompiled struct.
+
+    Only TEXT values are moved out of line (see pack). Such a value is replaced by a
+    pointer to it and VAR_TOAST_FLAG is set in its end offset.
+
+    Attributes:
+        columns (tuple): The (name, type) pairs of the schema.
+        names (tuple): Column names in order.
+        base_types (tuple): Lower-cased base type of every column.
+        lengths (tuple): Declared length of every column, None if it has none.
+        fixed (struct.Struct): Struct of the bitmap, fixed-width columns and offset array.
+        offsets (tuple): Offset of every fixed-width column in a row, None for the others.
+        key_offsets (tuple): Where indexes find every column: its offset if it has a
+            fixed width, else VARIABLE_KEY with the offset of its start in the offset array.
+        null_bits (tuple): Bit of every column in the null bitmap.
+        text_names (tuple): Names of the TEXT columns.
+    """
+
+    row_format = ROW_FORMAT_COMPACT
+
+    def __init__(self, columns):
+        """Compile the codec for a schema.
+
+        Args:
+            columns (Iterable[tuple]): List of (name, type) pairs.
+
+        Raises:
+            TypeError: If a column type is invalid or unsupported.
+            ValueError: If a VARCHAR column has no length.
+        """
+        self.columns = tuple(tuple(column) for column in columns)
+        self.names = tuple(col_name for col_name, _ in self.columns)
+
+        parsed = [parse_column_type(*column) for column in self.columns]
+        self.base_types = tuple(base_type for base_type, _ in parsed)
+        self.lengths = tuple(length for _, length in parsed)
+        self.bitmap_size = (len(self.columns) + 7) // 8
+
+        fixed_indexes = []
+        var_indexes = []
+        formats = []
+        offsets = [None] * len(self.columns)
+        size = self.bitmap_size
+        for i, base_type in enumerate(self.base_types):
+            if base_type in FIXED_FORMATS:
+                fmt = FIXED_FORMATS[base_type]
+                fixed_indexes.append(i)
+                formats.append(fmt)
+                offsets[i] = size
+                size += struct.calcsize("<" + fmt)
+            else:
+                var_indexes.append(i)
+
+        self.var_offset = size
+        key_offsets = list(offsets)
+        for k, i in enumerate(var_indexes):
+            key_offsets[i] = VARIABLE_KEY | (size + k * ROW_OFFSET_SIZE)
+        if var_indexes:
+            formats.append(f"{len(var_indexes) + 1}{ROW_OFFSET_FORMAT}")
+
+        self.offsets = tuple(offsets)
+        self.key_offsets = tuple(key_offsets)
+        self.null_bits = tuple(range(len(self.columns)))
+        self.fixed = struct.Struct(f"<{self.bitmap_size}s" + "".join(formats))
+        self.fixed_indexes = tuple(fixed_indexes)
+        self.var_indexes = tuple(var_indexes)
+        self.text_names = tuple(
+            self.names[i] for i in var_indexes if self.base_types[i] == "text"
+        )
+
+        self.encoders = tuple(
+            (i, ENCODERS[self.base_types[i]]) for i in fixed_indexes
+        ) + tuple(
+            (i, varchar_encoder(self.names[i], self.lengths[i]))
+            for i in var_indexes
+            if self.base_types[i] == "varchar"
+        )
+        self.fixed_decoders = tuple(
+            (i, DECODERS.get(self.base_types[i])) for i in fixed_indexes
+        )
+
+    def pack(self, row, toast=None):
+        """Pack a row dict into binary form.
+
+        Args:
+            row (dict): column_name -> value. Missing and None values are stored as NULL.
+            toast (Callable, optional): Stores a value out of line and returns the packed
+                pointer to it. When given, the largest TEXT values of rows bigger than
+                TOAST_THRESHOLD are moved out of line until the row is small enough.
+                Defaults to None.
+
+        Returns:
+            bytes: binary representation of the row.
+
+        Raises:
+            ValueError: If a value is too long for its column, or the row for the offset array.
+        """
+        values = [row.get(col_name) for col_name in self.names]
+        nulls = 0
+        for i, value in enumerate(values):
+            if value is None:
+                nulls |= 1 << i
+
+        for i, encode in self.encoders:
+            if values[i] is not None:
+                values[i] = encode(values[i])
+
+        fields = [nulls.to_bytes(self.bitmap_size, "little")]
+        fields.extend(0 if values[i] is None else values[i] for i in self.fixed_indexes)
+        if not self.var_indexes:
+            return self.fixed.pack(*fields)
+
+        texts = []
+        for i in self.var_indexes:
+            value = values[i]
+            if value is None:
+                value = b""
+            elif self.base_types[i] == "text":
+                value = value.encode("utf-8")
+            texts.append(value)
+        toasted = self.__toast(texts, toast) if toast is not None else ()
+
+        end = self.fixed.size
+        fields.append(end)
+        for k, text in enumerate(texts):
+            end += len(text)
+            fields.append(end | VAR_TOAST_FLAG if k in toasted else end)
+        if end > VAR_OFFSET_MASK:
+            raise ValueError(f"Row of {end} bytes is too large for the compact format")
+        return self.fixed.pack(*fields) + b"".join(texts)
+
+    def __toast(self, texts, toast):
+        """Move the largest TEXT values out of line until the row fits TOAST_THRESHOLD.
+
+        Returns:
+            set: Positions in texts of the values replaced by pointers.
+        """
+        toasted = set()
+        size = self.fixed.size + sum(map(len, texts))
+        by_size = sorted(range(len(texts)), key=lambda k: len(texts[k]), reverse=True)
+        for k in by_size:
+            if size <= TOAST_THRESHOLD or len(texts[k]) <= TOAST_POINTER_SIZE:
+                break
+            if self.base_types[self.var_indexes[k]] != "text":
+                continue
+            pointer = toast(texts[k])
+            size -= len(texts[k]) - len(pointer)
+            texts[k] = pointer
+            toasted.add(k)
+        return toasted
+
+    def unpack(self, raw_data, offset=0, names=None):
+        """Unpack a row from a buffer.
+
+        NULL values are returned as None, and TEXT values stored out of line as
+        ToastPointer, see Tuple for fetching them.
+
+        Args:
+            raw_data (bytes | bytearray | memoryview): Buffer holding the row.
+            offset (int, optional): Offset of the row in the buffer. Defaults to 0.
+            names (Iterable[str], optional): Columns to return. Defaults to None
+                (every column).
+
+        Returns:
+            dict: {column_name: value}
+
+        Raises:
+            KeyError: If a column is not in the schema.
+        """
+        fields = self.fixed.unpack_from(raw_data, offset)
+        nulls = int.from_bytes(fields[0], "little")
+        values = [None] * len(self.names)
+
+        for (i, decode), value in zip(self.fixed_decoders, fields[1:]):
+            if not nulls >> i & 1:
+                values[i] = decode(value) if decode is not None else value
+
+        if self.var_indexes:
+            ends = fields[len(self.fixed_decoders) + 1 :]
+            start = offset + ends[0]
+            for i, end in zip(self.var_indexes, ends[1:]):
+                is_toasted = end & VAR_TOAST_FLAG
+                end = offset + (end & VAR_OFFSET_MASK)
+                if is_toasted:
+                    values[i] = ToastPointer._make(
+                        struct.unpack_from(TOAST_POINTER_FORMAT, raw_data, start)
+                    )
+                elif not nulls >> i & 1:
+                    values[i] = bytes(raw_data[start:end]).decode("utf-8")
+                start = end
+
+        row = dict(zip(self.names, values))
+        if names is not None:
+            return {name: row[name] for name in names}
+        return row
+
+
+CODEC_CLASSES = {
+    ROW_FORMAT_FIXED: RowCodec,
+    ROW_FORMAT_COMPACT: CompactRowCodec,
+}
+
+
+@lru_cache(maxsize=256)
+def _compile(columns, row_format):
+    return CODEC_CLASSES[row_format](columns)
+
+
+def get_codec(columns, row_format=ROW_FORMAT_FIXED):
+    """Return the compiled codec of a schema, compiling it on first use.
+
+    Args:
+        columns (Iterable[tuple]): List of (name, type) pairs.
+        row_format (int, optional): ROW_FORMAT_FIXED or ROW_FORMAT_COMPACT. Rows of
+            a relation must use its Relation.row_format. Defaults to ROW_FORMAT_FIXED,
+            the format of pack_row and unpack_row.
+
+    Returns:
+        RowCodec | CompactRowCodec: The cached codec.
+    """
+    return _compile(tuple(map(tuple, columns)), row_format)
+
 
 def pack_row(row: dict, columns: list[tuple[str, str]]) -> bytes:
     """
@@ -15,73 +540,7 @@ def pack_row(row: dict, columns: list[tuple[str, str]]) -> bytes:
     Returns:
         bytes: binary representation of the row
     """
-    format_str = "<"  # little-endian
-    values = []
-
-    for col_name, col_type in columns:
-        value = row.get(col_name)
-
-        if value is None:
-            raise ValueError(f"Missing value for column '{col_name}'")
-
-        col_type = col_type.lower().strip()
-
-        # Extract base type and optional length
-        match = re.match(r"([a-z]+)(?:\((\d+)\))?", col_type)
-        if not match:
-            raise TypeError(f"Invalid column type: {col_type}")
-
-        base_type = match.group(1)
-        length = int(match.group(2)) if match.group(2) else None
-
-        if base_type == "integer":
-            format_str += "q"
-            values.append(int(value))
-
-        elif base_type == "decimal":
-            format_str += "d"
-            values.append(float(Decimal(value)))
-
-        elif base_type == "varchar":
-            if length is None:
-                raise ValueError(f"VARCHAR column '{col_name}' requires length")
-            encoded = value.encode("utf-8")
-            if len(encoded) > length:
-                raise ValueError(
-                    f"Value too long for column '{col_name}' (max {length})"
-                )
-            format_str += f"{length}s"
-            values.append(encoded.ljust(length, b"\x00"))
-
-        elif base_type == "text":
-            encoded = value.encode("utf-8")
-            length = len(encoded)
-            format_str += f"I{length}s"
-            values.append(length)
-            values.append(encoded)
-
-        elif base_type == "bool":
-            format_str += "?"
-            values.append(bool(value))
-
-        elif base_type == "date":
-            if isinstance(value, str):
-                value = date.fromisoformat(value)
-            days_since_epoch = (value - date(1970, 1, 1)).days
-            format_str += "i"
-            values.append(days_since_epoch)
-
-        elif base_type == "datetime":
-            if isinstance(value, str):
-                value = datetime.fromisoformat(value)
-            timestamp = int(value.timestamp())
-            format_str += "q"
-            values.append(timestamp)
-
-        else:
-            raise TypeError(f"Unsupported column type: {col_type}")
-
-    return struct.pack(format_str, *values)
+    return get_codec(columns).pack(row)
 
 
 def unpack_row(raw_data: bytes, columns: list[tuple[str, str]]) -> dict:
@@ -96,66 +555,4 @@ def unpack_row(raw_data: bytes, columns: list[tuple[str, str]]) -> dict:
     Returns:
         dict: {column_name: value}
     """
-    format_parts = []
-
-    parsed_columns = []
-    for col_name, col_type in columns:
-        col_type = col_type.lower().strip()
-
-        match = re.match(r"([a-z]+)(?:\((\d+)\))?", col_type)
-        if not match:
-            raise TypeError(f"Invalid column type: {col_type}")
-
-        base_type = match.group(1)
-        length = int(match.group(2)) if match.group(2) else None
-
-        if base_type == "integer":
-            fmt = "q"
-        elif base_type == "decimal":
-            fmt = "d"
-        elif base_type == "varchar":
-            if length is None:
-                raise ValueError(f"VARCHAR column '{col_name}' requires length")
-            fmt = f"{length}s"
-        elif base_type == "text":
-            fmt = "I"  # we’ll read the text length first, then slice manually
-        elif base_type == "bool":
-            fmt = "?"
-        elif base_type == "date":
-            fmt = "i"
-        elif base_type == "datetime":
-            fmt = "q"
-        else:
-            raise TypeError(f"Unsupported column type: {col_type}")
-
-        format_parts.append(fmt)
-        parsed_columns.append((col_name, base_type, length))
-
-    # First unpack fixed-length types
-    struct_format = "<" + "".join(format_parts)
-    header_size = struct.calcsize(struct_format)
-    unpacked = list(struct.unpack(struct_format, raw_data[:header_size]))
-
-    result = {}
-    offset = header_size
-
-    for i, (col_name, base_type, length) in enumerate(parsed_columns):
-        val = unpacked[i]
-
-        if base_type == "varchar":
-            val = val.rstrip(b"\x00").decode("utf-8")
-        elif base_type == "decimal":
-            val = Decimal(str(val))
-        elif base_type == "date":
-            val = date(1970, 1, 1) + timedelta(days=val)
-        elif base_type == "datetime":
-            val = datetime.fromtimestamp(val)
-        elif base_type == "text":
-            text_len = val
-            text_bytes = struct.unpack_from(f"{text_len}s", raw_data, offset)[0]
-            offset += text_len
-            val = text_bytes.decode("utf-8")
-
-        result[col_name] = val
-
-    return result
+    return get_codec(columns).unpack(raw_data)
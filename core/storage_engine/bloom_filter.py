@@ -0,0 +1,366 @@
+import hashlib
+import os
+import struct
+import threading
+
+from core.constants import (
+    BLOOM_FILE_NAME_FORMAT,
+    BLOOM_FILTER_BYTES,
+    BLOOM_HASH_COUNT,
+    BLOOM_HEADER_FORMAT,
+    BLOOM_VERSION,
+    ROW_OFFSET_FORMAT,
+)
+from core.exceptions import FileAccessError, FileNotFoundError
+from core.utils import logger
+
+from .binary import ENCODERS, FIXED_FORMATS, NO_NULL_BIT, VAR_OFFSET_MASK, VARIABLE_KEY
+from .file_manager import FileStorage
+
+BLOOM_HEADER_SIZE = struct.calcsize(BLOOM_HEADER_FORMAT)
+BLOOM_CLEAN_OFFSET = struct.calcsize("<H")
+# bit -> table mapping a byte to 1 if the bit is set in it, else 0
+BIT_TABLES = [bytes(byte >> bit & 1 for byte in range(256)) for bit in range(8)]
+
+
+class BloomFilter:
+    """Keeps a Bloom filter of the keys of a column in every page of a relation.
+
+    A probe for a key tests its bits in the filters of every page at once and only
+    the pages whose filter holds every bit may store the key, so a key that is not in
+    the relation is usually answered without reading any page. A filter of
+    filter_bytes bytes per page gets hash_count bits set per key, taken from a
+    BLAKE2b hash of the raw key bytes stored in rows. NULL keys are left out. Deleted
+    keys stay in the filter of their page until vacuum rebuilds it.
+
+    The filters of every page are held in memory as one bit array, stored in
+    bloom_<column>.pydb next to the relation files. Like indexes, Bloom filters are
+    not logged but have a clean flag, cleared durably before the first change after a
+    checkpoint and set by the next checkpoint once the filters are written. Filters
+    that are not clean when they are loaded may be missing keys and are rebuilt from
+    the relation.
+    """
+
+    KEY_TYPES = ("integer", "date", "datetime", "varchar")
+
+    def __init__(
+        self,
+        folder,
+        column,
+        key_offset=None,
+        key_type=None,
+        key_length=8,
+        null_bit=NO_NULL_BIT,
+    ):
+        """Load the Bloom filters of a column, or prepare new ones if it has no file yet.
+
+        Args:
+            folder (str): The relation folder.
+            column (str): The column.
+            key_offset (int, optional): Where the column is in a row, see the key_offsets
+                of the row codec. Required for new filters.
+            key_type (str, optional): Base type of the column. Required for new filters.
+            key_length (int, optional): Size of a key, the declared length of a VARCHAR
+                column. Ignored for other types. Defaults to 8.
+            null_bit (int, optional): Bit of the column in the null bitmap of a row.
+                Defaults to NO_NULL_BIT.
+
+        Raises:
+            RuntimeError: If there are unrecoverable I/O errors or the file is corrupted.
+        """
+        self.column = column
+        self.path = os.path.join(folder, BLOOM_FILE_NAME_FORMAT.format(column))
+        self.lock = threading.RLock()
+        self.build_lock = threading.Lock()
+        self.key_offset = key_offset
+        self.key_type = key_type
+        self.key_length = key_length
+        self.null_bit = null_bit
+        self.hash_count = BLOOM_HASH_COUNT
+        self.filter_bytes = BLOOM_FILTER_BYTES
+        self.page_count = 0
+        self.bits = bytearray()
+        self.clean = False
+        self.needs_rebuild = True
+        self.dirty = False
+        if os.path.exists(self.path):
+            self.__load()
+        elif key_type in FIXED_FORMATS:
+            self.key_length = struct.calcsize("<" + FIXED_FORMATS[key_type])
+
+    def __load(self):
+        logger.debug("BloomFilter: Loading %s", self.path)
+        try:
+            raw = FileStorage.read_data(self.path)
+            (
+                _,
+                clean,
+                key_type,
+                self.key_offset,
+                self.null_bit,
+                self.key_length,
+                self.hash_count,
+                self.filter_bytes,
+                self.page_count,
+            ) = struct.unpack_from(BLOOM_HEADER_FORMAT, raw)
+            self.key_type = key_type.rstrip(b"\x00").decode("utf-8")
+            size = self.page_count * self.filter_bytes
+            self.bits = bytearray(raw[BLOOM_HEADER_SIZE : BLOOM_HEADER_SIZE + size])
+            if len(self.bits) != size:
+                raise ValueError(f"{len(self.bits)} of {size} filter bytes")
+        except (FileAccessError, FileNotFoundError) as e:
+            logger.error(f"Failed to read Bloom filters {self.path}: {e}")
+            raise RuntimeError(
+                f"Unrecoverable error: Failed to read Bloom filters {self.path}: {e}"
+            )
+        except (struct.error, ValueError) as e:
+            logger.error(f"Bloom filter file {self.path} is corrupted: {e}")
+            raise RuntimeError(
+                f"Unrecoverable error: Bloom filter file {self.path} is corrupted: {e}"
+            )
+        self.clean = bool(clean)
+        self.needs_rebuild = not self.clean
+
+    def __write(self):
+        """Replace the file with the filters in memory and the current clean flag."""
+        header = struct.pack(
+            BLOOM_HEADER_FORMAT,
+            BLOOM_VERSION,
+            self.clean,
+            self.key_type.encode("utf-8"),
+            self.key_offset,
+            self.null_bit,
+            self.key_length,
+            self.hash_count,
+            self.filter_bytes,
+            self.page_count,
+        )
+        try:
+            FileStorage.replace_data(self.path, header + self.bits)
+        except (FileAccessError, FileNotFoundError) as e:
+            logger.error(f"Failed to write Bloom filters {self.path}: {e}")
+            raise RuntimeError(
+                f"Unrecoverable error: Failed to write Bloom filters {self.path}: {e}"
+            )
+
+    def create(self):
+        """Write the file of new filters, marked as changed so they are built next.
+
+        Raises:
+            RuntimeError: If there are unrecoverable I/O errors during writing.
+        """
+        with self.lock:
+            logger.debug("BloomFilter: Creating %s", self.path)
+            self.clean = False
+            self.needs_rebuild = True
+            self.__write()
+
+    def encode(self, value):
+        """Convert a column value into the raw key bytes stored in rows.
+
+        Args:
+            value: A value of the column.
+
+        Returns:
+            bytes | None: The key, or None if the value cannot be in the column.
+        """
+        if self.key_type == "varchar":
+            key = value.encode("utf-8")
+            if len(key) > self.key_length:
+                return None
+            return key.ljust(self.key_length, b"\x00")
+        key_format = "<" + FIXED_FORMATS[self.key_type]
+        return struct.pack(key_format, ENCODERS[self.key_type](value))
+
+    def key_of(self, tuple_data, offset=0):
+        """Extract the raw key bytes from a packed row.
+
+        Args:
+            tuple_data (bytes | bytearray | memoryview): Buffer holding the row.
+            offset (int, optional): Offset of the row in the buffer. Defaults to 0.
+
+        Returns:
+            bytes | None: The key, or None if the column is NULL.
+        """
+        null_bit = self.null_bit
+        if (
+            null_bit != NO_NULL_BIT
+            and tuple_data[offset + null_bit // 8] >> (null_bit % 8) & 1
+        ):
+            return None
+        if self.key_offset & VARIABLE_KEY:
+            # a compact row value, between its start and end in the offset array
+            position = offset + (self.key_offset & ~VARIABLE_KEY)
+            start, end = struct.unpack_from(
+                f"<2{ROW_OFFSET_FORMAT}", tuple_data, position
+            )
+            start = offset + (start & VAR_OFFSET_MASK)
+            key = tuple_data[start : offset + (end & VAR_OFFSET_MASK)]
+            return bytes(key).ljust(self.key_length, b"\x00")
+        start = offset + self.key_offset
+        return bytes(tuple_data[start : start + self.key_length])
+
+    def __positions(self, key):
+        """Return the bits of a key within a page filter, by double hashing."""
+        digest = int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little")
+        first, step = digest & 0xFFFFFFFF, digest >> 32 | 1
+        bits = self.filter_bytes * 8
+        return [(first + i * step) % bits for i in range(self.hash_count)]
+
+    def begin_write(self):
+        """Durably mark the filters as changed before their first change after a checkpoint.
+
+        Raises:
+            RuntimeError: If there are unrecoverable I/O errors during writing.
+        """
+        with self.lock:
+            if not self.clean:
+                return
+            logger.debug("BloomFilter: Marking %s as changed", self.path)
+            try:
+                FileStorage.write_data(self.path, b"\x00", BLOOM_CLEAN_OFFSET)
+            except (FileAccessError, FileNotFoundError) as e:
+                logger.error(f"Failed to write Bloom filters {self.path}: {e}")
+                raise RuntimeError(
+                    f"Unrecoverable error: Failed to write Bloom filters {self.path}: {e}"
+                )
+            self.clean = False
+
+    def add(self, page_id, tuple_data, offset=0):
+        """Add the key of a packed row to the filter of a page.
+
+        Args:
+            page_id (int): The page the row was written to.
+            tuple_data (bytes | bytearray | memoryview): Buffer holding the row.
+            offset (int, optional): Offset of the row in the buffer. Defaults to 0.
+        """
+        key = self.key_of(tuple_data, offset)
+        if key is None:
+            return
+        positions = self.__positions(key)
+        with self.lock:
+            self.__resize(page_id + 1)
+            base = page_id * self.filter_bytes
+            for position in positions:
+                self.bits[base + (position >> 3)] |= 1 << (position & 7)
+            self.dirty = True
+
+    def reset(self, page_id, rows):
+        """Rebuild the filter of a page from the rows it holds.
+
+        Args:
+            page_id (int): The page.
+            rows (Iterable[tuple]): (buffer, offset) of every row in the page.
+        """
+        page_filter = bytearray(self.filter_bytes)
+        for buffer, offset in rows:
+            key = self.key_of(buffer, offset)
+            if key is not None:
+                for position in self.__positions(key):
+                    page_filter[position >> 3] |= 1 << (position & 7)
+        with self.lock:
+            self.__resize(page_id + 1)
+            base = page_id * self.filter_bytes
+            self.bits[base : base + self.filter_bytes] = page_filter
+            self.dirty = True
+
+    def clear(self):
+        """Empty the filters of every page, before they are rebuilt."""
+        with self.lock:
+            self.bits = bytearray()
+            self.page_count = 0
+            self.dirty = True
+
+    def __resize(self, page_count):
+        if page_count > self.page_count:
+            self.bits.extend(bytes((page_count - self.page_count) * self.filter_bytes))
+            self.page_count = page_count
+
+    def candidate_pages(self, key):
+        """Return the pages that may hold a key.
+
+        The bits of the key are tested in the filters of all pages at once: for every
+        bit, the filter bytes holding it are gathered from each page into one integer
+        with a bit per page, and the integers of all bits are intersected.
+
+        Args:
+            key (bytes): The raw key, see encode.
+
+        Returns:
+            list[int]: The IDs of the pages whose filter holds the key, in order.
+        """
+        positions = self.__positions(key)
+        with self.lock:
+            matches = -1
+            for position in positions:
+                column = self.bits[position >> 3 :: self.filter_bytes]
+                column = column.translate(BIT_TABLES[position & 7])
+                matches &= int.from_bytes(column, "little")
+                if not matches:
+                    return []
+            if matches == -1:
+                return []
+            matches = matches.to_bytes(self.page_count, "little")
+
+        page_ids = []
+        page_id = matches.find(1)
+        while page_id != -1:
+            page_ids.append(page_id)
+            page_id = matches.find(1, page_id + 1)
+        return page_ids
+
+    def save(self):
+        """Write the filters to disk and mark them clean. Used by checkpoints.
+
+        Raises:
+            RuntimeError: If there are unrecoverable I/O errors during writing.
+        """
+        with self.lock:
+            if self.needs_rebuild or (self.clean and not self.dirty):
+                return
+            logger.debug("BloomFilter: Saving %s", self.path)
+            self.clean = True
+            try:
+                self.__write()
+            except RuntimeError:
+                self.clean = False
+                raise
+            self.dirty = False
+
+
+# Bloom filters shared by every Page of a relation, keyed by relation folder
+bloom_filters = {}
+bloom_filters_lock = threading.Lock()
+
+
+def get_bloom_filters(relation):
+    """Return the Bloom filters of a relation by column, loading them on first use.
+
+    Args:
+        relation (Relation): The relation.
+
+    Returns:
+        dict: column -> BloomFilter.
+    """
+    with bloom_filters_lock:
+        filters = bloom_filters.get(relation.folder)
+        if filters is None:
+            filters = bloom_filters[relation.folder] = {}
+            prefix, suffix = BLOOM_FILE_NAME_FORMAT.split("{}")
+            for name in sorted(os.listdir(relation.folder)):
+                if name.startswith(prefix) and name.endswith(suffix):
+                    column = name[len(prefix) : len(name) - len(suffix)]
+                    filters[column] = BloomFilter(relation.folder, column)
+        return filters
+
+
+def save_bloom_filters():
+    """Write every changed Bloom filter file to disk and mark it clean.
+
+    Raises:
+        RuntimeError: If there are unrecoverable I/O errors during writing.
+    """
+    with bloom_filters_lock:
+        filters = [f for table in bloom_filters.values() for f in table.values()]
+    for bloom_filter in filters:
+        bloom_filter.save()
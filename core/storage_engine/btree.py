@@ -0,0 +1,371 @@
+import struct
+
+from core.constants import (
+    BTREE_FILE_NAME_FORMAT,
+    BTREE_FILL_FACTOR,
+    BTREE_META_FORMAT,
+    INDEX_NODE_HEADER_FORMAT,
+    PAGE_SIZE,
+)
+from core.utils import logger
+
+from .binary import NO_NULL_BIT
+from .buffer_pool import buffer_pool
+from .index import (
+    NO_PAGE,
+    NODE_COUNT_OFFSET,
+    NODE_HEADER_SIZE,
+    IndexFile,
+    make_node,
+    register_index_kind,
+)
+
+# Entries are compared as bytes: the key is biased to unsigned and everything is
+# big-endian, so byte order is (key, page_id, slot) order. Including the tuple
+# location makes every entry unique, which is how duplicate keys are stored.
+KEY_FORMAT = ">QIH"
+KEY_SIZE = struct.calcsize(KEY_FORMAT)
+KEY_BIAS = 1 << 63
+CHILD_FORMAT = "<I"
+INNER_ENTRY_SIZE = KEY_SIZE + struct.calcsize(CHILD_FORMAT)
+
+LEAF = 1
+INNER = 2
+MIN_ENTRY = bytes(KEY_SIZE)
+MAX_ENTRY = b"\xff" * KEY_SIZE
+
+LEAF_CAPACITY = (PAGE_SIZE - NODE_HEADER_SIZE) // KEY_SIZE
+INNER_CAPACITY = (PAGE_SIZE - NODE_HEADER_SIZE) // INNER_ENTRY_SIZE
+
+
+def encode_entry(key, page_id=0, slot=0):
+    """Pack an index entry into its sortable byte form."""
+    return struct.pack(KEY_FORMAT, key + KEY_BIAS, page_id, slot)
+
+
+def decode_entry(raw):
+    """Unpack a sortable index entry into (key, page_id, slot)."""
+    key, page_id, slot = struct.unpack(KEY_FORMAT, raw)
+    return key - KEY_BIAS, page_id, slot
+
+
+def bisect(buffer, base, count, entry_size, target, right=True):
+    """Binary search sorted entries.
+
+    Args:
+        buffer (bytes | bytearray): Buffer holding the entries.
+        base (int): Offset of the first entry in the buffer.
+        count (int): Number of entries.
+        entry_size (int): Size of one entry; its first KEY_SIZE bytes are the key.
+        target (bytes): The encoded entry to look for.
+        right (bool, optional): Return the position after equal entries instead of
+            before them. Defaults to True.
+
+    Returns:
+        int: The insert position of target.
+    """
+    lo, hi = 0, count
+    while lo < hi:
+        mid = (lo + hi) // 2
+        offset = base + mid * entry_size
+        key = buffer[offset : offset + KEY_SIZE]
+        if key < target or (right and key == target):
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+class BTreeIndex(IndexFile):
+    """A B+tree mapping an 8-byte integer column to tuple locations.
+
+    Page 0 holds the metadata; every other page is a node. Leaves hold sorted
+    (key, page_id, slot) entries and link to the next leaf, so range scans walk the
+    leaves left to right. Inner nodes hold separator entries, each followed by the
+    child holding entries greater than or equal to it, with the leftmost child in the
+    node header. See IndexFile for how the index survives crashes.
+    """
+
+    FILE_NAME_FORMAT = BTREE_FILE_NAME_FORMAT
+    META_FORMAT = BTREE_META_FORMAT
+    KEY_TYPES = ("integer", "datetime")
+
+    def __init__(
+        self, folder, column, key_offset=None, key_type=None, null_bit=NO_NULL_BIT
+    ):
+        self.root_page_id = 1
+        super().__init__(folder, column, key_offset, key_type, null_bit)
+
+    def _meta_fields(self):
+        return (self.root_page_id,)
+
+    def _load_meta_fields(self, fields):
+        (self.root_page_id,) = fields
+
+    def __descend(self, target):
+        """Return the IDs of the nodes from the root to the leaf that covers target."""
+        path = []
+        node_id = self.root_page_id
+        while True:
+            path.append(node_id)
+            frame = buffer_pool.fetch_page(self, node_id)
+            try:
+                kind, count, link = struct.unpack_from(
+                    INDEX_NODE_HEADER_FORMAT, frame.data
+                )
+                if kind == LEAF:
+                    return path
+                i = bisect(
+                    frame.data, NODE_HEADER_SIZE, count, INNER_ENTRY_SIZE, target
+                )
+                if i == 0:
+                    node_id = link
+                else:
+                    offset = NODE_HEADER_SIZE + (i - 1) * INNER_ENTRY_SIZE + KEY_SIZE
+                    (node_id,) = struct.unpack_from(CHILD_FORMAT, frame.data, offset)
+            finally:
+                buffer_pool.unpin_page(frame)
+
+    @staticmethod
+    def __insert_at(page, count, position, entry):
+        """Insert an entry into a node that has room for it."""
+        size = len(entry)
+        start = NODE_HEADER_SIZE + position * size
+        end = NODE_HEADER_SIZE + count * size
+        page[start + size : end + size] = page[start:end]
+        page[start : start + size] = entry
+        struct.pack_into("<H", page, NODE_COUNT_OFFSET, count + 1)
+
+    def __insert_into(self, node_id, entry, entry_size):
+        """Insert an entry into a node, splitting it if it is full.
+
+        Returns:
+            tuple | None: (separator, new_node_id) if the node was split, else None.
+        """
+        frame = buffer_pool.fetch_page(self, node_id)
+        try:
+            page = frame.data
+            kind, count, link = struct.unpack_from(INDEX_NODE_HEADER_FORMAT, page)
+            position = bisect(
+                page, NODE_HEADER_SIZE, count, entry_size, entry[:KEY_SIZE]
+            )
+            frame.dirty = True
+
+            capacity = LEAF_CAPACITY if kind == LEAF else INNER_CAPACITY
+            if count < capacity:
+                self.__insert_at(page, count, position, entry)
+                return None
+
+            end = NODE_HEADER_SIZE + count * entry_size
+            split = NODE_HEADER_SIZE + position * entry_size
+            entries = page[NODE_HEADER_SIZE:split] + entry + page[split:end]
+            half = (count + 1) // 2
+            left = entries[: half * entry_size]
+
+            if kind == LEAF:
+                right = entries[half * entry_size :]
+                separator = bytes(right[:KEY_SIZE])
+                right_id = self.new_page(make_node(LEAF, count + 1 - half, link, right))
+                page[:] = make_node(LEAF, half, right_id, left)
+            else:
+                # the middle separator moves up, its child becomes the right node's
+                # leftmost child
+                middle = entries[half * entry_size : (half + 1) * entry_size]
+                right = entries[(half + 1) * entry_size :]
+                separator = bytes(middle[:KEY_SIZE])
+                (middle_child,) = struct.unpack_from(CHILD_FORMAT, middle, KEY_SIZE)
+                right_id = self.new_page(
+                    make_node(INNER, count - half, middle_child, right)
+                )
+                page[:] = make_node(INNER, half, link, left)
+
+            logger.debug("BTreeIndex: Split node %s into %s", node_id, right_id)
+            return separator, right_id
+        finally:
+            buffer_pool.unpin_page(frame)
+
+    def insert(self, key, page_id, slot):
+        """Add the location of a tuple under a key.
+
+        Args:
+            key (int): The key.
+            page_id (int): The page holding the tuple.
+            slot (int): The slot of the tuple.
+
+        Returns:
+            bool: False if the entry was already in the index.
+
+        Raises:
+            RuntimeError: If there are unrecoverable I/O errors.
+        """
+        entry = encode_entry(key, page_id, slot)
+        with self.lock:
+            self.begin_write()
+            path = self.__descend(entry)
+            leaf_id = path.pop()
+
+            frame = buffer_pool.fetch_page(self, leaf_id)
+            try:
+                _, count, _ = struct.unpack_from(INDEX_NODE_HEADER_FORMAT, frame.data)
+                position = bisect(frame.data, NODE_HEADER_SIZE, count, KEY_SIZE, entry)
+                offset = NODE_HEADER_SIZE + (position - 1) * KEY_SIZE
+                if position and frame.data[offset : offset + KEY_SIZE] == entry:
+                    return False
+            finally:
+                buffer_pool.unpin_page(frame)
+
+            split = self.__insert_into(leaf_id, entry, KEY_SIZE)
+            while split is not None:
+                separator, right_id = split
+                item = separator + struct.pack(CHILD_FORMAT, right_id)
+                if not path:
+                    self.root_page_id = self.new_page(
+                        make_node(INNER, 1, self.root_page_id, item)
+                    )
+                    break
+                split = self.__insert_into(path.pop(), item, INNER_ENTRY_SIZE)
+
+            self.entry_count += 1
+            return True
+
+    def delete(self, key, page_id, slot):
+        """Remove the location of a tuple from under a key.
+
+        Nodes are not merged when they shrink. An emptied leaf stays in the chain and
+        is filled again by later inserts, and a rebuild packs the tree again.
+
+        Args:
+            key (int): The key.
+            page_id (int): The page holding the tuple.
+            slot (int): The slot of the tuple.
+
+        Returns:
+            bool: False if the entry was not in the index.
+
+        Raises:
+            RuntimeError: If there are unrecoverable I/O errors.
+        """
+        entry = encode_entry(key, page_id, slot)
+        with self.lock:
+            self.begin_write()
+            leaf_id = self.__descend(entry)[-1]
+
+            frame = buffer_pool.fetch_page(self, leaf_id)
+            try:
+                page = frame.data
+                _, count, _ = struct.unpack_from(INDEX_NODE_HEADER_FORMAT, page)
+                position = bisect(page, NODE_HEADER_SIZE, count, KEY_SIZE, entry, False)
+                start = NODE_HEADER_SIZE + position * KEY_SIZE
+                if position == count or page[start : start + KEY_SIZE] != entry:
+                    return False
+                end = NODE_HEADER_SIZE + count * KEY_SIZE
+                page[start : end - KEY_SIZE] = page[start + KEY_SIZE : end]
+                page[end - KEY_SIZE : end] = bytes(KEY_SIZE)
+                struct.pack_into("<H", page, NODE_COUNT_OFFSET, count - 1)
+                frame.dirty = True
+            finally:
+                buffer_pool.unpin_page(frame)
+
+            self.entry_count -= 1
+            return True
+
+    def range(self, low=None, high=None):
+        """Iterate over the entries with low <= key <= high in key order.
+
+        Args:
+            low (int, optional): Smallest key. Defaults to None (no lower bound).
+            high (int, optional): Largest key. Defaults to None (no upper bound).
+
+        Yields:
+            tuple: (key, page_id, slot) for every matching entry.
+        """
+        start = MIN_ENTRY if low is None else encode_entry(low)
+        stop = MAX_ENTRY if high is None else encode_entry(high, NO_PAGE, 0xFFFF)
+
+        with self.lock:
+            node_id = self.__descend(start)[-1]
+        first = True
+        while node_id != NO_PAGE:
+            # copy the leaf out so no page stays pinned while the caller runs
+            with self.lock:
+                frame = buffer_pool.fetch_page(self, node_id)
+                try:
+                    _, count, node_id = struct.unpack_from(
+                        INDEX_NODE_HEADER_FORMAT, frame.data
+                    )
+                    entries = bytes(
+                        frame.data[
+                            NODE_HEADER_SIZE : NODE_HEADER_SIZE + count * KEY_SIZE
+                        ]
+                    )
+                finally:
+                    buffer_pool.unpin_page(frame)
+
+            position = 0
+            if first:
+                position = bisect(entries, 0, count, KEY_SIZE, start, right=False)
+            first = False
+            for offset in range(position * KEY_SIZE, len(entries), KEY_SIZE):
+                raw = entries[offset : offset + KEY_SIZE]
+                if raw > stop:
+                    return
+                yield decode_entry(raw)
+
+    def search(self, key):
+        """Return the locations of every tuple with a key.
+
+        Args:
+            key (int): The key.
+
+        Returns:
+            list[tuple]: (page_id, slot) pairs in location order.
+        """
+        return [(page_id, slot) for _, page_id, slot in self.range(key, key)]
+
+    def build(self, entries):
+        """Replace the index with one bulk-built from a set of entries.
+
+        The entries are sorted once and packed into leaves BTREE_FILL_FACTOR full, and
+        each inner level is built from the first keys of the level below. The whole
+        file is written with one write and synced.
+
+        Args:
+            entries (Iterable[tuple]): (key, page_id, slot) for every tuple.
+
+        Raises:
+            RuntimeError: If there are unrecoverable I/O errors during writing.
+        """
+        keys = sorted(encode_entry(*entry) for entry in entries)
+        logger.debug("BTreeIndex: Building %s from %s entries", self.path, len(keys))
+
+        leaf_fill = max(1, int(LEAF_CAPACITY * BTREE_FILL_FACTOR))
+        inner_fill = max(2, int(INNER_CAPACITY * BTREE_FILL_FACTOR))
+        chunks = [keys[i : i + leaf_fill] for i in range(0, len(keys), leaf_fill)]
+        chunks = chunks or [[]]
+
+        pages = []
+        level = []
+        for n, chunk in enumerate(chunks):
+            page_id = len(pages) + 1
+            link = page_id + 1 if n + 1 < len(chunks) else NO_PAGE
+            pages.append(make_node(LEAF, len(chunk), link, b"".join(chunk)))
+            level.append((chunk[0] if chunk else MIN_ENTRY, page_id))
+
+        while len(level) > 1:
+            parents = []
+            for i in range(0, len(level), inner_fill + 1):
+                group = level[i : i + inner_fill + 1]
+                entries = b"".join(
+                    key + struct.pack(CHILD_FORMAT, child) for key, child in group[1:]
+                )
+                parents.append((group[0][0], len(pages) + 1))
+                pages.append(make_node(INNER, len(group) - 1, group[0][1], entries))
+            level = parents
+
+        with self.lock:
+            self.root_page_id = level[0][1]
+            self.entry_count = len(keys)
+            self.replace_pages(pages)
+
+
+register_index_kind(BTreeIndex)
@@ -0,0 +1,443 @@
+import threading
+
+from core.constants import BUFFER_POOL_SIZE, PAGE_SIZE
+from core.exceptions import BufferPoolExhausted
+from core.utils import logger, metrics
+
+from .latch import Latch
+from .wal import wal
+
+
+class Frame:
+    """A single page-sized slot in the buffer pool.
+
+    Attributes:
+        relation (Relation): The relation the cached page belongs to.
+        page_id (int): The ID of the cached page.
+        data (bytearray): The in-memory copy of the page.
+        pin_count (int): Number of callers currently using the frame.
+        dirty (bool): Whether the page was modified since it was last written.
+        referenced (bool): Clock-sweep reference bit.
+        lsn (int): LSN of the last log record applied to the page in memory.
+        latch (Latch): Held shared while the page is read and exclusively while it is
+            changed. Only taken while the frame is pinned.
+        loading (bool): Whether the page is still being read from disk. The reading
+            thread holds the latch exclusively until it is done.
+    """
+
+    __slots__ = (
+        "data",
+        "dirty",
+        "latch",
+        "loading",
+        "lsn",
+        "page_id",
+        "pin_count",
+        "referenced",
+        "relation",
+    )
+
+    def __init__(self):
+        self.relation = None
+        self.page_id = -1
+        self.data = bytearray(PAGE_SIZE)
+        self.pin_count = 0
+        self.dirty = False
+        self.referenced = False
+        self.lsn = 0
+        self.latch = Latch()
+        self.loading = False
+
+    @property
+    def key(self):
+        return (self.relation.path, self.page_id)
+
+
+class BufferPool:
+    """A fixed-size cache of page frames shared by every relation.
+
+    Pages are looked up by (relation file, page_id). A caller pins a frame while it
+    uses it and unpins it afterwards, marking it dirty if it changed the page.
+    Unpinned frames are recycled with a clock-sweep, and dirty pages are written
+    back when their frame is evicted or when the pool is flushed. The write-ahead log
+    is always synced up to a page's LSN before the page itself is written.
+
+    The pool lock only guards the page table and frame bookkeeping. Page contents are
+    guarded by the latch of their frame, which callers take after pinning it, so the
+    pool never waits for a latch while holding its lock. No I/O is done under the pool
+    lock either: a missing page is read into a frame that is already in the page table,
+    pinned and latched exclusively, and a dirty page is copied under the lock and
+    written out after it is released, before its frame is reused.
+    """
+
+    def __init__(self, size=BUFFER_POOL_SIZE):
+        """Initialize an empty buffer pool.
+
+        Args:
+            size (int, optional): Size of the pool in bytes. Defaults to BUFFER_POOL_SIZE.
+        """
+        self.capacity = max(1, size // PAGE_SIZE)
+        self.frames = []
+        self.page_table = {}
+        self.hand = 0
+        self.lock = threading.RLock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.writes = 0
+
+    def __victim(self):
+        """Find an unpinned frame to reuse, evicting its page if it is clean.
+
+        Must be called with the pool lock held.
+
+        Returns:
+            Frame: A free frame, already removed from the page table, or a dirty frame
+                that must be written back before it can be reused.
+
+        Raises:
+            BufferPoolExhausted: If every frame is pinned.
+        """
+        if len(self.frames) < self.capacity:
+            frame = Frame()
+            self.frames.append(frame)
+            return frame
+
+        # two full turns: the first one may only clear reference bits
+        for _ in range(2 * len(self.frames)):
+            frame = self.frames[self.hand]
+            self.hand = (self.hand + 1) % len(self.frames)
+
+            if frame.pin_count > 0:
+                continue
+            if frame.relation is None:
+                return frame
+            if frame.referenced:
+                frame.referenced = False
+                continue
+            if frame.dirty:
+                return frame
+
+            logger.debug(
+                "BufferPool: Evicting page %s of %s", frame.page_id, frame.relation.path
+            )
+            del self.page_table[frame.key]
+            frame.relation = None
+            self.evictions += 1
+            return frame
+
+        raise BufferPoolExhausted(
+            f"All {self.capacity} buffer pool frames are pinned, cannot load a new page"
+        )
+
+    def __reserve(self):
+        """Return a pinned frame outside the page table, ready to hold a new page.
+
+        A dirty victim is copied under the pool lock and written back after the lock is
+        released, while it stays pinned so no other thread evicts it. It is clean
+        afterwards unless it changed in the meantime, and the search starts again.
+        Must be called without the pool lock held.
+
+        Returns:
+            Frame: The reserved frame.
+
+        Raises:
+            BufferPoolExhausted: If every frame is pinned.
+        """
+        while True:
+            with self.lock:
+                frame = self.__victim()
+                frame.pin_count += 1
+                if frame.relation is None:
+                    return frame
+                relation, page_id, data, lsn = (
+                    frame.relation,
+                    frame.page_id,
+                    bytes(frame.data),
+                    frame.lsn,
+                )
+            try:
+                self.__write(relation, page_id, data, lsn)
+                with self.lock:
+                    if frame.data == data:
+                        frame.dirty = False
+            finally:
+                self.unpin_page(frame)
+
+    def __release(self, frame):
+        """Give back a reserved frame that was not used."""
+        with self.lock:
+            frame.pin_count = 0
+
+    def __write(self, relation, page_id, data, lsn):
+        """Write a page to its relation file once the log is synced up to its LSN."""
+        wal.flush(lsn)
+        started = metrics.start()
+        relation.write_data(data, page_id * PAGE_SIZE)
+        metrics.stop("page_write_seconds", started)
+        metrics.increment("pages_written")
+        with self.lock:
+            self.writes += 1
+
+    def __write_back(self, frame):
+        """Write a dirty frame, pinned and latched by the caller, and clear the dirty flag."""
+        self.__write(frame.relation, frame.page_id, frame.data, frame.lsn)
+        frame.dirty = False
+
+    def __install(self, frame, relation, page_id, data=b""):
+        """Put a reserved frame in the page table, must be called with the pool lock held."""
+        frame.relation = relation
+        frame.page_id = page_id
+        frame.data[:] = data.ljust(PAGE_SIZE, b"\x00")
+        frame.pin_count = 1
+        frame.dirty = False
+        frame.referenced = True
+        frame.lsn = 0
+        frame.loading = False
+        self.page_table[frame.key] = frame
+        return frame
+
+    def fetch_page(self, relation, page_id):
+        """Return the pinned frame holding a page, reading it from disk on a miss.
+
+        The page is read after the pool lock is released, into a frame that is already
+        in the page table and latched exclusively. Other threads fetching the page pin
+        the same frame and wait for the read to finish.
+
+        Args:
+            relation (Relation): The relation the page belongs to.
+            page_id (int): The ID of the page to fetch.
+
+        Returns:
+            Frame: The pinned frame. Callers must release it with unpin_page.
+        """
+        key = (relation.path, page_id)
+        while True:
+            with self.lock:
+                frame = self.page_table.get(key)
+                if frame is not None:
+                    self.hits += 1
+                    metrics.increment("buffer_pool_hits")
+                    frame.pin_count += 1
+                    frame.referenced = True
+            if frame is not None:
+                if frame.loading:
+                    # wait for the thread reading the page
+                    with frame.latch.shared():
+                        pass
+                    if frame.loading:
+                        # the read failed, try it again
+                        self.unpin_page(frame)
+                        continue
+                return frame
+
+            frame = self.__reserve()
+            with self.lock:
+                if key in self.page_table:
+                    self.__release(frame)
+                    continue
+                self.misses += 1
+                metrics.increment("buffer_pool_misses")
+                self.__install(frame, relation, page_id)
+                frame.loading = True
+                frame.latch.acquire_exclusive(blocking=False)
+            try:
+                started = metrics.start()
+                data = relation.read_data(page_id * PAGE_SIZE, PAGE_SIZE)
+                metrics.stop("page_read_seconds", started)
+                metrics.increment("pages_read")
+                frame.data[:] = data.ljust(PAGE_SIZE, b"\x00")
+                frame.loading = False
+            finally:
+                frame.latch.release_exclusive()
+                if frame.loading:
+                    # the read failed: drop the page, waiting threads read it again
+                    with self.lock:
+                        del self.page_table[key]
+                        frame.relation = None
+                        frame.pin_count -= 1
+            return frame
+
+    def peek_page(self, relation, page_id):
+        """Return a copy of a page if it is cached, without loading it.
+
+        Args:
+            relation (Relation): The relation the page belongs to.
+            page_id (int): The ID of the page.
+
+        Returns:
+            bytes | None: The cached page contents, or None if the page is not cached.
+        """
+        with self.lock:
+            frame = self.page_table.get((relation.path, page_id))
+            if frame is None:
+                return None
+            self.hits += 1
+            metrics.increment("buffer_pool_hits")
+            frame.pin_count += 1
+        try:
+            with frame.latch.shared():
+                return None if frame.loading else bytes(frame.data)
+        finally:
+            self.unpin_page(frame)
+
+    def new_page(self, relation, page_id, data):
+        """Place a freshly initialized page in the pool without reading it from disk.
+
+        The frame is returned pinned and dirty. A new page cannot already be cached: it
+        would mean the page was handed out twice, and its contents would be lost.
+
+        Args:
+            relation (Relation): The relation the page belongs to.
+            page_id (int): The ID of the new page.
+            data (bytes): The initial page contents.
+
+        Returns:
+            Frame: The pinned frame.
+
+        Raises:
+            RuntimeError: If the page is already cached.
+        """
+        frame = self.__reserve()
+        with self.lock:
+            if (relation.path, page_id) in self.page_table:
+                self.__release(frame)
+                raise RuntimeError(
+                    f"Unrecoverable error: New page {page_id} of {relation.path} is already in the buffer pool"
+                )
+            self.__install(frame, relation, page_id, data)
+            frame.dirty = True
+            return frame
+
+    def put_page(self, relation, page_id, data):
+        """Replace the contents of a page without reading it from disk.
+
+        Used to rewrite pages whose old contents are no longer needed, such as reused
+        index pages. A cached page is changed under the exclusive latch of its frame.
+        The frame is returned pinned and dirty.
+
+        Args:
+            relation (Relation): The relation the page belongs to.
+            page_id (int): The ID of the page.
+            data (bytes): The new page contents.
+
+        Returns:
+            Frame: The pinned frame.
+        """
+        while True:
+            with self.lock:
+                frame = self.page_table.get((relation.path, page_id))
+                if frame is not None:
+                    frame.pin_count += 1
+                    frame.referenced = True
+            if frame is not None:
+                with frame.latch.exclusive():
+                    failed = frame.loading
+                    if not failed:
+                        frame.data[:] = data
+                if failed:
+                    # a read of the page failed, start again
+                    self.unpin_page(frame)
+                    continue
+                with self.lock:
+                    frame.dirty = True
+                return frame
+
+            frame = self.__reserve()
+            with self.lock:
+                if (relation.path, page_id) in self.page_table:
+                    self.__release(frame)
+                    continue
+                self.__install(frame, relation, page_id, data)
+                frame.dirty = True
+                return frame
+
+    def unpin_page(self, frame, dirty=False):
+        """Release a frame obtained from fetch_page or new_page.
+
+        Args:
+            frame (Frame): The frame to release.
+            dirty (bool, optional): Whether the caller modified the page. Defaults to False.
+        """
+        with self.lock:
+            if frame.pin_count > 0:
+                frame.pin_count -= 1
+            frame.dirty = frame.dirty or dirty
+
+    def discard_page(self, relation, page_id):
+        """Drop a cached page without writing it, e.g. after it was rewritten on disk.
+
+        Args:
+            relation (Relation): The relation the page belongs to.
+            page_id (int): The ID of the page to drop.
+        """
+        with self.lock:
+            frame = self.page_table.get((relation.path, page_id))
+            if frame is not None and frame.pin_count == 0:
+                del self.page_table[frame.key]
+                frame.relation = None
+                frame.dirty = False
+
+    def flush_page(self, frame):
+        """Write a frame to disk if it is dirty.
+
+        Args:
+            frame (Frame): The frame to flush, pinned by the caller.
+        """
+        with frame.latch.shared():
+            if frame.dirty:
+                self.__write_back(frame)
+
+    def flush_all(self, relation=None):
+        """Write every dirty page to disk.
+
+        Frames are pinned and written one at a time under a shared latch, so a page is
+        never written in the middle of a change and the other frames stay available.
+
+        Args:
+            relation (Relation, optional): Only flush pages of this relation. Defaults to None (all relations).
+        """
+        logger.debug("BufferPool: Flushing dirty pages")
+        with self.lock:
+            keys = [
+                frame.key
+                for frame in self.frames
+                if frame.dirty
+                and (relation is None or frame.relation.path == relation.path)
+            ]
+
+        for key in keys:
+            with self.lock:
+                frame = self.page_table.get(key)
+                if frame is None or not frame.dirty:
+                    continue
+                frame.pin_count += 1
+            try:
+                with frame.latch.shared():
+                    if frame.dirty:
+                        self.__write_back(frame)
+            finally:
+                self.unpin_page(frame)
+
+    def stats(self):
+        """Return the buffer pool counters.
+
+        Returns:
+            dict: capacity, used frames, hits, misses, evictions, writes and hit_ratio.
+        """
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "capacity": self.capacity,
+                "used": len(self.page_table),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "writes": self.writes,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+
+# Shared buffer pool instance
+buffer_pool = BufferPool()
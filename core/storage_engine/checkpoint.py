@@ -0,0 +1,64 @@
+import atexit
+
+from core.utils import logger
+
+from .bloom_filter import save_bloom_filters
+from .buffer_pool import buffer_pool
+from .free_space_map import save_free_space_maps
+from .index import save_indexes
+from .latch import Latch
+from .page_map import save_page_maps
+from .relation_handle import save_relation_handles
+from .wal import wal
+from .zone_map import save_zone_maps
+
+# Held shared by every change to relation pages from before it is logged until it is
+# applied, and exclusively by checkpoints, so they never see a change half done
+page_changes = Latch()
+
+
+def checkpoint():
+    """Write every dirty page, relation metadata, page map, free space map, index, zone map and Bloom filter, sync them and empty the log.
+
+    The checkpoint waits for the page changes in progress, and appends are blocked
+    while it runs, so every record in the log is reflected in the synced data files
+    when it is truncated.
+
+    Raises:
+        RuntimeError: If there are unrecoverable I/O errors during the checkpoint.
+    """
+    with page_changes.exclusive(), wal.lock:
+        if not wal.opened:
+            return
+        logger.debug("Checkpoint: Starting at lsn %s", wal.end_lsn)
+        wal.flush()
+        buffer_pool.flush_all()
+        save_relation_handles()
+        save_page_maps()
+        save_free_space_maps()
+        save_indexes()
+        save_zone_maps()
+        save_bloom_filters()
+        wal.sync_tracked()
+        wal.reset()
+
+
+def recover():
+    """Open the write-ahead log and replay it, once per process.
+
+    Records after the last checkpoint are re-applied to their pages, then a checkpoint
+    makes the recovered state durable.
+
+    Raises:
+        RuntimeError: If there are unrecoverable I/O errors during recovery.
+    """
+    with wal.lock:
+        if not wal.open():
+            return
+        count = wal.replay()
+        if count:
+            logger.info("Recovery: Replayed %s write-ahead log records", count)
+            checkpoint()
+
+
+atexit.register(checkpoint)
@@ -0,0 +1,187 @@
+import atexit
+import threading
+import time
+
+from core.constants import (
+    ASYNC_FLUSH_INTERVAL,
+    DURABILITY_ASYNC,
+    DURABILITY_FDATASYNC,
+    DURABILITY_FSYNC,
+    DURABILITY_GROUP,
+    DURABILITY_MODES,
+    GROUP_COMMIT_BYTES,
+    GROUP_COMMIT_WINDOW,
+)
+from core.exceptions import FileAccessError, FileNotFoundError
+from core.utils import logger
+
+from .file_manager import FileStorage
+
+
+class Flusher:
+    """A background thread that fsyncs files on behalf of many commits.
+
+    Commits submit the files they wrote. The flusher collects submissions for up to
+    `window` seconds, then fsyncs every collected file once. Commits that wait are
+    released together once their batch is synced, so N concurrent commits cost one
+    fsync per file instead of N. Commits that arrive while a batch is being synced
+    form the next batch.
+
+    The window ends early once `max_bytes` are pending, or once as many commits wait
+    as waited for the last batch, so a lone committer is synced at once instead of
+    waiting for others that are not coming. Submissions that do not wait are always
+    collected for the whole window.
+    """
+
+    def __init__(self, window, max_bytes, data_only=False):
+        """Initialize an idle flusher. The thread starts on the first submission.
+
+        Args:
+            window (float): Seconds to collect commits before syncing.
+            max_bytes (int): Sync early once this many bytes are pending.
+            data_only (bool, optional): Use fdatasync instead of fsync. Defaults to False.
+        """
+        self.window = window
+        self.max_bytes = max_bytes
+        self.data_only = data_only
+        self.cond = threading.Condition()
+        self.pending = set()
+        self.pending_bytes = 0
+        self.batch = 0  # id of the batch currently being collected
+        self.synced = -1  # id of the last batch that reached disk
+        self.waiting = 0  # commits waiting for the batch being collected
+        self.expected = 1  # commits that waited for the last batch
+        self.errors = {}  # batch id -> [exception, commits yet to report it]
+        self.thread = None
+
+    def submit(self, paths, nbytes=0, wait=True):
+        """Hand files to the flusher.
+
+        Args:
+            paths (Iterable[str]): Files written by the commit.
+            nbytes (int, optional): Bytes written by the commit. Defaults to 0.
+            wait (bool, optional): Block until the files are synced. Defaults to True.
+
+        Raises:
+            FileAccessError: If the batch containing this commit failed to sync.
+        """
+        with self.cond:
+            if self.thread is None:
+                self.thread = threading.Thread(
+                    target=self.__run, name="storage-engine-flusher", daemon=True
+                )
+                self.thread.start()
+
+            self.pending.update(paths)
+            self.pending_bytes += nbytes
+            batch = self.batch
+            if wait:
+                self.waiting += 1
+            self.cond.notify_all()
+
+            if not wait:
+                return
+            while self.synced < batch:
+                self.cond.wait()
+            failure = self.errors.get(batch)
+            if failure is not None:
+                # every commit of the batch reports the error once, then it is dropped
+                failure[1] -= 1
+                if not failure[1]:
+                    del self.errors[batch]
+                raise FileAccessError(f"Group commit failed to sync: {failure[0]}")
+
+    def flush(self):
+        """Synchronously sync everything that is pending."""
+        with self.cond:
+            paths, self.pending = self.pending, set()
+            self.pending_bytes = 0
+        self.__sync(paths)
+
+    def __sync(self, paths):
+        for path in paths:
+            FileStorage.sync(path, self.data_only)
+
+    def __run(self):
+        while True:
+            with self.cond:
+                while not self.pending:
+                    self.cond.wait()
+
+                deadline = time.monotonic() + self.window
+                while self.pending_bytes < self.max_bytes and not (
+                    self.waiting and self.waiting >= self.expected
+                ):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.cond.wait(remaining)
+
+                batch = self.batch
+                paths, self.pending = self.pending, set()
+                self.pending_bytes = 0
+                waiting, self.waiting = self.waiting, 0
+                self.expected = max(waiting, 1)
+                self.batch += 1
+
+            error = None
+            try:
+                self.__sync(paths)
+            except (FileAccessError, FileNotFoundError) as e:
+                logger.error(f"Flusher: Failed to sync batch {batch}: {e}")
+                error = e
+
+            with self.cond:
+                if error is not None and waiting:
+                    self.errors[batch] = [error, waiting]
+                self.synced = batch
+                self.cond.notify_all()
+
+
+# Shared flushers, one per background durability mode
+group_commit = Flusher(GROUP_COMMIT_WINDOW, GROUP_COMMIT_BYTES)
+background_flush = Flusher(ASYNC_FLUSH_INTERVAL, GROUP_COMMIT_BYTES, data_only=True)
+atexit.register(background_flush.flush)
+
+
+def validate_durability(durability):
+    """Check that a durability mode is one of DURABILITY_MODES.
+
+    Args:
+        durability (str): The durability mode.
+
+    Returns:
+        str: The durability mode.
+
+    Raises:
+        ValueError: If the mode is unknown.
+    """
+    if durability not in DURABILITY_MODES:
+        raise ValueError(
+            f"Unknown durability mode '{durability}', expected one of {DURABILITY_MODES}"
+        )
+    return durability
+
+
+def commit_files(paths, nbytes, durability):
+    """Make writes to a set of files durable according to a durability mode.
+
+    Args:
+        paths (Iterable[str]): Files written since the last commit.
+        nbytes (int): Bytes written since the last commit.
+        durability (str): One of DURABILITY_MODES.
+
+    Raises:
+        FileAccessError: If the files could not be synced.
+        FileNotFoundError: If one of the files does not exist.
+    """
+    if durability == DURABILITY_FSYNC:
+        for path in paths:
+            FileStorage.sync(path)
+    elif durability == DURABILITY_FDATASYNC:
+        for path in paths:
+            FileStorage.sync(path, data_only=True)
+    elif durability == DURABILITY_GROUP:
+        group_commit.submit(paths, nbytes)
+    elif durability == DURABILITY_ASYNC:
+        background_flush.submit(paths, nbytes, wait=False)
@@ -1,12 +1,101 @@
 import os
+import errno
+import mmap
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
 
-from core.utils import logger
+from core.constants import MAX_OPEN_FILES
+from core.utils import logger, metrics
 from core.exceptions import FileAccessError, FileNotFoundError, DirectoryAccessError
 
 
+class DescriptorPool:
+    """A bounded pool of open file descriptors, keyed by path.
+
+    Descriptors stay open between calls and are closed least-recently-used first once
+    more than max_open files are open. A descriptor that is currently leased is never
+    closed, so the pool may briefly exceed its limit under heavy concurrency.
+    """
+
+    def __init__(self, max_open=MAX_OPEN_FILES):
+        """Initialize an empty descriptor pool.
+
+        Args:
+            max_open (int, optional): Number of descriptors to keep open. Defaults to MAX_OPEN_FILES.
+        """
+        self.max_open = max_open
+        self.descriptors = OrderedDict()  # path -> [fd, lease_count]
+        self.lock = threading.Lock()
+
+    def __evict(self):
+        """Close idle descriptors until the pool is back under its limit."""
+        for path in list(self.descriptors):
+            if len(self.descriptors) <= self.max_open:
+                return
+            fd, leases = self.descriptors[path]
+            if leases == 0:
+                logger.debug("FileStorage: Closing idle descriptor for %s", path)
+                del self.descriptors[path]
+                os.close(fd)
+
+    @contextmanager
+    def lease(self, path, create=False):
+        """Lease an open descriptor for a path, opening the file if needed.
+
+        Args:
+            path (str): The file path.
+            create (bool, optional): Create the file if it does not exist. Defaults to False.
+
+        Yields:
+            int: An open read/write file descriptor.
+
+        Raises:
+            OSError: If the file cannot be opened.
+        """
+        with self.lock:
+            entry = self.descriptors.get(path)
+            if entry is None:
+                flags = os.O_RDWR | (os.O_CREAT if create else 0)
+                entry = [os.open(path, flags, 0o644), 0]
+                self.descriptors[path] = entry
+                self.__evict()
+            self.descriptors.move_to_end(path)
+            entry[1] += 1
+        try:
+            yield entry[0]
+        finally:
+            with self.lock:
+                entry[1] -= 1
+                # the entry was dropped while leased, the path may have been reopened
+                if self.descriptors.get(path) is not entry and entry[1] == 0:
+                    os.close(entry[0])
+
+    def close(self, path):
+        """Close the descriptor for a path, e.g. before the file is renamed or removed.
+
+        Args:
+            path (str): The file path.
+        """
+        with self.lock:
+            entry = self.descriptors.pop(path, None)
+            if entry is not None and entry[1] == 0:
+                os.close(entry[0])
+
+    def close_all(self):
+        """Close every idle descriptor in the pool."""
+        with self.lock:
+            for path in list(self.descriptors):
+                fd, leases = self.descriptors.pop(path)
+                if leases == 0:
+                    os.close(fd)
+
+
 class FileStorage:
     """A class for handling file storage operations such as creating folders, writing data, and reading data."""
 
+    descriptors = DescriptorPool()
+
     @staticmethod
     def create_folder_if_not_exists(folder_name):
         """Create a folder if it does not exist.
@@ -20,7 +109,7 @@ class FileStorage:
         Raises:
             DirectoryAccessError: If the directory cannot be created due to permissions or other OS errors.
         """
-        logger.debug(f"FileStorage: Creating folder {folder_name}")
+        logger.debug("FileStorage: Creating folder %s", folder_name)
         try:
             os.makedirs(folder_name, exist_ok=True)
             return folder_name
@@ -28,37 +117,194 @@ class FileStorage:
             raise DirectoryAccessError(f"Failed to create directory {folder_name}: {e}")
 
     @staticmethod
-    def write_data(path, data, offset=0):
+    def write_data(path, data, offset=0, sync=True):
         """Write data to a file at a specified offset.
 
+        The file is created if needed. Writes use os.pwrite on a pooled descriptor, so
+        concurrent callers never race on a shared file position.
+
         Args:
             path (str): The file path to write to.
             data (bytes): The data to write.
             offset (int, optional): The offset to start writing from. Defaults to 0.
+            sync (bool, optional): fsync the file before returning. Defaults to True.
 
         Raises:
             FileAccessError: If there are permission issues or OS errors during writing.
             FileNotFoundError: If the file path is invalid.
         """
-        logger.debug(f"FileStorage: Write to file {path} with offset {offset}")
+        logger.debug("FileStorage: Write to file %s with offset %s", path, offset)
         try:
-            mode = "r+b" if os.path.exists(path) else "w+b"
-            with open(path, mode) as f:
-                f.seek(offset)
-                f.write(data)
-                f.flush()
-                os.fsync(f.fileno())
+            with FileStorage.descriptors.lease(path, create=True) as fd:
+                started = metrics.start()
+                view = memoryview(data)
+                metrics.increment("file_write_bytes", len(view))
+                while view:
+                    written = os.pwrite(fd, view, offset)
+                    view = view[written:]
+                    offset += written
+                metrics.stop("file_write_seconds", started)
+                if sync:
+                    started = metrics.start()
+                    os.fsync(fd)
+                    metrics.stop("file_sync_seconds", started)
         except PermissionError:
             raise FileAccessError(f"Permission denied for file {path}")
-        except FileNotFoundError:
-            raise FileNotFoundError(f"File not found: {path}")
         except OSError as e:
+            if e.errno == errno.ENOENT:
+                raise FileNotFoundError(f"File not found: {path}")
             raise FileAccessError(f"OS error writing to {path}: {e}")
 
+    @staticmethod
+    def sync(path, data_only=False):
+        """Flush a file's written data to stable storage.
+
+        Args:
+            path (str): The file path to flush.
+            data_only (bool, optional): Use fdatasync and skip file metadata that is not
+                needed to read the data back. Defaults to False.
+
+        Raises:
+            FileAccessError: If there are permission issues or OS errors during syncing.
+            FileNotFoundError: If the file does not exist.
+        """
+        logger.debug("FileStorage: Syncing file %s", path)
+        try:
+            with FileStorage.descriptors.lease(path) as fd:
+                started = metrics.start()
+                if data_only:
+                    os.fdatasync(fd)
+                else:
+                    os.fsync(fd)
+                metrics.stop("file_sync_seconds", started)
+        except PermissionError:
+            raise FileAccessError(f"Permission denied for file {path}")
+        except OSError as e:
+            if e.errno == errno.ENOENT:
+                raise FileNotFoundError(f"File not found: {path}")
+            raise FileAccessError(f"OS error syncing {path}: {e}")
+
+    @staticmethod
+    def advise_sequential(path):
+        """Tell the kernel a file is about to be read sequentially, where supported.
+
+        This lets the kernel read ahead more aggressively. It is a hint only, so
+        platforms without posix_fadvise and errors are silently ignored.
+
+        Args:
+            path (str): The file path.
+        """
+        if not hasattr(os, "posix_fadvise"):
+            return
+        try:
+            with FileStorage.descriptors.lease(path) as fd:
+                os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        except OSError as e:
+            logger.debug("FileStorage: posix_fadvise failed for %s: %s", path, e)
+
+    @staticmethod
+    def map_file(path):
+        """Map a whole file read-only into memory.
+
+        The mapping is shared with the kernel page cache, so later writes through
+        write_data are visible in it. It does not grow with the file; map the file
+        again to see data appended after mapping.
+
+        Args:
+            path (str): The file path to map.
+
+        Returns:
+            mmap.mmap | None: The mapping, or None if the file is empty.
+
+        Raises:
+            FileAccessError: If there are permission issues or OS errors during mapping.
+            FileNotFoundError: If the file does not exist.
+        """
+        logger.debug("FileStorage: Mapping file %s", path)
+        try:
+            with FileStorage.descriptors.lease(path) as fd:
+                size = os.fstat(fd).st_size
+                if size == 0:
+                    return None
+                return mmap.mmap(fd, size, access=mmap.ACCESS_READ)
+        except PermissionError:
+            raise FileAccessError(f"Permission denied for file {path}")
+        except OSError as e:
+            if e.errno == errno.ENOENT:
+                raise FileNotFoundError(f"File not found: {path}")
+            raise FileAccessError(f"OS error mapping {path}: {e}")
+
+    @staticmethod
+    def truncate(path, size=0):
+        """Truncate a file to the given size and fsync it.
+
+        Args:
+            path (str): The file path to truncate.
+            size (int, optional): The new file size in bytes. Defaults to 0.
+
+        Raises:
+            FileAccessError: If there are permission issues or OS errors during truncating.
+            FileNotFoundError: If the file does not exist.
+        """
+        logger.debug("FileStorage: Truncating file %s to %s bytes", path, size)
+        try:
+            with FileStorage.descriptors.lease(path) as fd:
+                os.ftruncate(fd, size)
+                started = metrics.start()
+                os.fsync(fd)
+                metrics.stop("file_sync_seconds", started)
+        except PermissionError:
+            raise FileAccessError(f"Permission denied for file {path}")
+        except OSError as e:
+            if e.errno == errno.ENOENT:
+                raise FileNotFoundError(f"File not found: {path}")
+            raise FileAccessError(f"OS error truncating {path}: {e}")
+
+    @staticmethod
+    def replace_data(path, data):
+        """Atomically replace the contents of a file and sync it.
+
+        The data is written and synced to a temporary file next to the target, which is
+        then renamed over it, so a crash leaves either the old or the new contents.
+
+        Args:
+            path (str): The file path to replace.
+            data (bytes): The new contents.
+
+        Raises:
+            FileAccessError: If there are permission issues or OS errors during writing.
+            FileNotFoundError: If the file path is invalid.
+        """
+        logger.debug("FileStorage: Replacing file %s", path)
+        temp_path = f"{path}.tmp"
+        FileStorage.write_data(temp_path, data, sync=False)
+        # truncate syncs the temporary file once, before the rename
+        FileStorage.truncate(temp_path, len(data))
+        FileStorage.descriptors.close(temp_path)
+        FileStorage.descriptors.close(path)
+        try:
+            os.replace(temp_path, path)
+            folder = os.open(os.path.dirname(path) or ".", os.O_RDONLY)
+            try:
+                started = metrics.start()
+                os.fsync(folder)
+                metrics.stop("file_sync_seconds", started)
+            finally:
+                os.close(folder)
+        except PermissionError:
+            raise FileAccessError(f"Permission denied for file {path}")
+        except OSError as e:
+            if e.errno == errno.ENOENT:
+                raise FileNotFoundError(f"File not found: {path}")
+            raise FileAccessError(f"OS error replacing {path}: {e}")
+
     @staticmethod
     def read_data(path, offset=0, size=-1):
         """Read data from a file.
 
+        Reads use os.pread on a pooled descriptor, so concurrent callers never race on a
+        shared file position.
+
         Args:
             path (str): The file path to read from.
             offset (int, optional): The offset to start reading from. Defaults to 0 (beginning).
@@ -72,18 +318,29 @@ class FileStorage:
             FileNotFoundError: If the file does not exist.
         """
         logger.debug(
-            f"FileStorage: Reading file {path} from offset {offset}, size {size}"
+            "FileStorage: Reading file %s from offset %s, size %s", path, offset, size
         )
+        offset = max(offset, 0)
         try:
-            with open(path, "rb") as f:
-                if offset >= 0:
-                    f.seek(offset)  # move file pointer to the given offset
-                if size > 0:
-                    return f.read(size)  # read 'size' bytes from that position
-                return f.read()  # read entire file
-        except FileNotFoundError:
-            raise FileNotFoundError(f"File not found: {path}")
+            with FileStorage.descriptors.lease(path) as fd:
+                started = metrics.start()
+                if size <= 0:
+                    size = max(os.fstat(fd).st_size - offset, 0)
+                chunks = []
+                while size > 0:
+                    chunk = os.pread(fd, size, offset)
+                    if not chunk:
+                        break
+                    chunks.append(chunk)
+                    offset += len(chunk)
+                    size -= len(chunk)
+                data = chunks[0] if len(chunks) == 1 else b"".join(chunks)
+                metrics.stop("file_read_seconds", started)
+                metrics.increment("file_read_bytes", len(data))
+                return data
         except PermissionError:
             raise FileAccessError(f"Permission denied for file {path}")
         except OSError as e:
+            if e.errno == errno.ENOENT:
+                raise FileNotFoundError(f"File not found: {path}")
             raise FileAccessError(f"OS error reading from {path}: {e}")
@@ -0,0 +1,197 @@
+import os
+import threading
+
+from core.constants import FSM_CATEGORIES, FSM_FILE_NAME, PAGE_SIZE
+from core.exceptions import FileAccessError, FileNotFoundError
+from core.utils import logger
+
+from .file_manager import FileStorage
+from .wal import wal
+
+FSM_STEP = PAGE_SIZE // FSM_CATEGORIES
+
+
+class FreeSpaceMap:
+    """Tracks roughly how much free space every page of a relation has.
+
+    Each page gets a one-byte category, the number of FSM_STEP byte blocks free in it.
+    The categories are the leaves of an in-memory max-tree where every inner node
+    holds the largest category below it. Finding a page with at least N free bytes
+    walks down from the root, which takes O(log n) steps. Only the leaves are stored on
+    disk, in fsm.pydb next to the relation files.
+
+    The map is a hint. It is not logged and is only written at checkpoints, so callers
+    check the page header before they use a page and correct the map if it was wrong.
+    """
+
+    def __init__(self, folder):
+        """Initialize a free space map and load it from disk if it exists.
+
+        Args:
+            folder (str): The relation folder holding fsm.pydb.
+
+        Raises:
+            RuntimeError: If there are unrecoverable I/O errors during loading.
+        """
+        self.path = os.path.join(folder, FSM_FILE_NAME)
+        self.lock = threading.Lock()
+        self.page_count = 0
+        self.leaf_count = 1
+        self.tree = bytearray(2)
+        self.dirty = False
+        self.missing = False
+        self.__load()
+
+    def __load(self):
+        logger.debug("FreeSpaceMap: Loading %s", self.path)
+        try:
+            leaves = FileStorage.read_data(self.path)
+        except FileNotFoundError:
+            self.missing = True
+            return
+        except FileAccessError as e:
+            logger.error(f"Failed to read free space map {self.path}: {e}")
+            raise RuntimeError(
+                f"Unrecoverable error: Failed to read free space map {self.path}: {e}"
+            )
+        self.__resize(len(leaves))
+        self.tree[self.leaf_count : self.leaf_count + len(leaves)] = leaves
+        self.page_count = len(leaves)
+        self.__rebuild()
+
+    def __resize(self, page_count):
+        """Grow the tree so it has a leaf for page_count pages."""
+        leaf_count = self.leaf_count
+        while leaf_count < page_count:
+            leaf_count *= 2
+        if leaf_count == self.leaf_count:
+            return
+
+        leaves = self.tree[self.leaf_count : self.leaf_count + self.page_count]
+        self.leaf_count = leaf_count
+        self.tree = bytearray(2 * leaf_count)
+        self.tree[leaf_count : leaf_count + len(leaves)] = leaves
+        self.__rebuild()
+
+    def __rebuild(self):
+        tree = self.tree
+        for node in range(self.leaf_count - 1, 0, -1):
+            tree[node] = max(tree[2 * node], tree[2 * node + 1])
+
+    def update(self, page_id, free_space):
+        """Record the free space of a page.
+
+        Args:
+            page_id (int): The ID of the page.
+            free_space (int): Free bytes in the page.
+        """
+        category = min(free_space // FSM_STEP, FSM_CATEGORIES - 1)
+        with self.lock:
+            if page_id >= self.page_count:
+                self.__resize(page_id + 1)
+                self.page_count = page_id + 1
+                self.dirty = True
+
+            tree = self.tree
+            node = self.leaf_count + page_id
+            if tree[node] == category:
+                return
+            tree[node] = category
+            self.dirty = True
+
+            node //= 2
+            while node:
+                value = max(tree[2 * node], tree[2 * node + 1])
+                if tree[node] == value:
+                    break
+                tree[node] = value
+                node //= 2
+
+    def find(self, needed, start=0):
+        """Find a page that should have at least the requested free space.
+
+        The lowest such page ID is returned, which keeps the start of the relation dense.
+
+        Args:
+            needed (int): The number of free bytes required.
+            start (int, optional): Lowest page ID to consider, to look past pages the
+                caller could not use. Defaults to 0.
+
+        Returns:
+            int | None: The page ID, or None if no page has enough space.
+        """
+        category = -(-needed // FSM_STEP)
+        if category >= FSM_CATEGORIES:
+            return None
+
+        with self.lock:
+            tree = self.tree
+            if start >= self.leaf_count:
+                return None
+            node = self.leaf_count + start
+            while tree[node] < category:
+                # climb out of right children, then move to the next subtree
+                while node & 1:
+                    node //= 2
+                if not node:
+                    return None
+                node += 1
+            while node < self.leaf_count:
+                node *= 2
+                if tree[node] < category:
+                    node += 1
+            return node - self.leaf_count
+
+    def save(self):
+        """Write the map to disk if it changed. The file is synced by the checkpoint.
+
+        Raises:
+            RuntimeError: If there are unrecoverable I/O errors during writing.
+        """
+        with self.lock:
+            if not self.dirty:
+                return
+            logger.debug("FreeSpaceMap: Saving %s", self.path)
+            leaves = self.tree[self.leaf_count : self.leaf_count + self.page_count]
+            try:
+                FileStorage.write_data(self.path, leaves, sync=False)
+                wal.track(self.path)
+            except (FileAccessError, FileNotFoundError) as e:
+                logger.error(f"Failed to write free space map {self.path}: {e}")
+                raise RuntimeError(
+                    f"Unrecoverable error: Failed to write free space map {self.path}: {e}"
+                )
+            self.dirty = False
+
+
+# Free space maps shared by every Page of a relation, keyed by relation folder
+free_space_maps = {}
+free_space_maps_lock = threading.Lock()
+
+
+def get_free_space_map(relation):
+    """Return the shared free space map of a relation, loading it on first use.
+
+    Args:
+        relation (Relation): The relation.
+
+    Returns:
+        FreeSpaceMap: The free space map.
+    """
+    with free_space_maps_lock:
+        fsm = free_space_maps.get(relation.folder)
+        if fsm is None:
+            fsm = free_space_maps[relation.folder] = FreeSpaceMap(relation.folder)
+        return fsm
+
+
+def save_free_space_maps():
+    """Write every changed free space map to disk.
+
+    Raises:
+        RuntimeError: If there are unrecoverable I/O errors during writing.
+    """
+    with free_space_maps_lock:
+        maps = list(free_space_maps.values())
+    for fsm in maps:
+        fsm.save()
@@ -0,0 +1,465 @@
+import struct
+import zlib
+
+from core.constants import (
+    HASH_FILE_NAME_FORMAT,
+    HASH_FILL_FACTOR,
+    HASH_META_FORMAT,
+    INDEX_NODE_HEADER_FORMAT,
+    PAGE_SIZE,
+    ROW_OFFSET_FORMAT,
+)
+from core.utils import logger
+
+from .binary import ENCODERS, NO_NULL_BIT, VAR_OFFSET_MASK, VARIABLE_KEY
+from .buffer_pool import buffer_pool
+from .index import (
+    NO_PAGE,
+    NODE_COUNT_OFFSET,
+    NODE_HEADER_SIZE,
+    IndexFile,
+    make_node,
+    register_index_kind,
+)
+
+LOCATION_FORMAT = "<IH"  # page_id, slot
+LOCATION_SIZE = struct.calcsize(LOCATION_FORMAT)
+SPLIT_GROUPS = 32
+
+BUCKET = 3
+OVERFLOW = 4
+FREE = 5
+
+
+def split_group(bucket):
+    """Return the split group of a bucket: 0 for bucket 0, then one per doubling."""
+    return bucket.bit_length()
+
+
+class HashIndex(IndexFile):
+    """A linear hash index mapping a column value to tuple locations.
+
+    Entries are the raw key bytes of the column followed by the tuple location. A key
+    is hashed with CRC-32 and the low bits pick one of max_bucket + 1 buckets. Each
+    bucket is a primary page plus a chain of overflow pages. Once the buckets are
+    HASH_FILL_FACTOR full on average, the next bucket in order is split in two, so
+    the index grows one bucket at a time and never rehashes everything at once.
+
+    Primary pages of each split group (a doubling of the bucket count) are reserved
+    together when the group starts, so bucket b is always at page
+    1 + b + spares[group], where spares counts the overflow pages allocated before
+    the group. Overflow pages freed by splits are reused. A lookup reads the primary
+    page and, only for crowded buckets, its overflow pages.
+    """
+
+    FILE_NAME_FORMAT = HASH_FILE_NAME_FORMAT
+    META_FORMAT = HASH_META_FORMAT
+    KEY_TYPES = ("integer", "datetime", "varchar")
+
+    def __init__(
+        self,
+        folder,
+        column,
+        key_offset=None,
+        key_type=None,
+        key_length=8,
+        null_bit=NO_NULL_BIT,
+    ):
+        """Open the hash index of a column, or prepare a new one.
+
+        Args:
+            folder (str): The relation folder.
+            column (str): The indexed column.
+            key_offset (int, optional): Where the column is in a row, see the key_offsets
+                of the row codec. Required for a new index.
+            key_type (str, optional): Base type of the column. Required for a new index.
+            key_length (int, optional): Size of a key, the declared length of a VARCHAR
+                column. Defaults to 8.
+            null_bit (int, optional): Bit of the column in the null bitmap of a row.
+                Defaults to NO_NULL_BIT.
+
+        Raises:
+            RuntimeError: If there are unrecoverable I/O errors or the metadata is corrupted.
+        """
+        self.key_length = key_length
+        self.max_bucket = 1
+        self.low_mask = 0
+        self.high_mask = 1
+        self.free_page = NO_PAGE
+        self.spares = [0] * SPLIT_GROUPS
+        super().__init__(folder, column, key_offset, key_type, null_bit)
+
+    @property
+    def entry_size(self):
+        return self.key_length + LOCATION_SIZE
+
+    @property
+    def capacity(self):
+        return (PAGE_SIZE - NODE_HEADER_SIZE) // self.entry_size
+
+    def _meta_fields(self):
+        return (
+            self.key_length,
+            self.max_bucket,
+            self.low_mask,
+            self.high_mask,
+            self.free_page,
+            *self.spares,
+        )
+
+    def _load_meta_fields(self, fields):
+        (
+            self.key_length,
+            self.max_bucket,
+            self.low_mask,
+            self.high_mask,
+            self.free_page,
+        ) = fields[:5]
+        self.spares = list(fields[5:])
+
+    def encode(self, value):
+        """Convert a column value into the raw key bytes stored in rows.
+
+        Args:
+            value: A value of the indexed column.
+
+        Returns:
+            bytes | None: The key, or None if the value cannot be in the column.
+        """
+        if self.key_type == "varchar":
+            key = value.encode("utf-8")
+            if len(key) > self.key_length:
+                return None
+            return key.ljust(self.key_length, b"\x00")
+        return struct.pack("<q", ENCODERS[self.key_type](value))
+
+    def key_of(self, tuple_data, offset=0):
+        if self.is_null(tuple_data, offset):
+            return None
+        if self.key_offset & VARIABLE_KEY:
+            # a compact row value, between its start and end in the offset array
+            position = offset + (self.key_offset & ~VARIABLE_KEY)
+            start, end = struct.unpack_from(
+                f"<2{ROW_OFFSET_FORMAT}", tuple_data, position
+            )
+            start = offset + (start & VAR_OFFSET_MASK)
+            key = tuple_data[start : offset + (end & VAR_OFFSET_MASK)]
+            return bytes(key).ljust(self.key_length, b"\x00")
+        start = offset + self.key_offset
+        return bytes(tuple_data[start : start + self.key_length])
+
+    def __bucket(self, key):
+        bucket = zlib.crc32(key) & self.high_mask
+        if bucket > self.max_bucket:
+            bucket &= self.low_mask
+        return bucket
+
+    def __bucket_page(self, bucket):
+        return 1 + bucket + self.spares[split_group(bucket)]
+
+    def __allocate(self, data):
+        """Store a page in a free overflow page, or in a new one."""
+        if self.free_page == NO_PAGE:
+            return self.new_page(data)
+
+        page_id = self.free_page
+        frame = buffer_pool.fetch_page(self, page_id)
+        try:
+            _, _, self.free_page = struct.unpack_from(
+                INDEX_NODE_HEADER_FORMAT, frame.data
+            )
+            frame.data[:] = data
+            frame.dirty = True
+        finally:
+            buffer_pool.unpin_page(frame)
+        return page_id
+
+    def __free(self, page_id):
+        frame = buffer_pool.put_page(self, page_id, make_node(FREE, 0, self.free_page))
+        buffer_pool.unpin_page(frame)
+        self.free_page = page_id
+
+    def __read_chain(self, page_id):
+        """Return the page IDs of a bucket chain and all of its entries."""
+        page_ids = []
+        entries = bytearray()
+        while page_id != NO_PAGE:
+            page_ids.append(page_id)
+            frame = buffer_pool.fetch_page(self, page_id)
+            try:
+                _, count, link = struct.unpack_from(
+                    INDEX_NODE_HEADER_FORMAT, frame.data
+                )
+                entries += frame.data[
+                    NODE_HEADER_SIZE : NODE_HEADER_SIZE + count * self.entry_size
+                ]
+            finally:
+                buffer_pool.unpin_page(frame)
+            page_id = link
+        return page_ids, entries
+
+    def __write_chain(self, page_ids, entries):
+        """Rewrite a bucket chain, reusing its pages and freeing those left over.
+
+        Args:
+            page_ids (list[int]): The chain pages, starting with the primary page.
+            entries (bytes): Every entry of the bucket.
+        """
+        chunk = self.capacity * self.entry_size
+        chunks = [entries[i : i + chunk] for i in range(0, len(entries), chunk)]
+        chunks = chunks or [b""]
+
+        pages = list(page_ids[: len(chunks)])
+        for page_id in page_ids[len(chunks) :]:
+            self.__free(page_id)
+        # allocate missing pages last to first so each one can link to the next
+        link = NO_PAGE
+        for n in range(len(chunks) - 1, 0, -1):
+            data = make_node(
+                OVERFLOW, len(chunks[n]) // self.entry_size, link, chunks[n]
+            )
+            if n < len(pages):
+                buffer_pool.unpin_page(buffer_pool.put_page(self, pages[n], data))
+                link = pages[n]
+            else:
+                link = self.__allocate(data)
+        data = make_node(BUCKET, len(chunks[0]) // self.entry_size, link, chunks[0])
+        buffer_pool.unpin_page(buffer_pool.put_page(self, pages[0], data))
+
+    def __split(self):
+        """Split the next bucket in order, growing the index by one bucket."""
+        new_bucket = self.max_bucket + 1
+        old_bucket = new_bucket & self.low_mask
+        if new_bucket > self.high_mask:
+            self.low_mask = self.high_mask
+            self.high_mask = (new_bucket << 1) - 1
+
+        group = split_group(new_bucket)
+        if new_bucket == 1 << (group - 1):
+            # first bucket of a new group: reserve the primary pages of the group
+            self.spares[group] = self.total_pages - 1 - new_bucket
+            self.total_pages += 1 << (group - 1)
+        self.max_bucket = new_bucket
+
+        logger.debug("HashIndex: Splitting bucket %s into %s", old_bucket, new_bucket)
+        page_ids, entries = self.__read_chain(self.__bucket_page(old_bucket))
+        size = self.entry_size
+        stay = bytearray()
+        move = bytearray()
+        for offset in range(0, len(entries), size):
+            entry = entries[offset : offset + size]
+            if self.__bucket(bytes(entry[: self.key_length])) == new_bucket:
+                move += entry
+            else:
+                stay += entry
+        self.__write_chain(page_ids, stay)
+        self.__write_chain([self.__bucket_page(new_bucket)], move)
+
+    def insert(self, key, page_id, slot):
+        """Add the location of a tuple under a key.
+
+        Args:
+            key (bytes): The raw key bytes.
+            page_id (int): The page holding the tuple.
+            slot (int): The slot of the tuple.
+
+        Returns:
+            bool: Always True.
+
+        Raises:
+            RuntimeError: If there are unrecoverable I/O errors.
+        """
+        entry = key + struct.pack(LOCATION_FORMAT, page_id, slot)
+        with self.lock:
+            self.begin_write()
+            node_id = self.__bucket_page(self.__bucket(key))
+            while True:
+                frame = buffer_pool.fetch_page(self, node_id)
+                try:
+                    _, count, link = struct.unpack_from(
+                        INDEX_NODE_HEADER_FORMAT, frame.data
+                    )
+                    if count < self.capacity:
+                        offset = NODE_HEADER_SIZE + count * self.entry_size
+                        frame.data[offset : offset + self.entry_size] = entry
+                        struct.pack_into("<H", frame.data, NODE_COUNT_OFFSET, count + 1)
+                        frame.dirty = True
+                        break
+                    if link == NO_PAGE:
+                        link = self.__allocate(make_node(OVERFLOW, 1, NO_PAGE, entry))
+                        struct.pack_into("<I", frame.data, NODE_COUNT_OFFSET + 2, link)
+                        frame.dirty = True
+                        break
+                finally:
+                    buffer_pool.unpin_page(frame)
+                node_id = link
+
+            self.entry_count += 1
+            buckets = self.max_bucket + 1
+            if self.entry_count > HASH_FILL_FACTOR * self.capacity * buckets:
+                self.__split()
+            return True
+
+    def delete(self, key, page_id, slot):
+        """Remove the location of a tuple from under a key.
+
+        The last entry of the page takes the place of the removed one. Pages emptied
+        in an overflow chain are filled again by later inserts and freed by the next
+        split of the bucket.
+
+        Args:
+            key (bytes): The raw key bytes.
+            page_id (int): The page holding the tuple.
+            slot (int): The slot of the tuple.
+
+        Returns:
+            bool: False if the entry was not in the index.
+
+        Raises:
+            RuntimeError: If there are unrecoverable I/O errors.
+        """
+        entry = key + struct.pack(LOCATION_FORMAT, page_id, slot)
+        size = self.entry_size
+        with self.lock:
+            self.begin_write()
+            node_id = self.__bucket_page(self.__bucket(key))
+            while node_id != NO_PAGE:
+                frame = buffer_pool.fetch_page(self, node_id)
+                try:
+                    page = frame.data
+                    _, count, link = struct.unpack_from(INDEX_NODE_HEADER_FORMAT, page)
+                    end = NODE_HEADER_SIZE + count * size
+                    position = page.find(entry, NODE_HEADER_SIZE, end)
+                    while position != -1 and (position - NODE_HEADER_SIZE) % size:
+                        position = page.find(entry, position + 1, end)
+                    if position != -1:
+                        page[position : position + size] = page[end - size : end]
+                        page[end - size : end] = bytes(size)
+                        struct.pack_into("<H", page, NODE_COUNT_OFFSET, count - 1)
+                        frame.dirty = True
+                        self.entry_count -= 1
+                        return True
+                finally:
+                    buffer_pool.unpin_page(frame)
+                node_id = link
+            return False
+
+    def __probe(self, page, count, key, results):
+        """Append the locations of every entry of a page matching key to results."""
+        size = self.entry_size
+        end = NODE_HEADER_SIZE + count * size
+        position = page.find(key, NODE_HEADER_SIZE, end)
+        while position != -1:
+            if (position - NODE_HEADER_SIZE) % size == 0:
+                results.append(
+                    struct.unpack_from(
+                        LOCATION_FORMAT, page, position + self.key_length
+                    )
+                )
+            position = page.find(key, position + 1, end)
+
+    def search(self, key):
+        """Return the locations of every tuple with a key.
+
+        Args:
+            key (bytes | None): The raw key bytes, see encode.
+
+        Returns:
+            list[tuple]: (page_id, slot) pairs in no particular order.
+        """
+        return self.lookup_many([key])[key]
+
+    def lookup_many(self, keys):
+        """Return the locations of many keys, reading each bucket chain once.
+
+        Probes are grouped by bucket, and buckets are visited in page order.
+
+        Args:
+            keys (Iterable[bytes | None]): The raw key bytes, see encode.
+
+        Returns:
+            dict: key -> list of (page_id, slot) pairs.
+        """
+        results = {}
+        buckets = {}
+        with self.lock:
+            for key in keys:
+                if key in results:
+                    continue
+                results[key] = []
+                if key is not None and len(key) == self.key_length:
+                    buckets.setdefault(self.__bucket(key), []).append(key)
+
+            for bucket in sorted(buckets):
+                node_id = self.__bucket_page(bucket)
+                while node_id != NO_PAGE:
+                    frame = buffer_pool.fetch_page(self, node_id)
+                    try:
+                        _, count, node_id = struct.unpack_from(
+                            INDEX_NODE_HEADER_FORMAT, frame.data
+                        )
+                        for key in buckets[bucket]:
+                            self.__probe(frame.data, count, key, results[key])
+                    finally:
+                        buffer_pool.unpin_page(frame)
+        return results
+
+    def build(self, entries):
+        """Replace the index with one bulk-built from a set of entries.
+
+        The bucket count is chosen up front so buckets start HASH_FILL_FACTOR full,
+        and the whole file is written with one write and synced.
+
+        Args:
+            entries (Iterable[tuple]): (key, page_id, slot) for every tuple.
+
+        Raises:
+            RuntimeError: If there are unrecoverable I/O errors during writing.
+        """
+        entries = list(entries)
+        per_bucket = max(1, int(self.capacity * HASH_FILL_FACTOR))
+        max_bucket = max(1, -(-len(entries) // per_bucket) - 1)
+        logger.debug(
+            "HashIndex: Building %s from %s entries in %s buckets",
+            self.path,
+            len(entries),
+            max_bucket + 1,
+        )
+
+        with self.lock:
+            self.max_bucket = max_bucket
+            self.high_mask = (1 << max_bucket.bit_length()) - 1
+            self.low_mask = self.high_mask >> 1
+            self.free_page = NO_PAGE
+            self.spares = [0] * SPLIT_GROUPS
+
+            contents = [bytearray() for _ in range(self.high_mask + 1)]
+            for key, page_id, slot in entries:
+                contents[self.__bucket(key)] += key + struct.pack(
+                    LOCATION_FORMAT, page_id, slot
+                )
+
+            # primary pages of the whole split group first, overflow pages after them
+            chunk = self.capacity * self.entry_size
+            primary = []
+            overflow = []
+            for data in contents:
+                chunks = [data[i : i + chunk] for i in range(0, len(data), chunk)]
+                chunks = chunks or [b""]
+                for n, entries_chunk in enumerate(chunks):
+                    count = len(entries_chunk) // self.entry_size
+                    # the next chunk goes to the next overflow page
+                    link = 1 + len(contents) + len(overflow)
+                    if n + 1 == len(chunks):
+                        link = NO_PAGE
+                    elif n:
+                        link += 1
+                    kind = OVERFLOW if n else BUCKET
+                    node = make_node(kind, count, link, entries_chunk)
+                    (overflow if n else primary).append(node)
+
+            self.entry_count = len(entries)
+            self.replace_pages(primary + overflow)
+
+
+register_index_kind(HashIndex)
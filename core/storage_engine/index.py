@@ -0,0 +1,386 @@
+import os
+import struct
+import threading
+
+from core.constants import (
+    INDEX_META_FORMAT,
+    INDEX_NODE_HEADER_FORMAT,
+    INDEX_VERSION,
+    PAGE_SIZE,
+)
+from core.exceptions import CurrentlyNotSupported, FileAccessError, FileNotFoundError
+from core.utils import logger
+
+from .binary import ENCODERS, NO_NULL_BIT
+from .buffer_pool import buffer_pool
+from .file_manager import FileStorage
+from .wal import wal
+
+INDEX_META_SIZE = struct.calcsize(INDEX_META_FORMAT)
+NODE_HEADER_SIZE = struct.calcsize(INDEX_NODE_HEADER_FORMAT)
+NODE_COUNT_OFFSET = struct.calcsize("<B")
+NO_PAGE = 0xFFFFFFFF
+
+
+def make_node(kind, count, link, entries=b""):
+    """Build an index page with a node header followed by packed entries.
+
+    Args:
+        kind (int): The node kind, defined by the index class.
+        count (int): Number of entries.
+        link (int): The page the node links to, NO_PAGE if none.
+        entries (bytes, optional): The packed entries. Defaults to b"".
+
+    Returns:
+        bytearray: The page.
+    """
+    page = bytearray(PAGE_SIZE)
+    struct.pack_into(INDEX_NODE_HEADER_FORMAT, page, 0, kind, count, link)
+    page[NODE_HEADER_SIZE : NODE_HEADER_SIZE + len(entries)] = entries
+    return page
+
+
+class IndexFile:
+    """Base class of the index files of a relation.
+
+    An index lives in its own file of PAGE_SIZE pages and is cached in the shared
+    buffer pool like relation pages. Page 0 holds the metadata shared by every index
+    kind, followed by the fields of the subclass (META_FORMAT).
+
+    Keys are read straight from packed rows at key_offset. In rows that can hold
+    NULLs, null_bit is the bit of the column in the null bitmap at the start of the
+    row; NULL keys are not indexed.
+
+    Index changes are not written to the write-ahead log. Instead the metadata has a
+    clean flag: it is set by a checkpoint once the index file is synced, and cleared
+    durably before the first change after that. An index that is not clean when it is
+    opened may be missing changes and is rebuilt from the relation. The metadata page
+    is only kept up to date while the index is clean.
+
+    Subclasses set FILE_NAME_FORMAT, META_FORMAT and the column types they can index
+    (KEY_TYPES), pack and unpack their metadata fields in _meta_fields and
+    _load_meta_fields, and implement insert, delete, search and build.
+    """
+
+    FILE_NAME_FORMAT = None
+    META_FORMAT = None
+    KEY_TYPES = ()
+
+    def __init__(
+        self, folder, column, key_offset=None, key_type=None, null_bit=NO_NULL_BIT
+    ):
+        """Open the index of a column, or prepare a new one if it has no file yet.
+
+        Args:
+            folder (str): The relation folder.
+            column (str): The indexed column.
+            key_offset (int, optional): Where the column is in a row, see the key_offsets
+                of the row codec. Required for a new index.
+            key_type (str, optional): Base type of the column. Required for a new index.
+            null_bit (int, optional): Bit of the column in the null bitmap of a row.
+                Defaults to NO_NULL_BIT.
+
+        Raises:
+            RuntimeError: If there are unrecoverable I/O errors or the metadata is corrupted.
+            CurrentlyNotSupported: If the index was written with another file version.
+        """
+        self.column = column
+        self.path = os.path.join(folder, self.FILE_NAME_FORMAT.format(column))
+        self.lock = threading.RLock()
+        self.key_offset = key_offset
+        self.key_type = key_type
+        self.null_bit = null_bit
+        self.total_pages = 0
+        self.entry_count = 0
+        self.clean = False
+        self.needs_rebuild = True
+        if os.path.exists(self.path):
+            self.__load()
+
+    def __load(self):
+        logger.debug("%s: Loading %s", type(self).__name__, self.path)
+        try:
+            raw = FileStorage.read_data(self.path, 0, PAGE_SIZE)
+            (
+                version,
+                self.key_offset,
+                clean,
+                self.total_pages,
+                self.entry_count,
+                key_type,
+                _,
+                self.null_bit,
+            ) = struct.unpack_from(INDEX_META_FORMAT, raw)
+            if version != INDEX_VERSION:
+                logger.error(
+                    "Index %s has unsupported file version %s", self.path, version
+                )
+                raise CurrentlyNotSupported(
+                    f"Index {self.path} has file version {version}, only version "
+                    f"{INDEX_VERSION} can be read"
+                )
+            self._load_meta_fields(
+                struct.unpack_from(self.META_FORMAT, raw, INDEX_META_SIZE)
+            )
+        except (FileAccessError, FileNotFoundError) as e:
+            logger.error(f"Failed to read index metadata from {self.path}: {e}")
+            raise RuntimeError(
+                f"Unrecoverable error: Failed to read index metadata from {self.path}: {e}"
+            )
+        except struct.error as e:
+            logger.error(f"Index file {self.path} is corrupted: {e}")
+            raise RuntimeError(
+                f"Unrecoverable error: Index file {self.path} is corrupted: {e}"
+            )
+        self.key_type = key_type.rstrip(b"\x00").decode("utf-8")
+        self.clean = bool(clean)
+        self.needs_rebuild = not self.clean
+
+    def _meta_fields(self):
+        """Return the subclass metadata fields, packed with META_FORMAT."""
+        raise NotImplementedError
+
+    def _load_meta_fields(self, fields):
+        """Restore the subclass metadata fields unpacked with META_FORMAT."""
+        raise NotImplementedError
+
+    def meta_page(self):
+        """Return the metadata page for the current state of the index."""
+        page = bytearray(PAGE_SIZE)
+        struct.pack_into(
+            INDEX_META_FORMAT,
+            page,
+            0,
+            INDEX_VERSION,
+            self.key_offset,
+            self.clean,
+            self.total_pages,
+            self.entry_count,
+            self.key_type.encode("utf-8"),
+            self.column.encode("utf-8"),
+            self.null_bit,
+        )
+        struct.pack_into(self.META_FORMAT, page, INDEX_META_SIZE, *self._meta_fields())
+        return page
+
+    def write_meta(self, flush=False):
+        """Place the metadata page in the buffer pool, writing it out if flush is set."""
+        frame = buffer_pool.put_page(self, 0, self.meta_page())
+        try:
+            if flush:
+                buffer_pool.flush_page(frame)
+        finally:
+            buffer_pool.unpin_page(frame)
+
+    def read_data(self, offset, size):
+        """Read raw pages for the buffer pool. Missing data reads as empty."""
+        try:
+            return FileStorage.read_data(self.path, offset, size)
+        except FileNotFoundError:
+            return b""
+        except FileAccessError as e:
+            logger.error(f"Failed to read index file {self.path}: {e}")
+            raise RuntimeError(
+                f"Unrecoverable error: Failed to read index file {self.path}: {e}"
+            )
+
+    def write_data(self, data, offset):
+        """Write raw pages for the buffer pool. The file is synced by the next checkpoint."""
+        try:
+            FileStorage.write_data(self.path, data, offset, sync=False)
+            wal.track(self.path)
+        except (FileAccessError, FileNotFoundError) as e:
+            logger.error(f"Failed to write index file {self.path}: {e}")
+            raise RuntimeError(
+                f"Unrecoverable error: Failed to write index file {self.path}: {e}"
+            )
+
+    def sync(self):
+        """Sync the index file to stable storage.
+
+        Raises:
+            RuntimeError: If there are unrecoverable I/O errors during syncing.
+        """
+        try:
+            FileStorage.sync(self.path)
+        except (FileAccessError, FileNotFoundError) as e:
+            logger.error(f"Failed to sync index file {self.path}: {e}")
+            raise RuntimeError(
+                f"Unrecoverable error: Failed to sync index file {self.path}: {e}"
+            )
+
+    def new_page(self, data):
+        """Append a page to the index through the buffer pool.
+
+        Args:
+            data (bytes): The page contents.
+
+        Returns:
+            int: The ID of the new page.
+        """
+        page_id = self.total_pages
+        self.total_pages += 1
+        buffer_pool.unpin_page(buffer_pool.new_page(self, page_id, data))
+        return page_id
+
+    def replace_pages(self, pages):
+        """Replace the whole index file with new pages, bypassing the buffer pool.
+
+        Used by bulk builds. Cached pages are dropped first and the file is synced, but
+        the index stays marked as changed until the next checkpoint.
+
+        Args:
+            pages (list[bytes]): Every page after the metadata page.
+
+        Raises:
+            RuntimeError: If there are unrecoverable I/O errors during writing.
+        """
+        for page_id in range(self.total_pages):
+            buffer_pool.discard_page(self, page_id)
+
+        self.total_pages = len(pages) + 1
+        self.clean = False
+        self.needs_rebuild = False
+        data = b"".join([self.meta_page(), *pages])
+        try:
+            FileStorage.write_data(self.path, data, sync=False)
+            FileStorage.truncate(self.path, len(data))
+        except (FileAccessError, FileNotFoundError) as e:
+            logger.error(f"Failed to build index {self.path}: {e}")
+            raise RuntimeError(
+                f"Unrecoverable error: Failed to build index {self.path}: {e}"
+            )
+
+    def encode(self, value):
+        """Convert a column value into the key stored in the index.
+
+        Args:
+            value: A value of the indexed column.
+
+        Returns:
+            The key.
+        """
+        return ENCODERS[self.key_type](value)
+
+    def is_null(self, tuple_data, offset=0):
+        """Return whether the indexed column is NULL in a packed row."""
+        if self.null_bit == NO_NULL_BIT:
+            return False
+        return bool(tuple_data[offset + self.null_bit // 8] >> (self.null_bit % 8) & 1)
+
+    def key_of(self, tuple_data, offset=0):
+        """Extract the indexed key from a packed row.
+
+        Args:
+            tuple_data (bytes | bytearray | memoryview): Buffer holding the row.
+            offset (int, optional): Offset of the row in the buffer. Defaults to 0.
+
+        Returns:
+            The key, or None if the column is NULL.
+        """
+        if self.is_null(tuple_data, offset):
+            return None
+        return struct.unpack_from("<q", tuple_data, offset + self.key_offset)[0]
+
+    def lookup_many(self, keys):
+        """Return the locations of many keys.
+
+        Args:
+            keys (Iterable): The keys, see encode.
+
+        Returns:
+            dict: key -> list of (page_id, slot) pairs.
+        """
+        return {key: self.search(key) for key in keys}
+
+    def range(self, low=None, high=None):
+        """Iterate over the entries with low <= key <= high in key order.
+
+        Raises:
+            CurrentlyNotSupported: If the index kind does not keep keys in order.
+        """
+        raise CurrentlyNotSupported(
+            f"{type(self).__name__} does not support range scans"
+        )
+
+    def begin_write(self):
+        """Durably mark the index as changed before its first change after a checkpoint.
+
+        Raises:
+            RuntimeError: If there are unrecoverable I/O errors during writing.
+        """
+        with self.lock:
+            if not self.clean:
+                return
+            logger.debug("%s: Marking %s as changed", type(self).__name__, self.path)
+            self.clean = False
+            self.write_meta(flush=True)
+            self.sync()
+
+    def mark_clean(self):
+        """Write and sync every page of the index, then mark it clean. Used by checkpoints.
+
+        Raises:
+            RuntimeError: If there are unrecoverable I/O errors during writing.
+        """
+        with self.lock:
+            if self.clean or self.needs_rebuild:
+                return
+            logger.debug("%s: Marking %s as clean", type(self).__name__, self.path)
+            self.write_meta()
+            buffer_pool.flush_all(self)
+            self.sync()
+            self.clean = True
+            self.write_meta(flush=True)
+
+
+# Index classes by file name format, registered by the modules defining them
+index_kinds = {}
+
+# Indexes shared by every Page of a relation, keyed by relation folder
+indexes = {}
+indexes_lock = threading.Lock()
+
+
+def register_index_kind(index_class):
+    """Register an index class so get_indexes can open its files.
+
+    Args:
+        index_class (type): An IndexFile subclass.
+    """
+    index_kinds[index_class.FILE_NAME_FORMAT] = index_class
+
+
+def get_indexes(relation):
+    """Return the indexes of a relation by column, opening them on first use.
+
+    Args:
+        relation (Relation): The relation.
+
+    Returns:
+        dict: column -> IndexFile.
+    """
+    with indexes_lock:
+        table_indexes = indexes.get(relation.folder)
+        if table_indexes is None:
+            table_indexes = indexes[relation.folder] = {}
+            names = sorted(os.listdir(relation.folder))
+            for file_name_format, index_class in index_kinds.items():
+                prefix, suffix = file_name_format.split("{}")
+                for name in names:
+                    if name.startswith(prefix) and name.endswith(suffix):
+                        column = name[len(prefix) : len(name) - len(suffix)]
+                        table_indexes[column] = index_class(relation.folder, column)
+        return table_indexes
+
+
+def save_indexes():
+    """Mark every open index clean after writing and syncing it.
+
+    Raises:
+        RuntimeError: If there are unrecoverable I/O errors during writing.
+    """
+    with indexes_lock:
+        open_indexes = [index for table in indexes.values() for index in table.values()]
+    for index in open_indexes:
+        index.mark_clean()
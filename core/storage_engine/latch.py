@@ -0,0 +1,78 @@
+import threading
+from contextlib import contextmanager
+
+
+class Latch:
+    """A short-term shared/exclusive lock protecting an in-memory structure such as a page.
+
+    Any number of threads may hold the latch shared, or a single thread exclusively.
+    A thread waiting for the exclusive latch stops new shared holders from getting in,
+    so writers are not starved by a steady stream of readers. Latches are not
+    reentrant: a thread must not take a latch it already holds, in either mode.
+    """
+
+    __slots__ = ("condition", "readers", "waiting_writers", "writer")
+
+    def __init__(self):
+        self.condition = threading.Condition(threading.Lock())
+        self.readers = 0
+        self.writer = False
+        self.waiting_writers = 0
+
+    def acquire_shared(self):
+        """Take the latch shared, waiting while it is held or wanted exclusively."""
+        with self.condition:
+            while self.writer or self.waiting_writers:
+                self.condition.wait()
+            self.readers += 1
+
+    def release_shared(self):
+        with self.condition:
+            self.readers -= 1
+            if not self.readers:
+                self.condition.notify_all()
+
+    def acquire_exclusive(self, blocking=True):
+        """Take the latch exclusively.
+
+        Args:
+            blocking (bool, optional): Wait until the latch is free. Defaults to True.
+
+        Returns:
+            bool: False if blocking is not set and the latch is held.
+        """
+        with self.condition:
+            if self.writer or self.readers:
+                if not blocking:
+                    return False
+                self.waiting_writers += 1
+                try:
+                    while self.writer or self.readers:
+                        self.condition.wait()
+                finally:
+                    self.waiting_writers -= 1
+            self.writer = True
+            return True
+
+    def release_exclusive(self):
+        with self.condition:
+            self.writer = False
+            self.condition.notify_all()
+
+    @contextmanager
+    def shared(self):
+        """Hold the latch shared for the duration of a with block."""
+        self.acquire_shared()
+        try:
+            yield
+        finally:
+            self.release_shared()
+
+    @contextmanager
+    def exclusive(self):
+        """Hold the latch exclusively for the duration of a with block."""
+        self.acquire_exclusive()
+        try:
+            yield
+        finally:
+            self.release_exclusive()
@@ -1,15 +1,58 @@
 import time
 import struct
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from itertools import chain
+from queue import Queue
 
-from core.constants import PAGE_HEADER_FORMAT, PAGE_SIZE, SLOT_FORMAT
-from core.utils import logger
-from core.exceptions import CurrentlyNotSupported, FileAccessError, FileNotFoundError
+from core.constants import (
+    BULK_WRITE_SIZE,
+    COMPRESSION_LEVEL,
+    DURABILITY_FSYNC,
+    INDEX_BTREE,
+    INDEX_HASH,
+    PAGE_COMPACT_THRESHOLD,
+    PAGE_HEADER_FORMAT,
+    PAGE_SIZE,
+    READAHEAD_PAGES,
+    SCAN_WORKERS,
+    SLOT_DEAD,
+    SLOT_FORMAT,
+    SLOT_MOVED,
+    SLOT_NORMAL,
+    SLOT_REDIRECT,
+    WAL_COMPACT,
+    WAL_DELETE,
+    WAL_INSERT,
+    WAL_UPDATE,
+)
+from core.utils import logger, metrics
+from core.exceptions import CurrentlyNotSupported
 
-from .file_manager import FileStorage
-from .relation import Relation
+from .binary import FIXED_FORMATS, NO_NULL_BIT
+from .bloom_filter import BloomFilter, get_bloom_filters
+from .btree import BTreeIndex
+from .buffer_pool import buffer_pool
+from .checkpoint import page_changes, recover
+from .free_space_map import get_free_space_map
+from .hash_index import HashIndex
+from .index import get_indexes
+from .relation import CompressedRelation, open_relation
+from .wal import wal
+from .zone_map import get_zone_map
 
 PAGE_HEADER_SIZE = struct.calcsize(PAGE_HEADER_FORMAT)
+INDEX_CLASSES = {INDEX_BTREE: BTreeIndex, INDEX_HASH: HashIndex}
+PAGE_LOWER_OFFSET = struct.calcsize("<I")
+PAGE_FREE_SPACE_OFFSET = struct.calcsize("<IHH")
+PAGE_LSN_OFFSET = PAGE_HEADER_SIZE - struct.calcsize("<Q")
 SLOT_SIZE = struct.calcsize(SLOT_FORMAT)
+SLOT_STATE_SHIFT = 14
+SLOT_LENGTH_MASK = (1 << SLOT_STATE_SHIFT) - 1
+DEAD_SLOT = struct.pack(SLOT_FORMAT, 0, SLOT_DEAD << SLOT_STATE_SHIFT)
+# redirect slots hold the location a tuple moved to, moved tuples start with their home
+LOCATION_FORMAT = "<IH"  # page_id, slot_id
+LOCATION_SIZE = struct.calcsize(LOCATION_FORMAT)
 
 
 class Page:
@@ -17,21 +60,70 @@ class Page:
 
     This class handles the creation, reading, and writing of pages within a relation.
     A page contains a header with metadata, a slot array for tuple offsets, and the actual tuple data.
+
+    A tuple is identified by its page and slot index, which never change. Every slot
+    holds the offset and length of its data and a state. Deleting a tuple marks its slot
+    dead, and the slot is reused by a later insert into the page. An update rewrites the
+    tuple in its page when it still fits; otherwise the tuple moves to another page and
+    its home slot becomes a redirect to it. Space left behind by deletes and updates is
+    reclaimed by compacting the page, which moves tuple data but keeps slot indexes.
+
+    Any number of threads may read and write the relation at once. A page is latched
+    shared while it is read and exclusively while it is changed, only for the time the
+    change takes. Inserts pass over pages other writers hold and fill other pages, and
+    new page IDs come from the RelationHandle shared by every Page of the relation.
+    Writers changing the same tuple at once are not ordered, the last one wins.
+
+    Columns with a zone map keep the range of their values in every page, see ZoneMap,
+    so scans given a page filter from zone_filter skip pages that cannot match.
+    Columns with Bloom filters keep the set of their keys in every page, see
+    BloomFilter, so probe only reads pages that may hold a key.
     """
 
-    def __init__(self, table_id):
+    def __init__(
+        self,
+        table_id,
+        durability=DURABILITY_FSYNC,
+        use_mmap=False,
+        compression=None,
+        compression_level=COMPRESSION_LEVEL,
+    ):
         """Initialize a Page instance for a specific table.
 
-        Creates a new relation for the table if it doesn't exist.
+        Creates a new relation for the table if it doesn't exist, and replays the
+        write-ahead log the first time a page is opened in the process. The free space
+        map of the relation is rebuilt from its pages if it has no map file.
 
         Args:
             table_id (str): The unique identifier for the table.
+            durability (str, optional): Durability mode of the relation. Defaults to DURABILITY_FSYNC.
+            use_mmap (bool, optional): Read the relation through a memory mapping. Ignored
+                for compressed relations. Defaults to False.
+            compression (str, optional): Store the pages of a new relation compressed with
+                this codec, one of COMPRESSION_CODECS. An existing relation keeps the
+                format it was created with. Defaults to None.
+            compression_level (int, optional): Compression level of a new relation, 0 to 9.
+                Defaults to COMPRESSION_LEVEL.
         """
-        self.relation = Relation(table_id)
+        self.relation = open_relation(
+            table_id, durability, use_mmap, compression, compression_level
+        )
         self.relation.create_relation()
+        recover()
+        self.handle = self.relation.handle
+        self.free_space_map = get_free_space_map(self.relation)
+        if self.free_space_map.missing:
+            self.__rebuild_free_space_map()
+
+    def __rebuild_free_space_map(self):
+        """Fill the free space map from the page headers of the relation."""
+        logger.debug("Page: Rebuilding the free space map")
+        self.free_space_map.missing = False
+        for page_id, page in self.scan_pages():
+            self.free_space_map.update(page_id, page_free_space(page))
 
     def __get_metadata(
-        self, page_id, lower=PAGE_HEADER_SIZE, upper=PAGE_SIZE, tuple_count=0
+        self, page_id, lower=PAGE_HEADER_SIZE, upper=PAGE_SIZE, tuple_count=0, lsn=0
     ):
         """Generate formatted metadata for a page header.
 
@@ -40,12 +132,17 @@ class Page:
             lower (int, optional): Offset where the slot array ends. Defaults to PAGE_HEADER_SIZE.
             upper (int, optional): Offset where free space ends. Defaults to PAGE_SIZE.
             tuple_count (int, optional): Number of tuples in the page. Defaults to 0.
+            lsn (int, optional): LSN of the last log record applied to the page. Defaults to 0.
 
         Returns:
             bytes: Packed header data.
         """
         logger.debug(
-            f"Page: Getting formatted metadata with page_id={page_id}, lower={lower}, upper={upper}, tuple_count={tuple_count}"
+            "Page: Getting formatted metadata with page_id=%s, lower=%s, upper=%s, tuple_count=%s",
+            page_id,
+            lower,
+            upper,
+            tuple_count,
         )
         header_data = struct.pack(
             PAGE_HEADER_FORMAT,
@@ -55,6 +152,7 @@ class Page:
             upper - lower,  # free_space
             tuple_count,  # tuple_count
             int(time.time()),  # created_at
+            lsn,  # lsn
         )
 
         return header_data
@@ -68,7 +166,7 @@ class Page:
         Returns:
             bytearray: An empty page with header initialized.
         """
-        logger.debug(f"Page: Getting an empty page with tail_page_id={tail_page_id}")
+        logger.debug("Page: Getting an empty page with tail_page_id=%s", tail_page_id)
         page_id = tail_page_id + 1
         page = bytearray(PAGE_SIZE)
 
@@ -77,49 +175,238 @@ class Page:
 
         return page
 
-    def __write_to_new_page(
-        self,
-        tuple_data,
-        tail_page_id,
-        lower,
-        upper,
-        tuple_count,
-        page,
-        tuple_size,
-        total_pages,
-    ):
-        """Write tuple data to a new page and update metadata.
+    def __compact(self, page, keep=0):
+        """Move the data of every live slot to the end of the page, leaving no gaps.
+
+        Dead slots at the end of the slot array are dropped, but never the first
+        `keep` slots. Slot indexes and the order of the data do not change.
+
+        Args:
+            page (bytearray): The page buffer.
+            keep (int, optional): Number of slots to keep at least. Defaults to 0.
+        """
+        _, lower, _, _, tuple_count, _, _ = struct.unpack_from(PAGE_HEADER_FORMAT, page)
+        snapshot = bytes(page)
+        live = []
+        count = keep
+        for slot_id, (offset, length) in enumerate(
+            struct.iter_unpack(SLOT_FORMAT, snapshot[PAGE_HEADER_SIZE:lower])
+        ):
+            if length >> SLOT_STATE_SHIFT != SLOT_DEAD:
+                live.append((offset, slot_id, length))
+                count = max(count, slot_id + 1)
+
+        upper = PAGE_SIZE
+        for offset, slot_id, length in sorted(live, reverse=True):
+            size = length & SLOT_LENGTH_MASK
+            upper -= size
+            page[upper : upper + size] = snapshot[offset : offset + size]
+            struct.pack_into(
+                SLOT_FORMAT, page, PAGE_HEADER_SIZE + slot_id * SLOT_SIZE, upper, length
+            )
+
+        lower = PAGE_HEADER_SIZE + count * SLOT_SIZE
+        page[lower:upper] = bytes(upper - lower)
+        set_page_header(page, lower, upper, tuple_count)
+
+    def __compact_if_fragmented(self, page):
+        """Compact a page once dead space crosses PAGE_COMPACT_THRESHOLD."""
+        if page_dead_space(page) > PAGE_COMPACT_THRESHOLD * PAGE_SIZE:
+            logger.debug("Page: Compacting a fragmented page")
+            self.__compact(page)
+
+    def __apply_put(self, page, slot_id, state, data, lsn):
+        """Store data in a slot, either a new slot or one being reused or rewritten.
+
+        The data is rewritten in place when it fits in the space of the old data, and
+        placed below the current upper offset otherwise, compacting the page first if
+        the free space is not contiguous. The caller checks that the page has room
+        (see slot_room).
+
+        Args:
+            page (bytearray): The page buffer.
+            slot_id (int): The slot, at most the current slot count.
+            state (int): The new slot state.
+            data (bytes): The data to store.
+            lsn (int): LSN of the log record for the change.
+        """
+        _, lower, upper, _, tuple_count, _, _ = struct.unpack_from(
+            PAGE_HEADER_FORMAT, page
+        )
+        count = (lower - PAGE_HEADER_SIZE) // SLOT_SIZE
+        old_state = SLOT_DEAD
+        if slot_id < count:
+            offset, length, old_state = read_slot(page, slot_id)
+
+        if old_state == SLOT_DEAD or len(data) > length:
+            # the old data becomes dead space
+            if slot_id < count:
+                write_slot(page, slot_id, 0, 0, SLOT_DEAD)
+            needed = len(data) + (SLOT_SIZE if slot_id == count else 0)
+            if needed > upper - lower:
+                self.__compact(page, keep=min(slot_id + 1, count))
+                lower, upper = page_lower(page), page_upper(page)
+            if slot_id == count:
+                lower += SLOT_SIZE
+            offset = upper - len(data)
+            upper = offset
+
+        page[offset : offset + len(data)] = data
+        write_slot(page, slot_id, offset, len(data), state)
+        tuple_count += (state <= SLOT_MOVED) - (old_state <= SLOT_MOVED)
+        set_page_header(page, lower, upper, tuple_count, lsn)
+        self.__compact_if_fragmented(page)
+
+    def __apply_insert(self, page, tuple_data, lsn):
+        """Insert a tuple into a page that has room for it and its slot.
 
         Args:
-            tuple_data (bytes): The tuple data to write.
-            tail_page_id (int): The ID of the tail page.
-            lower (int): Current lower offset.
-            upper (int): Current upper offset.
-            tuple_count (int): Current tuple count.
             page (bytearray): The page buffer.
-            tuple_size (int): Size of the tuple data.
-            total_pages (int): Total number of pages.
+            tuple_data (bytes): The tuple data to place.
+            lsn (int): LSN of the log record for the insert.
+
+        Returns:
+            int: The slot of the tuple.
+        """
+        slot_id = free_slot(page)
+        self.__apply_put(page, slot_id, SLOT_NORMAL, tuple_data, lsn)
+        return slot_id
+
+    def __apply_delete(self, page, slot_id, lsn):
+        """Mark a slot dead and compact the page if it got too fragmented.
+
+        Args:
+            page (bytearray): The page buffer.
+            slot_id (int): The slot.
+            lsn (int): LSN of the log record for the delete.
+        """
+        _, lower, upper, _, tuple_count, _, _ = struct.unpack_from(
+            PAGE_HEADER_FORMAT, page
+        )
+        _, _, state = read_slot(page, slot_id)
+        write_slot(page, slot_id, 0, 0, SLOT_DEAD)
+        tuple_count -= state <= SLOT_MOVED
+        set_page_header(page, lower, upper, tuple_count, lsn)
+        self.__compact_if_fragmented(page)
+
+    def __put(self, frame, page_id, slot_id, state, data):
+        """Log and apply a change to a slot of a page held in the buffer pool.
+
+        Args:
+            frame (Frame): The pinned buffer pool frame holding the page.
+            page_id (int): The ID of the page.
+            slot_id (int): The slot.
+            state (int): The new slot state.
+            data (bytes): The data to store.
+        """
+        lsn = wal.log_update(self.relation.table_id, page_id, slot_id, state, data)
+        self.__apply_put(frame.data, slot_id, state, data, lsn)
+        self.__changed(frame, page_id, lsn)
+
+    def __delete(self, frame, page_id, slot_id):
+        """Log and apply a delete in a page held in the buffer pool."""
+        lsn = wal.log_delete(self.relation.table_id, page_id, slot_id)
+        self.__apply_delete(frame.data, slot_id, lsn)
+        self.__changed(frame, page_id, lsn)
+
+    def __changed(self, frame, page_id, lsn):
+        frame.lsn = lsn
+        frame.dirty = True
+        self.free_space_map.update(page_id, page_free_space(frame.data))
+
+    def __write_to_new_page(self, tuple_data, page_id, frame, state=SLOT_NORMAL):
+        """Write tuple data to a page held in the buffer pool.
+
+        Args:
+            tuple_data (bytes): The tuple data to write.
+            page_id (int): The ID of the page.
+            frame (Frame): The pinned buffer pool frame holding the page.
+            state (int, optional): The slot state. Defaults to SLOT_NORMAL.
 
         Returns:
-            tuple: A tuple containing (page_id, slot_offset).
+            tuple: A tuple containing (page_id, slot_id).
+
+        Note:
+            The insert is appended to the write-ahead log before the page is changed. The
+            page itself stays dirty in the buffer pool until eviction or a checkpoint.
         """
-        new_upper = upper - tuple_size
-        new_lower = lower + SLOT_SIZE
+        slot_id = free_slot(frame.data)
+        if state == SLOT_NORMAL:
+            lsn = wal.log_insert(self.relation.table_id, page_id, slot_id, tuple_data)
+            self.__apply_put(frame.data, slot_id, state, tuple_data, lsn)
+            self.__changed(frame, page_id, lsn)
+        else:
+            self.__put(frame, page_id, slot_id, state, tuple_data)
 
-        # data
-        page[new_upper:upper] = tuple_data
+        return page_id, slot_id
 
-        # header
-        header = self.__get_metadata(tail_page_id, new_lower, new_upper, tuple_count)
-        page[:PAGE_HEADER_SIZE] = header
+    def redo(self, record_type, page_id, slot_id, payload, lsn):
+        """Re-apply a logged page change during recovery unless the page already has it.
 
-        # slots
-        struct.pack_into(SLOT_FORMAT, page, lower, new_upper)
+        Args:
+            record_type (int): WAL_INSERT, WAL_UPDATE, WAL_DELETE or WAL_COMPACT.
+            page_id (int): The ID of the page the change was made to.
+            slot_id (int): The slot the change was made to.
+            payload (bytes): The record payload.
+            lsn (int): LSN of the log record.
+        """
+        frames = self.__latch_pages([page_id])
+        frame = frames[page_id]
+        try:
+            page = frame.data
+            (page_lsn,) = struct.unpack_from("<Q", page, PAGE_LSN_OFFSET)
+            if page_lsn >= lsn:
+                return
+
+            # the page never reached disk, start from an empty one
+            if is_uninitialized(page):
+                page[:] = self.__get_empty_page(page_id - 1)
+
+            count = slot_count(page)
+            if record_type == WAL_COMPACT:
+                self.__compact(page)
+                struct.pack_into("<Q", page, PAGE_LSN_OFFSET, lsn)
+            elif slot_id > count or (record_type == WAL_DELETE and slot_id == count):
+                logger.error(
+                    "Page: Skipping redo of record %s at %s:%s, page has %s slots",
+                    record_type,
+                    page_id,
+                    slot_id,
+                    count,
+                )
+                return
+            elif record_type == WAL_DELETE:
+                self.__apply_delete(page, slot_id, lsn)
+            elif record_type == WAL_INSERT:
+                self.__apply_put(page, slot_id, SLOT_NORMAL, payload, lsn)
+            else:
+                self.__apply_put(page, slot_id, payload[0], payload[1:], lsn)
+            self.__changed(frame, page_id, lsn)
+        finally:
+            self.__release(frames.values())
+
+        self.handle.extend(page_id)
+
+    def __check_tuple_size(self, tuple_data):
+        """Reject tuples that cannot fit in an empty page, and pad tiny ones.
 
-        self.relation.write_data(page, tail_page_id * PAGE_SIZE)
-        self.relation.write_metadata(total_pages, tail_page_id)
+        Tuples are padded to LOCATION_SIZE bytes so any tuple can be replaced by a
+        redirect, and a tuple must fit in an empty page together with the home location
+        it gets if it moves.
 
-        return tail_page_id, new_upper
+        Returns:
+            bytes: The tuple data to store.
+
+        Raises:
+            CurrentlyNotSupported: If the tuple is too large for a single page.
+        """
+        if len(tuple_data) + LOCATION_SIZE + SLOT_SIZE > PAGE_SIZE - PAGE_HEADER_SIZE:
+            raise CurrentlyNotSupported(
+                f"A tuple of {len(tuple_data)} bytes does not fit in a page, store large values in TEXT columns"
+            )
+        if len(tuple_data) < LOCATION_SIZE:
+            return bytes(tuple_data).ljust(LOCATION_SIZE, b"\x00")
+        return tuple_data
 
     def read_page(self, page_id, raw_page=None):
         """Read and parse a page from the relation file.
@@ -129,37 +416,34 @@ class Page:
             raw_page (bytes, optional): Raw page data if already available. Defaults to None.
 
         Returns:
-            tuple: A tuple containing (page_id, lower, upper, free_space, tuple_count, created_at, slots, page_data).
+            tuple: A tuple containing (page_id, lower, upper, free_space, tuple_count, created_at, slots, page_data),
+                where slots holds an (offset, length, state) tuple for every slot.
+
+        Note:
+            Pages are served from the shared buffer pool, so only a miss reads the
+            relation file.
 
         Raises:
             RuntimeError: If there are unrecoverable I/O errors during page reading.
         """
-        logger.debug(f"Page: Reading page from file or stream with page_id={page_id}")
-        try:
-            if not raw_page:
-                raw_page = FileStorage.read_data(
-                    self.relation.path, page_id * PAGE_SIZE, PAGE_SIZE
-                )
-        except (FileAccessError, FileNotFoundError) as e:
-            logger.error(
-                f"Failed to read page {page_id} from relation {self.relation.path}: {e}"
-            )
-            raise RuntimeError(
-                f"Unrecoverable error: Failed to read page {page_id}: {e}"
-            )
+        logger.debug("Page: Reading page from file or stream with page_id=%s", page_id)
+        if not raw_page:
+            frame = buffer_pool.fetch_page(self.relation, page_id)
+            try:
+                with frame.latch.shared():
+                    raw_page = bytes(frame.data)
+            finally:
+                buffer_pool.unpin_page(frame)
 
         header = struct.unpack(PAGE_HEADER_FORMAT, raw_page[:PAGE_HEADER_SIZE])
-        page_id, lower, upper, free_space, tuple_count, created_at = header
+        page_id, lower, upper, free_space, tuple_count, created_at, _ = header
 
         slots = []
         slow_area_size = lower - PAGE_HEADER_SIZE
         num_slots = slow_area_size // SLOT_SIZE
 
         for i in range(num_slots):
-            slot_offset = PAGE_HEADER_SIZE + (i * SLOT_SIZE)
-            (tuple_offset,) = struct.unpack_from(SLOT_FORMAT, raw_page, slot_offset)
-
-            slots.append(tuple_offset)
+            slots.append(read_slot(raw_page, i))
 
         return (
             page_id,
@@ -172,10 +456,222 @@ class Page:
             bytearray(raw_page),
         )
 
+    def view_page(self, page_id):
+        """Return a read-only buffer of a page, avoiding copies where possible.
+
+        With a memory-mapped relation, pages that are not cached in the buffer pool are
+        returned as a view of the mapping. Otherwise the page is copied out of the
+        buffer pool without parsing its slot array.
+
+        Args:
+            page_id (int): The ID of the page.
+
+        Returns:
+            bytes | bytearray | memoryview: The page contents.
+        """
+        if self.relation.use_mmap:
+            page = buffer_pool.peek_page(self.relation, page_id)
+            if page is None:
+                page = self.relation.view(page_id * PAGE_SIZE, PAGE_SIZE)
+            if len(page) == PAGE_SIZE:
+                return page
+
+        frame = buffer_pool.fetch_page(self.relation, page_id)
+        try:
+            with frame.latch.shared():
+                return bytes(frame.data)
+        finally:
+            buffer_pool.unpin_page(frame)
+
+    def view_tuples(self, locations):
+        """Find the data of tuples, following redirects to tuples that moved.
+
+        Consecutive locations on the same page view the page only once.
+
+        Args:
+            locations (Iterable[tuple]): (page_id, slot_id) of every tuple.
+
+        Yields:
+            tuple: (page, offset) where page is a read-only buffer holding the tuple at
+                offset.
+
+        Raises:
+            KeyError: If there is no tuple at a location.
+        """
+        last_page_id, page = None, None
+        for page_id, slot_id in locations:
+            if page_id != last_page_id:
+                last_page_id, page = page_id, self.view_page(page_id)
+            yield self.__follow(page, page_id, slot_id)
+
+    def __follow(self, page, page_id, slot_id):
+        """Return (page, offset) of a tuple given its home page, following a redirect."""
+        offset, _, state = home_slot(page, page_id, slot_id)
+        if state == SLOT_NORMAL:
+            return page, offset
+
+        moved_page_id, moved_slot_id = struct.unpack_from(LOCATION_FORMAT, page, offset)
+        moved_page = self.view_page(moved_page_id)
+        offset = moved_offset(moved_page, moved_slot_id, page_id, slot_id)
+        if offset is None:
+            raise KeyError(f"No tuple at page {page_id} slot {slot_id}")
+        return moved_page, offset
+
+    def view_tuple(self, page_id, slot_id, page=None):
+        """Find the data of a tuple, following a redirect if the tuple moved.
+
+        Args:
+            page_id (int): The ID of the page.
+            slot_id (int): The slot of the tuple.
+            page (bytes | bytearray | memoryview, optional): The page, already viewed
+                with view_page, so reads of many slots of a page view it once.
+                Defaults to None (view the page).
+
+        Returns:
+            tuple: (page, offset) where page is a read-only buffer holding the tuple at
+                offset.
+
+        Raises:
+            KeyError: If there is no tuple at the location.
+        """
+        if page is None:
+            page = self.view_page(page_id)
+        return self.__follow(page, page_id, slot_id)
+
+    def __find_frame(self, needed_space, allocate=True):
+        """Pin and exclusively latch a page with at least needed_space contiguous free bytes.
+
+        The free space map picks the first page with room. A page latched by another
+        writer is passed over for the next one, so concurrent writers fill different
+        pages instead of queueing for one. A new page is appended only when no page
+        that is free to use has enough space.
+
+        Args:
+            needed_space (int): The free bytes needed.
+            allocate (bool, optional): Append a new page if no page has room. Defaults to True.
+
+        Returns:
+            tuple: (page_id, frame) with the frame pinned and latched, or (None, None)
+                if allocate is not set and no page has room.
+        """
+        # reuse free space anywhere in the relation, the map is only a hint so the page
+        # header has the final say
+        page_id = self.free_space_map.find(needed_space)
+        while page_id is not None:
+            frame = buffer_pool.fetch_page(self.relation, page_id)
+            if not frame.latch.acquire_exclusive(blocking=False):
+                buffer_pool.unpin_page(frame)
+                page_id = self.free_space_map.find(needed_space, page_id + 1)
+                continue
+            free_space = page_free_space(frame.data)
+            if is_uninitialized(frame.data) or page_id >= self.handle.total_pages:
+                free_space = 0
+            if needed_space <= free_space:
+                return page_id, frame
+            logger.debug("Page: Free space map was stale for page %s", page_id)
+            self.free_space_map.update(page_id, free_space)
+            self.__release([frame])
+            page_id = self.free_space_map.find(needed_space, page_id + 1)
+
+        if not allocate:
+            return None, None
+
+        # otherwise append a new page after the tail
+        page_id = self.handle.allocate()
+        logger.debug("Page: Allocating new page %s", page_id)
+        frame = buffer_pool.new_page(
+            self.relation, page_id, self.__get_empty_page(page_id - 1)
+        )
+        frame.latch.acquire_exclusive()
+        return page_id, frame
+
+    def __latch_pages(self, page_ids):
+        """Pin and exclusively latch pages, in page order.
+
+        Writers that wait for a latch while holding others always take them in page
+        order, so they never wait for each other in a cycle.
+
+        Args:
+            page_ids (Iterable[int]): The IDs of the pages.
+
+        Returns:
+            dict: page_id -> pinned and latched frame.
+        """
+        frames = {}
+        try:
+            for page_id in sorted(page_ids):
+                frame = buffer_pool.fetch_page(self.relation, page_id)
+                frame.latch.acquire_exclusive()
+                frames[page_id] = frame
+        except BaseException:
+            self.__release(frames.values())
+            raise
+        return frames
+
+    def __release(self, frames):
+        """Release the latches of frames and unpin them."""
+        for frame in frames:
+            frame.latch.release_exclusive()
+            buffer_pool.unpin_page(frame)
+
+    def __latch_tuple(self, page_id, slot_id):
+        """Pin and exclusively latch the page of a tuple and the page it moved to.
+
+        The tuple may move while its home page is not latched, so once both pages are
+        latched the redirect is read again, and the pages it points to now are latched
+        instead if it changed.
+
+        Args:
+            page_id (int): The ID of the home page.
+            slot_id (int): The home slot of the tuple.
+
+        Returns:
+            tuple: (frames, tuple_data, moved) where frames maps page IDs to the pinned
+                and latched frames, and moved is (frame, moved_page_id, moved_slot_id)
+                of a moved tuple or None.
+
+        Raises:
+            KeyError: If there is no tuple at the location.
+        """
+        moved_page_id = None
+        while True:
+            frames = self.__latch_pages({page_id, moved_page_id} - {None})
+            try:
+                page = frames[page_id].data
+                offset, length, state = home_slot(page, page_id, slot_id)
+                tuple_data = bytes(page[offset : offset + length])
+                target = None
+                if state == SLOT_REDIRECT:
+                    target, moved_slot_id = struct.unpack_from(
+                        LOCATION_FORMAT, tuple_data
+                    )
+                if target is None and moved_page_id is None:
+                    return frames, tuple_data, None
+                if target == moved_page_id:
+                    moved_frame = frames[target]
+                    offset = moved_offset(
+                        moved_frame.data, moved_slot_id, page_id, slot_id
+                    )
+                    if offset is None:
+                        raise KeyError(f"No tuple at page {page_id} slot {slot_id}")
+                    _, length, _ = read_slot(moved_frame.data, moved_slot_id)
+                    end = offset - LOCATION_SIZE + length
+                    tuple_data = bytes(moved_frame.data[offset:end])
+                    return frames, tuple_data, (moved_frame, target, moved_slot_id)
+            except BaseException:
+                self.__release(frames.values())
+                raise
+            self.__release(frames.values())
+            moved_page_id = target
+
     def write_page(self, tuple_data):
         """Write tuple data to an appropriate page in the relation.
 
-        This method handles page allocation and writing tuple data, creating new pages as needed.
+        This method handles page allocation and writing tuple data. The free space map
+        picks the first page with room for the tuple that no other writer holds, and a
+        new page is appended only when no such page has enough space. Every index of
+        the relation gets the new tuple. The insert is logged to the write-ahead log
+        and becomes durable on the next relation commit().
 
         Args:
             tuple_data (bytes): The tuple data to write.
@@ -187,53 +683,975 @@ class Page:
             CurrentlyNotSupported: If the tuple is too large for a single page.
         """
         logger.debug("Page: Writing new tuple data")
-        # get total_pages and tail_page_id
-        metadata = self.relation.read_metadata()
-        total_pages = metadata[3]
-        tail_page_id = metadata[4]
-        tuple_size = len(tuple_data)
-        needed_space = tuple_size + SLOT_SIZE
-
-        if needed_space > (PAGE_SIZE - PAGE_HEADER_SIZE - SLOT_SIZE):
-            raise CurrentlyNotSupported(
-                "Large tuples that are bigger the page cannot be saved, this feature will come in future."
+        tuple_data = self.__check_tuple_size(tuple_data)
+        indexes = self.__begin_index_writes()
+        summaries = self.__get_summaries()
+
+        with page_changes.shared():
+            self.__begin_summary_writes(summaries)
+            page_id, frame = self.__find_frame(len(tuple_data) + SLOT_SIZE)
+            try:
+                page_id, slot_id = self.__write_to_new_page(tuple_data, page_id, frame)
+                self.__summarize(summaries, page_id, tuple_data)
+            finally:
+                self.__release([frame])
+
+        self.__index_tuple(indexes, tuple_data, page_id, slot_id)
+        return page_id, slot_id
+
+    def write_pages(self, tuples):
+        """Write many tuples, filling whole pages in memory before writing them.
+
+        Tuples first top up pages that have room, through the buffer pool and the
+        write-ahead log like write_page does. Once no page has room, every other tuple
+        goes into new pages that are built in memory and written once, in contiguous
+        runs of up to BULK_WRITE_SIZE bytes; a page taken by a concurrent writer in
+        between ends a run early. The new pages bypass the write-ahead log: they and
+        the metadata are synced before returning, and the metadata is written once for
+        the whole batch. Other writers only see the new pages in the free space map
+        once they are written.
+
+        Args:
+            tuples (Iterable[bytes]): The tuple data to write, consumed lazily.
+
+        Returns:
+            list[tuple]: The (page_id, slot_id) of every tuple, in input order.
+
+        Raises:
+            CurrentlyNotSupported: If a tuple is too large for a single page.
+        """
+        logger.debug("Page: Writing a batch of tuple data")
+        tuples = iter(tuples)
+        locations = []
+        overflow = []
+        indexes = self.__begin_index_writes()
+        summaries = self.__get_summaries()
+
+        # top up existing pages first, a tuple is packed with no page latched since
+        # packing it may write to the toast relation
+        for tuple_data in tuples:
+            tuple_data = self.__check_tuple_size(tuple_data)
+            with page_changes.shared():
+                self.__begin_summary_writes(summaries)
+                page_id, frame = self.__find_frame(
+                    len(tuple_data) + SLOT_SIZE, allocate=False
+                )
+                if frame is None:
+                    overflow.append(tuple_data)
+                    break
+                try:
+                    location = self.__write_to_new_page(tuple_data, page_id, frame)
+                    self.__summarize(summaries, page_id, tuple_data)
+                finally:
+                    self.__release([frame])
+            locations.append(location)
+            self.__index_tuple(indexes, tuple_data, *location)
+
+        # everything else goes to new pages built in memory
+        run_start = None
+        run = bytearray()
+        page_id = None
+        page = None
+        for tuple_data in chain(overflow, tuples):
+            tuple_data = self.__check_tuple_size(tuple_data)
+            if page is None or len(tuple_data) + SLOT_SIZE > page_free_space(page):
+                if page is not None:
+                    run += page
+                next_page_id = self.handle.allocate(persist=False)
+                if run and (len(run) >= BULK_WRITE_SIZE or next_page_id != page_id + 1):
+                    self.__write_run(run_start, run, summaries)
+                    run = bytearray()
+                if not run:
+                    run_start = next_page_id
+                page_id = next_page_id
+                page = self.__get_empty_page(page_id - 1)
+
+            slot_id = self.__apply_insert(page, tuple_data, 0)
+            locations.append((page_id, slot_id))
+            self.__index_tuple(indexes, tuple_data, page_id, slot_id)
+
+        if page is not None:
+            run += page
+            self.__write_run(run_start, run, summaries)
+            self.relation.sync()
+
+        return locations
+
+    def update_page(self, page_id, slot_id, tuple_data):
+        """Replace the data of a tuple, keeping its location.
+
+        The tuple is rewritten in its page when it fits there, compacting the page if
+        needed. Otherwise it moves to a page with room, found like write_page does, and
+        its home slot becomes a redirect to the new place. A tuple that moved before is
+        updated where it is, or moved back home once it fits there again. Index entries
+        of changed keys are updated. The changes are logged to the write-ahead log and
+        become durable on the next relation commit().
+
+        Args:
+            page_id (int): The ID of the page.
+            slot_id (int): The slot of the tuple.
+            tuple_data (bytes): The new tuple data.
+
+        Raises:
+            KeyError: If there is no tuple at the location.
+            CurrentlyNotSupported: If the tuple is too large for a single page.
+        """
+        logger.debug("Page: Updating tuple %s:%s", page_id, slot_id)
+        tuple_data = self.__check_tuple_size(tuple_data)
+        indexes = self.__begin_index_writes()
+        summaries = self.__get_summaries()
+
+        with page_changes.shared():
+            self.__begin_summary_writes(summaries)
+            frames, old_data, moved = self.__latch_tuple(page_id, slot_id)
+            try:
+                frame = frames[page_id]
+                home_location = struct.pack(LOCATION_FORMAT, page_id, slot_id)
+                moved_data = home_location + tuple_data
+                if len(tuple_data) <= slot_room(frame.data, slot_id):
+                    # the tuple fits in its home page, a moved tuple comes back
+                    self.__put(frame, page_id, slot_id, SLOT_NORMAL, tuple_data)
+                    self.__summarize(summaries, page_id, tuple_data)
+                    if moved is not None:
+                        self.__delete(*moved)
+                elif moved is not None and len(moved_data) <= slot_room(
+                    moved[0].data, moved[2]
+                ):
+                    self.__put(*moved, SLOT_MOVED, moved_data)
+                    self.__summarize(summaries, moved[1], moved_data, LOCATION_SIZE)
+                else:
+                    # the home slot keeps pointing at the tuple wherever it is
+                    new_page_id, new_frame = self.__find_frame(
+                        len(moved_data) + SLOT_SIZE
+                    )
+                    frames[new_page_id] = new_frame
+                    new_location = self.__write_to_new_page(
+                        moved_data, new_page_id, new_frame, SLOT_MOVED
+                    )
+                    self.__summarize(summaries, new_page_id, moved_data, LOCATION_SIZE)
+                    redirect = struct.pack(LOCATION_FORMAT, *new_location)
+                    self.__put(frame, page_id, slot_id, SLOT_REDIRECT, redirect)
+                    if moved is not None:
+                        self.__delete(*moved)
+            finally:
+                self.__release(frames.values())
+
+        for index in indexes:
+            old_key = index.key_of(old_data)
+            new_key = index.key_of(tuple_data)
+            if old_key != new_key:
+                if old_key is not None:
+                    index.delete(old_key, page_id, slot_id)
+                if new_key is not None:
+                    index.insert(new_key, page_id, slot_id)
+
+    def delete_page(self, page_id, slot_id):
+        """Delete a tuple by marking its slot dead.
+
+        A moved tuple is deleted in both of its pages. Its index entries are removed,
+        and the page is compacted if too much of it is dead space. The delete is logged
+        to the write-ahead log and becomes durable on the next relation commit().
+
+        Args:
+            page_id (int): The ID of the page.
+            slot_id (int): The slot of the tuple.
+
+        Raises:
+            KeyError: If there is no tuple at the location.
+        """
+        logger.debug("Page: Deleting tuple %s:%s", page_id, slot_id)
+        indexes = self.__begin_index_writes()
+
+        with page_changes.shared():
+            frames, old_data, moved = self.__latch_tuple(page_id, slot_id)
+            try:
+                if moved is not None:
+                    self.__delete(*moved)
+                self.__delete(frames[page_id], page_id, slot_id)
+            finally:
+                self.__release(frames.values())
+
+        for index in indexes:
+            key = index.key_of(old_data)
+            if key is not None:
+                index.delete(key, page_id, slot_id)
+
+    def vacuum(self):
+        """Compact every page with dead space and make the space reusable.
+
+        Pages are compacted in place, so tuple locations do not change, and the free
+        space map is updated so inserts fill the reclaimed space. The zones of every
+        compacted page shrink to the tuples left in it. Each compaction is logged to the
+        write-ahead log and becomes durable on the next relation commit().
+
+        Returns:
+            int: Number of bytes reclaimed.
+        """
+        logger.debug("Page: Vacuuming %s", self.relation.table_id)
+        candidates = [
+            page_id
+            for page_id, page in self.scan_pages()
+            if page_dead_space(page) or slot_count(page) > used_slot_count(page)
+        ]
+
+        reclaimed = 0
+        summaries = self.__get_summaries()
+        for page_id in candidates:
+            with page_changes.shared():
+                self.__begin_summary_writes(summaries)
+                frames = self.__latch_pages([page_id])
+                frame = frames[page_id]
+                try:
+                    free_space = page_free_space(frame.data)
+                    lsn = wal.log_compact(self.relation.table_id, page_id)
+                    self.__compact(frame.data)
+                    struct.pack_into("<Q", frame.data, PAGE_LSN_OFFSET, lsn)
+                    self.__changed(frame, page_id, lsn)
+                    self.__reset_summaries(summaries, page_id, frame.data)
+                    reclaimed += page_free_space(frame.data) - free_space
+                finally:
+                    self.__release(frames.values())
+        return reclaimed
+
+    def __get_indexes(self):
+        """Return the indexes of the relation, rebuilding those that may be stale."""
+        indexes = get_indexes(self.relation)
+        for index in list(indexes.values()):
+            if index.needs_rebuild:
+                self.__build_index(index)
+        return indexes
+
+    def __build_index(self, index):
+        """Bulk-build an index from a scan of the relation. NULL keys are left out."""
+        logger.debug("Page: Building the index on %s", index.column)
+        entries = (
+            (index.key_of(page, offset), page_id, slot_id)
+            for page_id, slot_id, offset, page in self.scan()
+        )
+        index.build(entry for entry in entries if entry[0] is not None)
+
+    def __begin_index_writes(self):
+        """Prepare every index for changes, before the change is logged."""
+        indexes = list(self.__get_indexes().values())
+        for index in indexes:
+            index.begin_write()
+        return indexes
+
+    def __index_tuple(self, indexes, tuple_data, page_id, slot_id):
+        for index in indexes:
+            key = index.key_of(tuple_data)
+            if key is not None:
+                index.insert(key, page_id, slot_id)
+
+    def create_index(
+        self,
+        column,
+        key_offset,
+        key_type,
+        using=INDEX_BTREE,
+        key_length=8,
+        null_bit=NO_NULL_BIT,
+    ):
+        """Create an index on a column and build it from the existing tuples.
+
+        Args:
+            column (str): The column to index.
+            key_offset (int): Where the column is in a row, see the key_offsets of the row codec.
+            key_type (str): Base type of the column.
+            using (str, optional): The index kind, INDEX_BTREE for equality and range
+                lookups or INDEX_HASH for equality lookups only. Defaults to INDEX_BTREE.
+            key_length (int, optional): Size of a key, used by hash indexes. Defaults to 8.
+            null_bit (int, optional): Bit of the column in the null bitmap of a row.
+                Defaults to NO_NULL_BIT.
+
+        Returns:
+            IndexFile: The new index, or the existing one if the column is indexed.
+
+        Raises:
+            ValueError: If the index kind is unknown.
+            TypeError: If the index kind cannot index columns of this type.
+        """
+        if using not in INDEX_CLASSES:
+            raise ValueError(f"Unknown index kind '{using}'")
+        index_class = INDEX_CLASSES[using]
+        if key_type not in index_class.KEY_TYPES:
+            raise TypeError(
+                f"A {using} index cannot be built on {key_type} column '{column}'"
             )
 
-        # if there is no page, initialize a empty page
-        if total_pages <= 0:
-            logger.debug("Page: There is no existing page, getting a page")
-            total_pages += 1
-            page_data = self.read_page(tail_page_id, self.__get_empty_page())
-        else:
-            page_data = self.read_page(tail_page_id)
+        indexes = self.__get_indexes()
+        if column not in indexes:
+            logger.debug("Page: Creating a %s index on %s", using, column)
+            if index_class is HashIndex:
+                index = HashIndex(
+                    self.relation.folder,
+                    column,
+                    key_offset,
+                    key_type,
+                    key_length,
+                    null_bit,
+                )
+            else:
+                index = index_class(
+                    self.relation.folder, column, key_offset, key_type, null_bit
+                )
+            self.__build_index(index)
+            indexes[column] = index
+        return indexes[column]
+
+    def get_index(self, column):
+        """Return the index on a column.
+
+        Args:
+            column (str): The indexed column.
+
+        Returns:
+            IndexFile | None: The index, or None if the column is not indexed.
+        """
+        return self.__get_indexes().get(column)
+
+    def __rebuild_if_stale(self, summary):
+        """Rebuild a zone map or Bloom filter from a scan of the relation if it may be stale.
+
+        Summaries are rebuilt on first use rather than when they are loaded, since
+        recovery replays the log before any page of the relation is written.
+        """
+        if summary.needs_rebuild:
+            with summary.build_lock:
+                if summary.needs_rebuild:
+                    logger.debug("Page: Rebuilding %s", summary.path)
+                    summary.clear()
+                    # add rather than reset pages, writers may add to them meanwhile
+                    for page_id, page in self.scan_pages():
+                        for buffer, offset in tuple_rows(page_id, page):
+                            summary.add(page_id, buffer, offset)
+                    summary.needs_rebuild = False
+        return summary
+
+    def __get_zone_map(self):
+        return self.__rebuild_if_stale(get_zone_map(self.relation))
+
+    def __get_bloom_filters(self):
+        filters = get_bloom_filters(self.relation)
+        for bloom_filter in list(filters.values()):
+            self.__rebuild_if_stale(bloom_filter)
+        return filters
+
+    def __get_summaries(self):
+        """Return the zone map and Bloom filters of the relation, which summarize every page."""
+        return [self.__get_zone_map(), *self.__get_bloom_filters().values()]
+
+    def __begin_summary_writes(self, summaries):
+        """Prepare the page summaries for changes, before the change is logged."""
+        for summary in summaries:
+            summary.begin_write()
 
-        if needed_space > page_data[3]:
-            total_pages += 1
-            page_data = self.read_page(
-                tail_page_id, self.__get_empty_page(tail_page_id)
+    def __summarize(self, summaries, page_id, tuple_data, offset=0):
+        for summary in summaries:
+            summary.add(page_id, tuple_data, offset)
+
+    def __reset_summaries(self, summaries, page_id, page):
+        for summary in summaries:
+            summary.reset(page_id, tuple_rows(page_id, page))
+
+    def create_zone_map(self, column, key_offset, key_type, null_bit=NO_NULL_BIT):
+        """Keep the range of a column in every page, starting with the existing tuples.
+
+        Args:
+            column (str): The column.
+            key_offset (int): Where the column is in a row, see the key_offsets of the row codec.
+            key_type (str): Base type of the column, a fixed-width type.
+            null_bit (int, optional): Bit of the column in the null bitmap of a row.
+                Defaults to NO_NULL_BIT.
+
+        Raises:
+            TypeError: If the column is not a fixed-width type.
+        """
+        if key_type not in FIXED_FORMATS:
+            raise TypeError(
+                f"A zone map cannot be kept for {key_type} column '{column}'"
             )
+        zone_map = self.__get_zone_map()
+        if not zone_map.has(column):
+            logger.debug("Page: Creating a zone map on %s", column)
+            zone_map.add_column(column, key_offset, key_type, null_bit)
+            self.__get_zone_map()
 
-        (
-            page_id,
-            lower,
-            upper,
-            _,
-            tuple_count,
-            _,
-            _,
-            page,
-        ) = page_data
+    def zone_filter(self, bounds):
+        """Return a page filter skipping pages whose zones cannot hold a match.
 
-        page_id, slot_id = self.__write_to_new_page(
-            tuple_data,
-            page_id,
-            lower,
-            upper,
-            tuple_count,
-            page,
-            tuple_size,
-            total_pages,
+        Args:
+            bounds (Iterable[tuple]): (column, operator, stored value) conditions, see
+                Predicate.bounds.
+
+        Returns:
+            Callable | None: Takes a page ID and returns whether the page may hold a
+                match, or None if no condition is on a column with a zone map.
+        """
+        zone_map = self.__get_zone_map()
+        bounds = tuple(bound for bound in bounds if zone_map.has(bound[0]))
+        if not bounds:
+            return None
+        return lambda page_id: zone_map.may_match(page_id, bounds)
+
+    def create_bloom_filter(
+        self, column, key_offset, key_type, key_length=8, null_bit=NO_NULL_BIT
+    ):
+        """Keep a Bloom filter of the keys of a column in every page, starting with the existing tuples.
+
+        Args:
+            column (str): The column.
+            key_offset (int): Where the column is in a row, see the key_offsets of the row codec.
+            key_type (str): Base type of the column.
+            key_length (int, optional): Size of a key, the declared length of a VARCHAR
+                column. Defaults to 8.
+            null_bit (int, optional): Bit of the column in the null bitmap of a row.
+                Defaults to NO_NULL_BIT.
+
+        Returns:
+            BloomFilter: The new filters, or the existing ones if the column has them.
+
+        Raises:
+            TypeError: If Bloom filters cannot be kept for columns of this type.
+        """
+        if key_type not in BloomFilter.KEY_TYPES:
+            raise TypeError(
+                f"Bloom filters cannot be kept for {key_type} column '{column}'"
+            )
+        filters = self.__get_bloom_filters()
+        if column not in filters:
+            logger.debug("Page: Creating Bloom filters on %s", column)
+            bloom_filter = BloomFilter(
+                self.relation.folder, column, key_offset, key_type, key_length, null_bit
+            )
+            bloom_filter.create()
+            filters[column] = self.__rebuild_if_stale(bloom_filter)
+        return filters[column]
+
+    def get_bloom_filter(self, column):
+        """Return the Bloom filters of a column.
+
+        Args:
+            column (str): The column.
+
+        Returns:
+            BloomFilter | None: The filters, or None if the column has none.
+        """
+        return self.__get_bloom_filters().get(column)
+
+    def probe(self, column, keys):
+        """Find which keys some tuple holds in a column with Bloom filters.
+
+        Only the pages whose filter may hold one of the keys are read, each once and in
+        page order, and a page is only searched for the keys that are not found yet.
+
+        Args:
+            column (str): The column.
+            keys (Iterable[bytes]): The raw keys, see BloomFilter.encode.
+
+        Returns:
+            set: The keys stored in the relation.
+
+        Raises:
+            KeyError: If the column has no Bloom filters.
+        """
+        bloom_filter = self.get_bloom_filter(column)
+        if bloom_filter is None:
+            raise KeyError(f"No Bloom filter on column '{column}'")
+        wanted = {}  # page_id -> keys the page may hold
+        for key in set(keys):
+            for page_id in bloom_filter.candidate_pages(key):
+                wanted.setdefault(page_id, set()).add(key)
+        logger.debug("Page: Probing %s pages for keys of %s", len(wanted), column)
+
+        found = set()
+        for page_id in sorted(wanted):
+            keys = wanted[page_id] - found
+            if not keys:
+                continue
+            page = self.view_page(page_id)
+            for buffer, offset in tuple_rows(page_id, page):
+                key = bloom_filter.key_of(buffer, offset)
+                if key in keys:
+                    found.add(key)
+                    keys.discard(key)
+                    if not keys:
+                        break
+        return found
+
+    def scan_pages(
+        self,
+        readahead=READAHEAD_PAGES,
+        first_page_id=0,
+        last_page_id=None,
+        page_filter=None,
+    ):
+        """Iterate over the pages of the relation in order.
+
+        Pages are read straight from the relation segment files, `readahead` pages per
+        read, and the kernel is told the files are read sequentially. With a memory-mapped relation
+        the pages are views of the mapping and no read syscalls are made. Pages cached
+        in the buffer pool when a window is read are taken from there instead, since
+        they may hold changes that are not on disk yet. Only one readahead window is
+        kept in memory. Pages a page filter rejects are not read at all, a window only
+        spans pages the filter keeps.
+
+        Args:
+            readahead (int, optional): Pages read per syscall. Defaults to READAHEAD_PAGES.
+            first_page_id (int, optional): First page to return. Defaults to 0.
+            last_page_id (int, optional): Page to stop before. Defaults to None (total_pages).
+            page_filter (Callable, optional): Returns whether to read a page from its ID,
+                see zone_filter. Defaults to None (every page).
+
+        Yields:
+            tuple: (page_id, page) where page is a read-only buffer of PAGE_SIZE bytes.
+        """
+        total_pages = self.relation.read_metadata()[3]
+        if last_page_id is None or last_page_id > total_pages:
+            last_page_id = total_pages
+        readahead = max(1, readahead)
+        self.relation.advise_sequential()
+
+        pages_per_segment = self.relation.SEGMENT_SIZE // PAGE_SIZE
+
+        for start, run_end in page_runs(first_page_id, last_page_id, page_filter):
+            while start < run_end:
+                # a read never crosses a segment boundary, it would need a second syscall
+                segment_end = (start // pages_per_segment + 1) * pages_per_segment
+                count = min(readahead, run_end - start, segment_end - start)
+                logger.debug(
+                    "Page: Scanning %s pages starting at page %s", count, start
+                )
+                # look in the buffer pool before reading, a page written back in between
+                # would otherwise be taken from the chunk as it was before
+                cached = [
+                    buffer_pool.peek_page(self.relation, start + i)
+                    for i in range(count)
+                ]
+                started = metrics.start()
+                if self.relation.use_mmap:
+                    chunk = self.relation.view(start * PAGE_SIZE, count * PAGE_SIZE)
+                else:
+                    chunk = memoryview(
+                        self.relation.read_data(start * PAGE_SIZE, count * PAGE_SIZE)
+                    )
+                metrics.stop("page_read_seconds", started)
+                metrics.increment("pages_read", count)
+
+                for i in range(count):
+                    page_id = start + i
+                    page = cached[i]
+                    if page is None:
+                        page = chunk[i * PAGE_SIZE : (i + 1) * PAGE_SIZE]
+                    if len(page) < PAGE_SIZE or is_uninitialized(page):
+                        continue
+                    yield page_id, page
+                start += count
+
+    def parallel_scan_pages(
+        self, workers=SCAN_WORKERS, readahead=READAHEAD_PAGES, page_filter=None
+    ):
+        """Iterate over the pages of the relation, scanning its segments in parallel.
+
+        Every segment is scanned by scan_pages on a thread pool, so reads of several
+        segment files are in flight at once. Pages of one segment come out in order, but
+        pages of different segments are interleaved. Workers hand over whole readahead
+        windows through a queue, with at most a few windows per worker kept in memory.
+        Stopping the iteration early stops the workers. An error in a worker is raised
+        as soon as the worker stops on it, or by close if the iteration stopped early.
+
+        Args:
+            workers (int, optional): Number of segments scanned at once. Defaults to SCAN_WORKERS.
+            readahead (int, optional): Pages read per syscall. Defaults to READAHEAD_PAGES.
+            page_filter (Callable, optional): Returns whether to read a page from its ID,
+                see zone_filter. Defaults to None (every page).
+
+        Yields:
+            tuple: (page_id, page) where page is a read-only buffer of PAGE_SIZE bytes.
+
+        Raises:
+            RuntimeError: If a worker hits an unrecoverable I/O error. Other errors of
+                the workers are raised as they are.
+        """
+        total_pages = self.relation.read_metadata()[3]
+        pages_per_segment = self.relation.SEGMENT_SIZE // PAGE_SIZE
+        ranges = [
+            (first, min(first + pages_per_segment, total_pages))
+            for first in range(0, total_pages, pages_per_segment)
+        ]
+        if len(ranges) <= 1 or workers <= 1:
+            yield from self.scan_pages(readahead, page_filter=page_filter)
+            return
+
+        # windows in the queue are bounded by slots, a worker takes one before it puts a
+        # window; every worker also puts its future once it is over, without a slot
+        batches = Queue()
+        slots = threading.Semaphore(2 * workers)
+        stop = threading.Event()
+
+        def scan_segment(first_page_id, last_page_id):
+            batch = []
+            for page_id, page in self.scan_pages(
+                readahead, first_page_id, last_page_id, page_filter
+            ):
+                batch.append((page_id, page))
+                if len(batch) >= readahead:
+                    slots.acquire()
+                    batches.put(batch)
+                    batch = []
+                    if stop.is_set():
+                        return
+            if batch:
+                slots.acquire()
+                batches.put(batch)
+
+        executor = ThreadPoolExecutor(
+            max_workers=min(workers, len(ranges)), thread_name_prefix="scan"
+        )
+        futures = [executor.submit(scan_segment, *bounds) for bounds in ranges]
+        for future in futures:
+            future.add_done_callback(batches.put)
+        logger.debug(
+            "Page: Scanning %s segments with %s workers",
+            len(ranges),
+            min(workers, len(ranges)),
         )
-        self.relation.write_metadata(total_pages, tail_page_id)
+        remaining = len(futures)
+        closed = False
+        try:
+            while remaining:
+                batch = batches.get()
+                if isinstance(batch, Future):
+                    remaining -= 1
+                    # a worker error is raised as soon as the worker stops on it
+                    batch.result()
+                else:
+                    slots.release()
+                    yield from batch
+        except GeneratorExit:
+            closed = True
+            raise
+        finally:
+            stop.set()
+            for future in futures:
+                future.cancel()
+            # take what the workers still send until they have all stopped
+            error = None
+            while remaining:
+                batch = batches.get()
+                if not isinstance(batch, Future):
+                    slots.release()
+                    continue
+                remaining -= 1
+                if error is None and not batch.cancelled():
+                    error = batch.exception()
+            executor.shutdown()
+            # an iteration stopped early still reports a worker that failed
+            if closed and error is not None:
+                raise error
 
-        return page_id, slot_id
+    def parallel_scan(
+        self, workers=SCAN_WORKERS, readahead=READAHEAD_PAGES, page_filter=None
+    ):
+        """Iterate over every tuple of the relation, scanning its segments in parallel.
+
+        Tuples of one page come out in slot order; see parallel_scan_pages for the page order.
+
+        Args:
+            workers (int, optional): Number of segments scanned at once. Defaults to SCAN_WORKERS.
+            readahead (int, optional): Pages read per syscall. Defaults to READAHEAD_PAGES.
+            page_filter (Callable, optional): Returns whether to read a page from its ID,
+                see zone_filter. Defaults to None (every page).
+
+        Yields:
+            tuple: (page_id, slot_id, tuple_offset, page), see page_tuples.
+        """
+        for page_id, page in self.parallel_scan_pages(workers, readahead, page_filter):
+            yield from page_tuples(page_id, page)
+
+    def scan(self, readahead=READAHEAD_PAGES, page_filter=None):
+        """Iterate over every tuple of the relation in page and slot order.
+
+        Args:
+            readahead (int, optional): Pages read per syscall. Defaults to READAHEAD_PAGES.
+            page_filter (Callable, optional): Returns whether to read a page from its ID,
+                see zone_filter. Defaults to None (every page).
+
+        Yields:
+            tuple: (page_id, slot_id, tuple_offset, page), see page_tuples.
+        """
+        for page_id, page in self.scan_pages(readahead, page_filter=page_filter):
+            yield from page_tuples(page_id, page)
+
+    def flush(self):
+        """Write the cached changes of the relation to its files.
+
+        Other processes reading the files directly, such as the workers of parallel
+        aggregates, then see every change made so far. A compressed relation also saves
+        its page map, since the map on disk may still point to older extents.
+
+        Raises:
+            RuntimeError: If there are unrecoverable I/O errors during writing.
+        """
+        logger.debug("Page: Flushing the cached pages of %s", self.relation.table_id)
+        buffer_pool.flush_all(self.relation)
+        if isinstance(self.relation, CompressedRelation):
+            self.relation.page_map.save()
+
+    def __write_run(self, first_page_id, run, summaries):
+        """Write consecutive new pages with a single write, then map their free space.
+
+        The pages are summarized before they are written, since they bypass the
+        write-ahead log.
+
+        Args:
+            first_page_id (int): The ID of the first page in the run.
+            run (bytearray): The pages, back to back.
+            summaries (list): The zone map and Bloom filters of the relation.
+        """
+        logger.debug(
+            "Page: Writing %s pages starting at page %s",
+            len(run) // PAGE_SIZE,
+            first_page_id,
+        )
+        page_ids = range(first_page_id, first_page_id + len(run) // PAGE_SIZE)
+        pages = [
+            memoryview(run)[i * PAGE_SIZE : (i + 1) * PAGE_SIZE]
+            for i in range(len(page_ids))
+        ]
+        with page_changes.shared():
+            self.__begin_summary_writes(summaries)
+            for page_id, page in zip(page_ids, pages):
+                self.__reset_summaries(summaries, page_id, page)
+        for page_id in page_ids:
+            buffer_pool.discard_page(self.relation, page_id)
+        started = metrics.start()
+        self.relation.write_data(run, first_page_id * PAGE_SIZE)
+        metrics.stop("page_write_seconds", started)
+        metrics.increment("pages_written", len(page_ids))
+        for page_id, page in zip(page_ids, pages):
+            self.free_space_map.update(page_id, page_free_space(page))
+
+
+def page_lower(page):
+    """Return the lower offset (end of the slot array) from a page buffer's header."""
+    return struct.unpack_from("<H", page, PAGE_LOWER_OFFSET)[0]
+
+
+def page_upper(page):
+    """Return the upper offset (start of the tuple data) from a page buffer's header."""
+    return struct.unpack_from("<H", page, PAGE_LOWER_OFFSET + 2)[0]
+
+
+def page_free_space(page):
+    """Return the free space recorded in a page buffer's header."""
+    return struct.unpack_from("<H", page, PAGE_FREE_SPACE_OFFSET)[0]
+
+
+def set_page_header(page, lower, upper, tuple_count, lsn=None):
+    """Update the offsets, free space, tuple count and optionally the LSN of a page."""
+    struct.pack_into(
+        "<HHHI", page, PAGE_LOWER_OFFSET, lower, upper, upper - lower, tuple_count
+    )
+    if lsn is not None:
+        struct.pack_into("<Q", page, PAGE_LSN_OFFSET, lsn)
+
+
+def is_uninitialized(page):
+    """Return True if a page buffer holds no valid header, e.g. it was never written."""
+    return page_lower(page) < PAGE_HEADER_SIZE
+
+
+def slot_count(page):
+    """Return the number of slots in a page buffer, live or not."""
+    return (page_lower(page) - PAGE_HEADER_SIZE) // SLOT_SIZE
+
+
+def read_slot(page, slot_id):
+    """Return (offset, length, state) of a slot of a page buffer."""
+    offset, length = struct.unpack_from(
+        SLOT_FORMAT, page, PAGE_HEADER_SIZE + slot_id * SLOT_SIZE
+    )
+    return offset, length & SLOT_LENGTH_MASK, length >> SLOT_STATE_SHIFT
+
+
+def write_slot(page, slot_id, offset, length, state):
+    """Set the offset, length and state of a slot of a page buffer."""
+    struct.pack_into(
+        SLOT_FORMAT,
+        page,
+        PAGE_HEADER_SIZE + slot_id * SLOT_SIZE,
+        offset,
+        length | state << SLOT_STATE_SHIFT,
+    )
+
+
+def free_slot(page):
+    """Return the first dead slot of a page buffer, or the next new slot if none."""
+    lower = page_lower(page)
+    position = page.find(DEAD_SLOT, PAGE_HEADER_SIZE, lower)
+    while position != -1:
+        if (position - PAGE_HEADER_SIZE) % SLOT_SIZE == 0:
+            return (position - PAGE_HEADER_SIZE) // SLOT_SIZE
+        position = page.find(DEAD_SLOT, position + 1, lower)
+    return (lower - PAGE_HEADER_SIZE) // SLOT_SIZE
+
+
+def used_slot_count(page):
+    """Return the number of slots of a page buffer up to the last one that is not dead."""
+    count = slot_count(page)
+    while count and read_slot(page, count - 1)[2] == SLOT_DEAD:
+        count -= 1
+    return count
+
+
+def live_bytes(page, skip=None):
+    """Return the bytes of tuple data used by the slots of a page buffer that are not dead.
+
+    Args:
+        page (bytes | bytearray | memoryview): The page buffer.
+        skip (int, optional): A slot left out of the total. Defaults to None.
+    """
+    used = 0
+    for slot_id, (_, length) in enumerate(
+        struct.iter_unpack(SLOT_FORMAT, page[PAGE_HEADER_SIZE : page_lower(page)])
+    ):
+        if length >> SLOT_STATE_SHIFT != SLOT_DEAD and slot_id != skip:
+            used += length & SLOT_LENGTH_MASK
+    return used
+
+
+def page_dead_space(page):
+    """Return the bytes of tuple data in a page buffer that no slot uses anymore."""
+    return PAGE_SIZE - page_upper(page) - live_bytes(page)
+
+
+def slot_room(page, slot_id):
+    """Return the largest data a slot of a page buffer can hold once the page is compacted.
+
+    Args:
+        page (bytes | bytearray | memoryview): The page buffer.
+        slot_id (int): The slot, or the slot count for a new slot.
+    """
+    lower = page_lower(page)
+    if slot_id >= slot_count(page):
+        lower += SLOT_SIZE
+    return PAGE_SIZE - lower - live_bytes(page, skip=slot_id)
+
+
+def home_slot(page, page_id, slot_id):
+    """Return (offset, length, state) of the home slot of a tuple.
+
+    Args:
+        page (bytes | bytearray | memoryview): The page buffer.
+        page_id (int): The ID of the page, for the error message.
+        slot_id (int): The slot.
+
+    Raises:
+        KeyError: If the slot holds no tuple or a tuple that moved there.
+    """
+    if 0 <= slot_id < slot_count(page):
+        offset, length, state = read_slot(page, slot_id)
+        if state in (SLOT_NORMAL, SLOT_REDIRECT):
+            return offset, length, state
+    raise KeyError(f"No tuple at page {page_id} slot {slot_id}")
+
+
+def moved_offset(page, slot_id, home_page_id, home_slot_id):
+    """Return the offset of a moved tuple's data, or None if the slot does not hold it.
+
+    Args:
+        page (bytes | bytearray | memoryview): The page buffer the tuple moved to.
+        slot_id (int): The slot the tuple moved to.
+        home_page_id (int): The home page of the tuple.
+        home_slot_id (int): The home slot of the tuple.
+    """
+    if not 0 <= slot_id < slot_count(page):
+        return None
+    offset, _, state = read_slot(page, slot_id)
+    if state != SLOT_MOVED:
+        return None
+    home = struct.unpack_from(LOCATION_FORMAT, page, offset)
+    if home != (home_page_id, home_slot_id):
+        return None
+    return offset + LOCATION_SIZE
+
+
+def page_tuples(page_id, page):
+    """Iterate over the tuples stored in a page buffer, by their home location.
+
+    Args:
+        page_id (int): The ID of the page.
+        page (bytes | bytearray | memoryview): The page buffer.
+
+    Yields:
+        tuple: (page_id, slot_id, tuple_offset, page) where page_id and slot_id are the
+            tuple location and tuple_offset is the start of its data in page.
+    """
+    slots = page[PAGE_HEADER_SIZE : page_lower(page)]
+    for slot_id, (offset, length) in enumerate(struct.iter_unpack(SLOT_FORMAT, slots)):
+        state = length >> SLOT_STATE_SHIFT
+        if state == SLOT_NORMAL:
+            yield page_id, slot_id, offset, page
+        elif state == SLOT_MOVED:
+            home_page_id, home_slot_id = struct.unpack_from(
+                LOCATION_FORMAT, page, offset
+            )
+            yield home_page_id, home_slot_id, offset + LOCATION_SIZE, page
+
+
+def tuple_rows(page_id, page):
+    """Iterate over (page, tuple_offset) of every tuple stored in a page buffer, see page_tuples."""
+    return ((page, offset) for _, _, offset, _ in page_tuples(page_id, page))
+
+
+def page_runs(first_page_id, last_page_id, page_filter=None):
+    """Split a range of pages into the runs of consecutive pages a page filter keeps.
+
+    Args:
+        first_page_id (int): First page of the range.
+        last_page_id (int): Page to stop before.
+        page_filter (Callable, optional): Returns whether to keep a page from its ID.
+            Defaults to None (the whole range is one run).
+
+    Yields:
+        tuple: (first_page_id, last_page_id) of every run, the last page excluded.
+    """
+    if page_filter is None:
+        if first_page_id < last_page_id:
+            yield first_page_id, last_page_id
+        return
+    start = None
+    for page_id in range(first_page_id, last_page_id):
+        if page_filter(page_id):
+            if start is None:
+                start = page_id
+        elif start is not None:
+            yield start, page_id
+            start = None
+    if start is not None:
+        yield start, last_page_id
+
+
+# Page of every table the running replay has changed so far, keyed by table ID
+redo_pages = {}
+
+
+def redo_record(record_type):
+    """Return the redo handler for a type of page change record.
+
+    The handlers open each table once per replay and keep it in redo_pages.
+    """
+
+    def redo(table_id, page_id, slot_id, payload, lsn):
+        page = redo_pages.get(table_id)
+        if page is None:
+            page = redo_pages[table_id] = Page(table_id)
+        page.redo(record_type, page_id, slot_id, payload, lsn)
+
+    return redo
+
+
+for record_type in (WAL_INSERT, WAL_UPDATE, WAL_DELETE, WAL_COMPACT):
+    wal.register_redo(record_type, redo_record(record_type))
+wal.register_replay_end(redo_pages.clear)
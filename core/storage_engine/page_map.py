@@ -0,0 +1,310 @@
+import lzma
+import os
+import struct
+import threading
+import zlib
+from array import array
+
+from core.constants import (
+    COMPRESSION_CODECS,
+    COMPRESSION_LEVEL,
+    COMPRESSION_LZMA,
+    COMPRESSION_ZLIB,
+    EXTENT_ALIGN,
+    PAGE_MAP_ENTRY_FORMAT,
+    PAGE_MAP_FILE_NAME,
+    PAGE_MAP_HEADER_FORMAT,
+    PAGE_MAP_VERSION,
+    PAGE_SIZE,
+)
+from core.exceptions import FileAccessError, FileNotFoundError
+from core.utils import logger
+
+from .file_manager import FileStorage
+
+PAGE_MAP_HEADER_SIZE = struct.calcsize(PAGE_MAP_HEADER_FORMAT)
+
+# codec -> (compress(data, level), decompress(data))
+CODECS = {
+    COMPRESSION_ZLIB: (zlib.compress, zlib.decompress),
+    COMPRESSION_LZMA: (
+        lambda data, level: lzma.compress(data, preset=level),
+        lzma.decompress,
+    ),
+}
+
+
+def extent_capacity(length):
+    """Return the size of the extent allocated for length stored bytes."""
+    return -(-length // EXTENT_ALIGN) * EXTENT_ALIGN
+
+
+class PageMap:
+    """Maps the pages of a compressed relation to the extents holding them.
+
+    Every page is compressed on its own and stored in an extent of the relation
+    segment files, a run of EXTENT_ALIGN byte blocks just large enough for it. Pages
+    that do not shrink are stored as they are, which the map records as a length of
+    PAGE_SIZE. The map keeps the offset and stored length of every page, in
+    pagemap.pydb next to the relation files, after a header naming the codec.
+
+    A changed page is always written to a new extent, never over the old one. The map
+    on disk is only replaced, atomically, once the extents it points to are synced, so
+    after a crash it still describes the pages as of the last checkpoint and the
+    write-ahead log is replayed on top of them. An extent the map on disk points to
+    is therefore only reused after the next save. Free extents are not stored; they
+    are the gaps between the extents in use when the map is loaded.
+    """
+
+    def __init__(self, folder, codec=None, level=COMPRESSION_LEVEL):
+        """Load the page map of a relation, or prepare a new one.
+
+        Args:
+            folder (str): The relation folder holding pagemap.pydb.
+            codec (str, optional): Codec of a new map, one of COMPRESSION_CODECS.
+                Defaults to None (the relation must already have a map).
+            level (int, optional): Compression level of a new map. Defaults to COMPRESSION_LEVEL.
+
+        Raises:
+            ValueError: If the codec or level is unknown, or differs from the one the
+                relation was created with.
+            RuntimeError: If there are unrecoverable I/O errors or the map is corrupted.
+        """
+        self.path = os.path.join(folder, PAGE_MAP_FILE_NAME)
+        self.lock = threading.RLock()
+        self.offsets = array("Q")
+        self.lengths = array("I")
+        self.free = {}  # capacity -> offsets of free extents
+        self.released = []  # (offset, capacity) of extents the map on disk may use
+        self.fresh = set()  # extents allocated since the map was last saved
+        self.data_end = 0
+        self.unsynced_paths = set()
+        self.dirty = False
+        if os.path.exists(self.path):
+            self.__load()
+            if codec is not None and (codec, level) != (self.codec, self.level):
+                raise ValueError(
+                    f"Relation in {folder} is compressed with {self.codec} level {self.level}"
+                )
+            return
+
+        if codec not in COMPRESSION_CODECS:
+            raise ValueError(
+                f"Unknown compression codec {codec!r}, expected one of {COMPRESSION_CODECS}"
+            )
+        if not 0 <= level <= 9:
+            raise ValueError(f"Compression level must be between 0 and 9, got {level}")
+        self.codec = codec
+        self.level = level
+        self.dirty = True
+
+    def __load(self):
+        logger.debug("PageMap: Loading %s", self.path)
+        try:
+            raw = FileStorage.read_data(self.path)
+            _, codec, self.level = struct.unpack_from(PAGE_MAP_HEADER_FORMAT, raw)
+            self.codec = codec.rstrip(b"\x00").decode("utf-8")
+            if self.codec not in CODECS:
+                raise struct.error(f"unknown codec {self.codec!r}")
+            entries = list(
+                struct.iter_unpack(PAGE_MAP_ENTRY_FORMAT, raw[PAGE_MAP_HEADER_SIZE:])
+            )
+        except (FileAccessError, FileNotFoundError) as e:
+            logger.error(f"Failed to read page map {self.path}: {e}")
+            raise RuntimeError(
+                f"Unrecoverable error: Failed to read page map {self.path}: {e}"
+            )
+        except struct.error as e:
+            logger.error(f"Page map {self.path} is corrupted: {e}")
+            raise RuntimeError(
+                f"Unrecoverable error: Page map {self.path} is corrupted: {e}"
+            )
+
+        self.offsets = array("Q", (offset for offset, _ in entries))
+        self.lengths = array("I", (length for _, length in entries))
+        # every gap between the extents in use is free
+        end = 0
+        for offset, length in sorted(entries):
+            if not length:
+                continue
+            if offset > end:
+                self.free.setdefault(offset - end, []).append(end)
+            end = max(end, offset + extent_capacity(length))
+        self.data_end = end
+
+    def __allocate(self, capacity):
+        """Return the offset of a free extent of capacity bytes, taking the best fit."""
+        fits = [size for size, offsets in self.free.items() if size >= capacity]
+        if not fits:
+            offset = self.data_end
+            self.data_end += capacity
+            return offset
+
+        size = min(fits)
+        offset = self.free[size].pop()
+        if not self.free[size]:
+            del self.free[size]
+        if size > capacity:
+            self.free.setdefault(size - capacity, []).append(offset + capacity)
+        return offset
+
+    def __release(self, page_id):
+        """Free the extent of a page, or hold it back if the map on disk points to it."""
+        length = self.lengths[page_id]
+        if not length:
+            return
+        offset = self.offsets[page_id]
+        if offset in self.fresh:
+            self.fresh.discard(offset)
+            self.free.setdefault(extent_capacity(length), []).append(offset)
+        else:
+            self.released.append((offset, extent_capacity(length)))
+
+    def compress(self, page):
+        """Compress a page for storage.
+
+        Args:
+            page (bytes | bytearray | memoryview): A page of PAGE_SIZE bytes.
+
+        Returns:
+            bytes: The stored form, the page itself if it does not compress.
+        """
+        data = CODECS[self.codec][0](page, self.level)
+        return data if len(data) < PAGE_SIZE else bytes(page)
+
+    def decompress(self, data):
+        """Restore a page from its stored form, see compress.
+
+        Raises:
+            RuntimeError: If the stored page is corrupted.
+        """
+        if len(data) == PAGE_SIZE:
+            return data
+        try:
+            return CODECS[self.codec][1](data)
+        except (zlib.error, lzma.LZMAError) as e:
+            logger.error(f"Compressed page in {self.path} is corrupted: {e}")
+            raise RuntimeError(
+                f"Unrecoverable error: Compressed page in {self.path} is corrupted: {e}"
+            )
+
+    def extent(self, page_id):
+        """Return (offset, stored length) of a page, with a length of 0 if it has no extent."""
+        with self.lock:
+            if page_id >= len(self.lengths):
+                return 0, 0
+            return self.offsets[page_id], self.lengths[page_id]
+
+    def assign(self, page_id, length):
+        """Allocate a new extent for a page about to be written, releasing its old one.
+
+        Args:
+            page_id (int): The ID of the page.
+            length (int): Stored length of the page.
+
+        Returns:
+            int: The offset of the new extent in the relation.
+        """
+        capacity = extent_capacity(length)
+        with self.lock:
+            if page_id >= len(self.lengths):
+                missing = page_id + 1 - len(self.lengths)
+                self.offsets.extend([0] * missing)
+                self.lengths.extend([0] * missing)
+            self.__release(page_id)
+            offset = self.__allocate(capacity)
+            self.fresh.add(offset)
+            self.offsets[page_id] = offset
+            self.lengths[page_id] = length
+            self.dirty = True
+            return offset
+
+    def track(self, path):
+        """Remember a segment file written since the map was last saved."""
+        with self.lock:
+            self.unsynced_paths.add(path)
+
+    def save(self):
+        """Sync the extents written since the last save, then replace the map on disk.
+
+        Raises:
+            RuntimeError: If there are unrecoverable I/O errors during writing.
+        """
+        with self.lock:
+            if not self.dirty:
+                return
+            logger.debug("PageMap: Saving %s", self.path)
+            header = struct.pack(
+                PAGE_MAP_HEADER_FORMAT,
+                PAGE_MAP_VERSION,
+                self.codec.encode("utf-8"),
+                self.level,
+            )
+            data = bytearray(header)
+            for offset, length in zip(self.offsets, self.lengths):
+                data += struct.pack(PAGE_MAP_ENTRY_FORMAT, offset, length)
+            try:
+                for path in self.unsynced_paths:
+                    FileStorage.sync(path)
+                FileStorage.replace_data(self.path, data)
+            except (FileAccessError, FileNotFoundError) as e:
+                logger.error(f"Failed to write page map {self.path}: {e}")
+                raise RuntimeError(
+                    f"Unrecoverable error: Failed to write page map {self.path}: {e}"
+                )
+            self.unsynced_paths = set()
+            # the map on disk no longer points to the extents released since the last save
+            for offset, capacity in self.released:
+                self.free.setdefault(capacity, []).append(offset)
+            self.released = []
+            self.fresh = set()
+            self.dirty = False
+
+
+# Page maps shared by every Relation of a compressed table, keyed by relation folder
+page_maps = {}
+page_maps_lock = threading.Lock()
+
+
+def has_page_map(folder):
+    """Return whether the relation in a folder is compressed."""
+    return folder in page_maps or os.path.exists(
+        os.path.join(folder, PAGE_MAP_FILE_NAME)
+    )
+
+
+def get_page_map(folder, codec=None, level=COMPRESSION_LEVEL):
+    """Return the shared page map of a compressed relation, loading it on first use.
+
+    Args:
+        folder (str): The relation folder.
+        codec (str, optional): Codec of a new relation. Defaults to None.
+        level (int, optional): Compression level of a new relation. Defaults to COMPRESSION_LEVEL.
+
+    Returns:
+        PageMap: The page map.
+
+    Raises:
+        ValueError: If the codec or level is unknown or differs from the stored one.
+    """
+    with page_maps_lock:
+        page_map = page_maps.get(folder)
+        if page_map is None:
+            page_map = page_maps[folder] = PageMap(folder, codec, level)
+        elif codec is not None and (codec, level) != (page_map.codec, page_map.level):
+            raise ValueError(
+                f"Relation in {folder} is compressed with {page_map.codec} level {page_map.level}"
+            )
+        return page_map
+
+
+def save_page_maps():
+    """Sync the extents of every changed page map and write the maps to disk.
+
+    Raises:
+        RuntimeError: If there are unrecoverable I/O errors during writing.
+    """
+    with page_maps_lock:
+        maps = list(page_maps.values())
+    for page_map in maps:
+        page_map.save()
@@ -0,0 +1,130 @@
+import operator
+import struct
+from datetime import datetime
+from decimal import Decimal
+
+from .binary import ENCODERS, FIXED_FORMATS, NO_NULL_BIT
+
+OPERATORS = {
+    "=": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "between": lambda value, bounds: bounds[0] <= value <= bounds[1],
+}
+
+
+def encode_value(base_type, value):
+    """Convert a value of a fixed-width column into the form stored in rows.
+
+    Datetimes keep their fraction of a second, and numbers with a fraction compared
+    with INTEGER columns are kept as they are, so comparing them with the whole values
+    stored in rows gives the same answer as comparing the decoded values.
+    """
+    if base_type == "datetime":
+        if isinstance(value, str):
+            value = datetime.fromisoformat(value)
+        return value.timestamp()
+    if base_type == "integer" and isinstance(value, (float, Decimal)) and value % 1:
+        return value
+    return ENCODERS[base_type](value)
+
+
+class Predicate:
+    """A conjunction of `(column, operator, value)` conditions on the rows of a schema.
+
+    The operator is one of OPERATORS, and the value of "between" is a (low, high) pair,
+    both included. Conditions on fixed-width columns are checked against the packed
+    row, reading the column at its offset, before the row is decoded; the value is
+    converted to the stored form once. Conditions on VARCHAR and TEXT columns are
+    checked on the decoded row. NULL never matches a condition.
+
+    Attributes:
+        conditions (tuple): The conditions as given.
+        bounds (tuple): (column, operator, stored value) of the conditions checked on
+            packed rows, see ZoneMap.may_match.
+        columns (tuple): Columns the decoded row must hold for matches.
+    """
+
+    def __init__(self, codec, where=None):
+        """Compile conditions for a schema.
+
+        Args:
+            codec (RowCodec | CompactRowCodec): The codec of the schema.
+            where (Iterable[tuple], optional): The conditions. Defaults to None (every
+                row matches).
+
+        Raises:
+            KeyError: If a column is not in the schema.
+            ValueError: If an operator is unknown or a "between" value is not a pair.
+        """
+        self.conditions = tuple(tuple(condition) for condition in where or ())
+        self.raw = []  # (struct, offset, null_bit, compare, stored value)
+        self.decoded = []  # (column, compare, value)
+        bounds = []
+        for column, op, value in self.conditions:
+            if op not in OPERATORS:
+                raise ValueError(
+                    f"Unknown operator {op!r}, expected one of {tuple(OPERATORS)}"
+                )
+            if op == "between" and len(value) != 2:
+                raise ValueError(f"between needs a (low, high) pair, got {value!r}")
+            if column not in codec.names:
+                raise KeyError(f"Unknown column '{column}'")
+            i = codec.names.index(column)
+            base_type = codec.base_types[i]
+            if base_type not in FIXED_FORMATS or codec.offsets[i] is None:
+                self.decoded.append((column, OPERATORS[op], value))
+                continue
+            if op == "between":
+                value = tuple(encode_value(base_type, bound) for bound in value)
+            else:
+                value = encode_value(base_type, value)
+            self.raw.append(
+                (
+                    struct.Struct("<" + FIXED_FORMATS[base_type]),
+                    codec.offsets[i],
+                    codec.null_bits[i],
+                    OPERATORS[op],
+                    value,
+                )
+            )
+            bounds.append((column, op, value))
+        self.bounds = tuple(bounds)
+        self.columns = tuple(dict.fromkeys(column for column, _, _ in self.decoded))
+
+    def matches_raw(self, buffer, offset=0):
+        """Check the conditions on fixed-width columns against a packed row.
+
+        Args:
+            buffer (bytes | bytearray | memoryview): Buffer holding the row.
+            offset (int, optional): Offset of the row in the buffer. Defaults to 0.
+
+        Returns:
+            bool: False if the row cannot match.
+        """
+        for field, position, null_bit, compare, value in self.raw:
+            if (
+                null_bit != NO_NULL_BIT
+                and buffer[offset + null_bit // 8] >> (null_bit % 8) & 1
+            ):
+                return False
+            if not compare(field.unpack_from(buffer, offset + position)[0], value):
+                return False
+        return True
+
+    def matches(self, row):
+        """Check the conditions on VARCHAR and TEXT columns against a decoded row.
+
+        Args:
+            row (dict): {column_name: value}, holding at least columns.
+
+        Returns:
+            bool: Whether the row matches, given it passed matches_raw.
+        """
+        for column, compare, value in self.decoded:
+            if row[column] is None or not compare(row[column], value):
+                return False
+        return True
@@ -1,18 +1,29 @@
+import mmap
 import os
-import time
-import struct
+import threading
 
 from core.constants import (
-    META_FORMAT,
+    COMPRESSION_LEVEL,
+    DATA_FOLDER,
+    DURABILITY_FSYNC,
     RELATION_FILE_VERSION,
     PAGE_SIZE,
+    RELATION_FILE_NAME_FORMAT,
     RELATION_METADATA_FILE_NAME,
+    RELATION_SEGMENT_SIZE,
+    ROW_FORMAT_COMPACT,
+    WAL_CHECKPOINT_SIZE,
 )
-from core.utils import logger
+from core.utils import logger, metrics
 
 from core.exceptions import FileAccessError, FileNotFoundError, DirectoryAccessError
 
+from .checkpoint import checkpoint
+from .durability import validate_durability
 from .file_manager import FileStorage
+from .page_map import extent_capacity, get_page_map, has_page_map
+from .relation_handle import get_relation_handle
+from .wal import wal
 
 
 class Relation:
@@ -22,34 +33,102 @@ class Relation:
     It handles file operations for relation data files and their associated metadata files.
     """
 
-    # TODO: Need to support multiple relation files
-    RELATION_FILE = "data1.pydb"
+    RELATION_FILE_NAME_FORMAT = RELATION_FILE_NAME_FORMAT
+    SEGMENT_SIZE = RELATION_SEGMENT_SIZE
 
-    def __init__(self, table_id):
+    def __init__(self, table_id, durability=DURABILITY_FSYNC, use_mmap=False):
         """Initialize a Relation instance for a specific table.
 
-        Sets up the file paths for the relation data file and metadata file based on the table ID.
+        Sets up the file paths for the relation data files and metadata file based on the table ID.
+        Page data is split over fixed-size segment files data1.pydb, data2.pydb, and so on.
 
         Args:
             table_id (str): The unique identifier for the table, used to create the folder structure.
+            durability (str, optional): How commit() makes writes durable, one of
+                DURABILITY_MODES. Defaults to DURABILITY_FSYNC.
+            use_mmap (bool, optional): Serve reads from memory mappings of the data files
+                instead of read syscalls. Defaults to False.
+
+        Raises:
+            ValueError: If the durability mode is unknown.
         """
-        self.folder = os.path.join("./data", table_id)
-        self.path = os.path.join(self.folder, self.RELATION_FILE)
+        self.table_id = table_id
+        self.folder = os.path.join(DATA_FOLDER, table_id)
+        self.path = self.segment_path(0)
         self.metadata = os.path.join(self.folder, RELATION_METADATA_FILE_NAME)
+        self.durability = validate_durability(durability)
+        self.use_mmap = use_mmap
+        self.version = RELATION_FILE_VERSION
+        self.mappings = {}
+        self.mapping_lock = threading.Lock()
+
+    def segment_path(self, segment):
+        """Return the path of a segment file.
+
+        Args:
+            segment (int): The zero-based segment number.
+
+        Returns:
+            str: The segment file path.
+        """
+        return os.path.join(
+            self.folder, self.RELATION_FILE_NAME_FORMAT.format(segment + 1)
+        )
+
+    def segment_count(self, total_pages):
+        """Return the number of segment files needed to hold a number of pages."""
+        pages_per_segment = self.SEGMENT_SIZE // PAGE_SIZE
+        return max(1, -(-total_pages // pages_per_segment))
+
+    def locate(self, offset, size):
+        """Split a byte range of the relation into pieces that each fit in one segment.
+
+        Args:
+            offset (int): The byte offset in the relation.
+            size (int): The number of bytes.
+
+        Yields:
+            tuple: (segment, offset_in_segment, piece_size) in order.
+        """
+        while size > 0:
+            segment, segment_offset = divmod(offset, self.SEGMENT_SIZE)
+            piece = min(size, self.SEGMENT_SIZE - segment_offset)
+            yield segment, segment_offset, piece
+            offset += piece
+            size -= piece
+
+    @property
+    def handle(self):
+        """The RelationHandle keeping the metadata of the relation, shared by every Relation of the table."""
+        return get_relation_handle(self)
+
+    @property
+    def row_format(self):
+        """The format of the rows in the relation, see CompactRowCodec."""
+        return ROW_FORMAT_COMPACT
 
     def create_relation(self):
         """Create a new relation by setting up the necessary folder structure and initial metadata.
 
-        This method creates the data folder for the table if it doesn't exist and initializes
-        the metadata file with default values (0 total pages, tail page ID 0).
+        This method creates the data folder and an empty first segment file for the table if
+        they don't exist and initializes the metadata file with default values (0 total pages,
+        tail page ID 0) unless the relation already exists, see RelationHandle.create. An
+        existing relation keeps the file version it was created with. Any number of
+        threads may create the same relation at once.
 
         Raises:
             RuntimeError: If there are unrecoverable I/O errors during relation creation.
+            CurrentlyNotSupported: If the relation exists with a file version this code
+                cannot read.
         """
         logger.debug("Relation: Creating a new Relation")
         try:
             FileStorage.create_folder_if_not_exists(self.folder)
-            self.write_metadata(0, 0)
+            if not os.path.exists(self.path):
+                FileStorage.write_data(self.path, b"")
+            handle = self.handle
+            handle.create()
+            self.version = handle.version
         except (DirectoryAccessError, FileAccessError, FileNotFoundError) as e:
             logger.error(f"Failed to create relation for table {self.folder}: {e}")
             raise RuntimeError(
@@ -57,14 +136,16 @@ class Relation:
             )
 
     def write_data(self, page_data, offset=0):
-        """Write binary data to the relation file at the specified offset.
+        """Write binary data to the relation at the specified offset.
 
-        This method writes binary data to the relation's data file, allowing for appending
-        or overwriting data at specific positions within the file.
+        This method writes binary data to the relation's segment files, allowing for appending
+        or overwriting data at specific positions. Data crossing a segment boundary is split
+        and segment files are created as needed. The files are synced by the next checkpoint;
+        changes are durable earlier through the write-ahead log.
 
         Args:
             page_data (bytes): The binary data to write.
-            offset (int, optional): The byte offset in the file to start writing from. Defaults to 0.
+            offset (int, optional): The byte offset in the relation to start writing from. Defaults to 0.
 
         Returns:
             None
@@ -72,21 +153,137 @@ class Relation:
         Raises:
             RuntimeError: If there are unrecoverable I/O errors during data writing.
         """
-        logger.debug(f"Relation: Writing to relation file with offset {offset}")
-        try:
-            return FileStorage.write_data(self.path, page_data, offset)
-        except (FileAccessError, FileNotFoundError) as e:
-            logger.error(f"Failed to write data to relation file {self.path}: {e}")
-            raise RuntimeError(
-                f"Unrecoverable error: Failed to write data to relation file {self.path}: {e}"
-            )
+        logger.debug("Relation: Writing to relation file with offset %s", offset)
+        view = memoryview(page_data)
+        position = 0
+        for segment, segment_offset, piece in self.locate(offset, len(view)):
+            path = self.segment_path(segment)
+            try:
+                FileStorage.write_data(
+                    path, view[position : position + piece], segment_offset, sync=False
+                )
+                wal.track(path)
+            except (FileAccessError, FileNotFoundError) as e:
+                logger.error(f"Failed to write data to relation file {path}: {e}")
+                raise RuntimeError(
+                    f"Unrecoverable error: Failed to write data to relation file {path}: {e}"
+                )
+            position += piece
+
+    def read_data(self, offset=0, size=-1):
+        """Read binary data from the relation starting at the specified offset.
+
+        Missing segment files read as empty, like the end of a file.
+
+        Args:
+            offset (int, optional): The byte offset in the relation to start reading from. Defaults to 0.
+            size (int, optional): The number of bytes to read. Defaults to -1 (rest of the relation).
+
+        Returns:
+            bytes: The data read, which may be shorter than size at the end of the relation.
+
+        Raises:
+            RuntimeError: If there are unrecoverable I/O errors during data reading.
+        """
+        logger.debug(
+            "Relation: Reading from relation file with offset %s, size %s", offset, size
+        )
+        if size <= 0:
+            total_pages = self.read_metadata()[3]
+            size = max(total_pages * PAGE_SIZE - offset, 0)
+        if self.use_mmap:
+            return bytes(self.view(offset, size))
+
+        pieces = []
+        for segment, segment_offset, piece in self.locate(offset, size):
+            path = self.segment_path(segment)
+            try:
+                data = FileStorage.read_data(path, segment_offset, piece)
+            except FileNotFoundError:
+                data = b""
+            except FileAccessError as e:
+                logger.error(f"Failed to read data from relation file {path}: {e}")
+                raise RuntimeError(
+                    f"Unrecoverable error: Failed to read data from relation file {path}: {e}"
+                )
+            pieces.append(data)
+            if len(data) < piece:
+                break
+        return pieces[0] if len(pieces) == 1 else b"".join(pieces)
+
+    def __mapping(self, segment, end):
+        """Return the mapping of a segment, mapping it again if it is shorter than end."""
+        mapping = self.mappings.get(segment)
+        if mapping is not None and len(mapping) >= end:
+            return mapping
+        with self.mapping_lock:
+            mapping = self.mappings.get(segment)
+            if mapping is None or len(mapping) < end:
+                path = self.segment_path(segment)
+                try:
+                    mapping = FileStorage.map_file(path)
+                except FileNotFoundError:
+                    mapping = None
+                except FileAccessError as e:
+                    logger.error(f"Failed to map relation file {path}: {e}")
+                    raise RuntimeError(
+                        f"Unrecoverable error: Failed to map relation file {path}: {e}"
+                    )
+                self.mappings[segment] = mapping
+            return mapping
+
+    def view(self, offset, size):
+        """Return a view of the relation through the memory mappings of its segments.
+
+        Segments are mapped on first use and mapped again when a view reaches past the
+        end of the current mapping, so views follow the files as they grow. Views taken
+        before a remap stay valid and keep the old mapping alive. A range inside one
+        segment is returned without copying; a range crossing segments is copied.
+
+        Args:
+            offset (int): The byte offset in the relation.
+            size (int): The number of bytes.
+
+        Returns:
+            memoryview: A read-only view, shorter than size at the end of the relation.
+
+        Raises:
+            RuntimeError: If there are unrecoverable I/O errors during mapping.
+        """
+        pieces = []
+        for segment, segment_offset, piece in self.locate(offset, size):
+            mapping = self.__mapping(segment, segment_offset + piece)
+            if mapping is None:
+                break
+            data = memoryview(mapping)[segment_offset : segment_offset + piece]
+            pieces.append(data)
+            if len(data) < piece:
+                break
+
+        if not pieces:
+            return memoryview(b"")
+        if len(pieces) == 1:
+            return pieces[0]
+        return memoryview(b"".join(pieces))
+
+    def advise_sequential(self):
+        """Hint the kernel that the relation files are about to be scanned sequentially."""
+        total_pages = self.read_metadata()[3]
+        for segment in range(self.segment_count(total_pages)):
+            if self.use_mmap:
+                mapping = self.__mapping(segment, PAGE_SIZE)
+                if mapping is not None and hasattr(mmap, "MADV_SEQUENTIAL"):
+                    mapping.madvise(mmap.MADV_SEQUENTIAL)
+            elif os.path.exists(self.segment_path(segment)):
+                FileStorage.advise_sequential(self.segment_path(segment))
 
     def write_metadata(self, total_pages, tail_page_id):
-        """Write metadata information for the relation to its metadata file.
+        """Set the page counts of the relation and write its metadata file.
 
         The metadata includes version, page size, segment count, total pages, tail page ID,
-        and creation timestamp. This information is packed into binary format and written
-        to the metadata file.
+        and creation timestamp. The counts are kept in memory by the RelationHandle of the
+        relation and the file is atomically replaced and synced; the creation timestamp
+        stays the one the relation was created with.
 
         Args:
             total_pages (int): The total number of pages currently in the relation.
@@ -99,35 +296,65 @@ class Relation:
             RuntimeError: If there are unrecoverable I/O errors during metadata writing.
         """
         logger.debug(
-            f"Relation: Writing relation metadata with total_pages as {total_pages} and tail_page_id as {tail_page_id}"
-        )
-        data = struct.pack(
-            META_FORMAT,
-            RELATION_FILE_VERSION,  # version
-            PAGE_SIZE,  # page_size
-            1,  # TODO: Need to update this to support multiple relation files, segment_count
-            total_pages,  # total_pages
-            tail_page_id,  # tail_page_id
-            int(time.time()),  # created_at
+            "Relation: Writing relation metadata with total_pages as %s and tail_page_id as %s",
+            total_pages,
+            tail_page_id,
         )
+        self.handle.update(total_pages, tail_page_id)
+
+    def sync(self):
+        """Sync the relation segment files to stable storage, then write the metadata.
+
+        Used by writes that bypass the write-ahead log, such as bulk inserts, after
+        pages have been allocated without writing the metadata.
+
+        Raises:
+            RuntimeError: If there are unrecoverable I/O errors during syncing.
+        """
+        logger.debug("Relation: Syncing relation files")
+        total_pages = self.read_metadata()[3]
+        # a segment whose pages are all still in the buffer pool has no file yet
+        paths = [self.segment_path(i) for i in range(self.segment_count(total_pages))]
+        paths = [path for path in paths if os.path.exists(path)]
         try:
-            return FileStorage.write_data(self.metadata, data)
+            for path in paths:
+                FileStorage.sync(path)
         except (FileAccessError, FileNotFoundError) as e:
-            logger.error(f"Failed to write metadata to {self.metadata}: {e}")
+            logger.error(f"Failed to sync relation {self.folder}: {e}")
             raise RuntimeError(
-                f"Unrecoverable error: Failed to write metadata to {self.metadata}: {e}"
+                f"Unrecoverable error: Failed to sync relation {self.folder}: {e}"
             )
+        self.handle.save()
+
+    def commit(self):
+        """Make every change logged so far durable according to the durability mode.
+
+        Only the write-ahead log is synced: with DURABILITY_FSYNC and DURABILITY_FDATASYNC
+        before returning, with DURABILITY_GROUP in one sync shared with concurrent
+        commits, and with DURABILITY_ASYNC by a background thread. A checkpoint runs once
+        the log grows past WAL_CHECKPOINT_SIZE.
+
+        Raises:
+            RuntimeError: If there are unrecoverable I/O errors during syncing.
+        """
+        logger.debug("Relation: Committing with %s", self.durability)
+        started = metrics.start()
+        wal.commit(self.durability)
+        metrics.stop("commit_seconds", started)
+        if wal.size() > WAL_CHECKPOINT_SIZE:
+            checkpoint()
 
     def read_metadata(self):
-        """Read and unpack metadata from the relation's metadata file.
+        """Return the metadata of the relation.
 
-        Retrieves the binary metadata and unpacks it into a tuple containing relation information.
+        The metadata file is read once per process, by the RelationHandle of the
+        relation, and served from memory afterwards.
 
         Returns:
             tuple: A tuple containing (version, page_size, segment_count, total_pages, tail_page_id, created_at).
                 - version (int): The file format version.
                 - page_size (int): The size of each page in bytes.
-                - segment_count (int): Number of file segments (currently fixed at 1).
+                - segment_count (int): Number of segment files holding the pages.
                 - total_pages (int): Total number of pages in the relation.
                 - tail_page_id (int): ID of the last page.
                 - created_at (int): Unix timestamp when the relation was created.
@@ -135,17 +362,205 @@ class Relation:
         Raises:
             RuntimeError: If there are unrecoverable I/O errors or metadata corruption.
         """
-        logger.debug("Relation: Reading the relation metadata")
-        try:
-            raw = FileStorage.read_data(self.metadata)
-            return struct.unpack(META_FORMAT, raw)
-        except (FileAccessError, FileNotFoundError) as e:
-            logger.error(f"Failed to read metadata from {self.metadata}: {e}")
-            raise RuntimeError(
-                f"Unrecoverable error: Failed to read metadata from {self.metadata}: {e}"
-            )
-        except struct.error as e:
-            logger.error(f"Metadata file {self.metadata} is corrupted: {e}")
-            raise RuntimeError(
-                f"Unrecoverable error: Metadata file {self.metadata} is corrupted: {e}"
+        return self.handle.metadata()
+
+
+class CompressedRelation(Relation):
+    """A relation whose pages are stored compressed on disk.
+
+    Pages are compressed one by one with the codec of the relation's PageMap and
+    stored in variable-size extents of the segment files; the map says where every
+    page is. The buffer pool and scans still read and write whole PAGE_SIZE pages
+    through read_data and write_data, which decompress and compress them, so pages are
+    cached decompressed and only the smaller extents go through file I/O. Extents of
+    consecutive pages that are next to each other on disk are read and written with
+    one call. Compressed relations cannot be memory-mapped.
+    """
+
+    def __init__(
+        self,
+        table_id,
+        durability=DURABILITY_FSYNC,
+        compression=None,
+        compression_level=COMPRESSION_LEVEL,
+    ):
+        """Initialize a compressed relation for a specific table.
+
+        Args:
+            table_id (str): The unique identifier for the table.
+            durability (str, optional): How commit() makes writes durable. Defaults to DURABILITY_FSYNC.
+            compression (str, optional): Codec of a new relation, one of COMPRESSION_CODECS.
+                Defaults to None (the relation must already be compressed).
+            compression_level (int, optional): Compression level of a new relation, 0 to 9.
+                Defaults to COMPRESSION_LEVEL.
+
+        Raises:
+            ValueError: If the durability mode, codec or level is unknown, or the codec
+                and level differ from the ones the relation was created with.
+        """
+        super().__init__(table_id, durability, use_mmap=False)
+        self.page_map = get_page_map(self.folder, compression, compression_level)
+
+    def create_relation(self):
+        """Create the relation like Relation.create_relation, and write its page map.
+
+        Raises:
+            RuntimeError: If there are unrecoverable I/O errors during relation creation.
+        """
+        super().create_relation()
+        if not os.path.exists(self.page_map.path):
+            self.page_map.save()
+
+    def __page_range(self, offset, size):
+        """Return (first_page_id, page_count) of a page-aligned byte range."""
+        if offset % PAGE_SIZE or size % PAGE_SIZE:
+            raise ValueError(
+                f"Compressed relations are accessed in whole pages, got offset {offset}, size {size}"
             )
+        return offset // PAGE_SIZE, size // PAGE_SIZE
+
+    def __write_extents(self, offset, data):
+        """Write adjacent extents with one write and remember the segments to sync."""
+        super().write_data(data, offset)
+        for segment, _, _ in self.locate(offset, len(data)):
+            self.page_map.track(self.segment_path(segment))
+
+    def write_data(self, page_data, offset=0):
+        """Compress whole pages and write each of them to a new extent.
+
+        Args:
+            page_data (bytes): One or more pages, back to back.
+            offset (int, optional): The byte offset of the first page. Defaults to 0.
+
+        Raises:
+            ValueError: If offset or the data length is not a multiple of PAGE_SIZE.
+            RuntimeError: If there are unrecoverable I/O errors during data writing.
+        """
+        logger.debug(
+            "CompressedRelation: Writing to relation file with offset %s", offset
+        )
+        view = memoryview(page_data)
+        first_page_id, count = self.__page_range(offset, len(view))
+        compressed = [
+            self.page_map.compress(view[i * PAGE_SIZE : (i + 1) * PAGE_SIZE])
+            for i in range(count)
+        ]
+
+        # a save in between must not see an extent in the map before it is written
+        with self.page_map.lock:
+            run_offset, run = 0, bytearray()
+            for i, data in enumerate(compressed):
+                extent = self.page_map.assign(first_page_id + i, len(data))
+                if run and run_offset + len(run) != extent:
+                    self.__write_extents(run_offset, run)
+                    run = bytearray()
+                if not run:
+                    run_offset = extent
+                run += data
+                run += bytes(extent_capacity(len(data)) - len(data))
+            if run:
+                self.__write_extents(run_offset, run)
+
+    def read_data(self, offset=0, size=-1):
+        """Read whole pages, decompressing them from their extents.
+
+        Pages without an extent, which were never written, read as zeros.
+
+        Args:
+            offset (int, optional): The byte offset of the first page. Defaults to 0.
+            size (int, optional): The number of bytes to read. Defaults to -1 (rest of the relation).
+
+        Returns:
+            bytes: The pages, back to back.
+
+        Raises:
+            ValueError: If offset or size is not a multiple of PAGE_SIZE.
+            RuntimeError: If there are unrecoverable I/O errors or a page is corrupted.
+        """
+        logger.debug(
+            "CompressedRelation: Reading from relation file with offset %s, size %s",
+            offset,
+            size,
+        )
+        if size <= 0:
+            total_pages = self.read_metadata()[3]
+            size = max(total_pages * PAGE_SIZE - offset, 0)
+        first_page_id, count = self.__page_range(offset, size)
+        # an extent may be reused as soon as its page moves, read it before that
+        with self.page_map.lock:
+            extents = [self.page_map.extent(first_page_id + i) for i in range(count)]
+
+            pages = []
+            i = 0
+            while i < count:
+                start, length = extents[i]
+                if not length:
+                    pages.append(bytes(PAGE_SIZE))
+                    i += 1
+                    continue
+                # read the extents of following pages with this one while they are adjacent
+                end = i + 1
+                span = extent_capacity(length)
+                while (
+                    end < count and extents[end][1] and extents[end][0] == start + span
+                ):
+                    span += extent_capacity(extents[end][1])
+                    end += 1
+                data = memoryview(super().read_data(start, span))
+                for extent_offset, length in extents[i:end]:
+                    position = extent_offset - start
+                    pages.append(
+                        self.page_map.decompress(data[position : position + length])
+                    )
+                i = end
+        return pages[0] if len(pages) == 1 else b"".join(pages)
+
+    def view(self, offset, size):
+        """Return a view of decompressed pages, see read_data. Always copies."""
+        return memoryview(self.read_data(offset, size))
+
+    def sync(self):
+        """Sync the extents written so far, then durably replace the page map and metadata.
+
+        Raises:
+            RuntimeError: If there are unrecoverable I/O errors during syncing.
+        """
+        logger.debug("CompressedRelation: Syncing relation files")
+        self.page_map.save()
+        self.handle.save()
+
+
+def open_relation(
+    table_id,
+    durability=DURABILITY_FSYNC,
+    use_mmap=False,
+    compression=None,
+    compression_level=COMPRESSION_LEVEL,
+):
+    """Return the relation of a table, compressed or not.
+
+    A relation is compressed if it was created with a codec, which is recorded in its
+    page map, so compression only needs to be given when the relation is created.
+
+    Args:
+        table_id (str): The unique identifier for the table.
+        durability (str, optional): How commit() makes writes durable. Defaults to DURABILITY_FSYNC.
+        use_mmap (bool, optional): Memory-map an uncompressed relation. Defaults to False.
+        compression (str, optional): Codec of a new relation, one of COMPRESSION_CODECS.
+            Defaults to None (not compressed, unless the relation already is).
+        compression_level (int, optional): Compression level of a new relation. Defaults to COMPRESSION_LEVEL.
+
+    Returns:
+        Relation: A Relation or CompressedRelation.
+
+    Raises:
+        ValueError: If the relation already exists with a different storage format.
+    """
+    folder = os.path.join(DATA_FOLDER, table_id)
+    if has_page_map(folder):
+        return CompressedRelation(table_id, durability, compression, compression_level)
+    if compression is None:
+        return Relation(table_id, durability, use_mmap)
+    if os.path.exists(os.path.join(folder, RELATION_METADATA_FILE_NAME)):
+        raise ValueError(f"Relation {table_id} already exists without compression")
+    return CompressedRelation(table_id, durability, compression, compression_level)
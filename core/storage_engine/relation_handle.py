@@ -0,0 +1,230 @@
+import os
+import struct
+import threading
+import time
+
+from core.constants import META_FORMAT, PAGE_SIZE, RELATION_FILE_VERSION
+from core.exceptions import CurrentlyNotSupported, FileAccessError, FileNotFoundError
+from core.utils import logger, metrics
+
+from .file_manager import FileStorage
+
+
+class RelationHandle:
+    """Keeps the metadata of a relation in memory and hands out the IDs of its new pages.
+
+    The metadata file is read once, when the handle is loaded; reads of the page counts
+    are then served from memory. Every change to the counts is made under one lock, so
+    concurrent writers never get the same page. The file is only written when a page is
+    allocated, by checkpoints and when the process exits, each time replaced atomically
+    through a temporary file so it never goes backwards or is left half written. The
+    creation time of the relation is kept as it was first written.
+
+    Recovery does not depend on the file being up to date: replaying the write-ahead
+    log extends the page counts to every logged page.
+    """
+
+    def __init__(self, relation):
+        """Load the metadata of a relation, or prepare the metadata of a new one.
+
+        Args:
+            relation (Relation): The relation. A relation without a metadata file gets
+                empty page counts and its own file version, written by create.
+
+        Raises:
+            RuntimeError: If there are unrecoverable I/O errors or metadata corruption.
+            CurrentlyNotSupported: If the relation was written with another file version.
+        """
+        self.relation = relation
+        self.path = relation.metadata
+        self.lock = threading.Lock()
+        self.dirty = False
+        if os.path.exists(self.path):
+            self.__load()
+        else:
+            self.version = relation.version
+            self.page_size = PAGE_SIZE
+            self.total_pages = 0
+            self.tail_page_id = 0
+            self.created_at = int(time.time())
+
+    def __load(self):
+        logger.debug("RelationHandle: Loading %s", self.path)
+        try:
+            started = metrics.start()
+            raw = FileStorage.read_data(self.path)
+            metrics.stop("metadata_read_seconds", started)
+            (
+                self.version,
+                self.page_size,
+                _,
+                self.total_pages,
+                self.tail_page_id,
+                self.created_at,
+            ) = struct.unpack(META_FORMAT, raw)
+        except (FileAccessError, FileNotFoundError) as e:
+            logger.error(f"Failed to read metadata from {self.path}: {e}")
+            raise RuntimeError(
+                f"Unrecoverable error: Failed to read metadata from {self.path}: {e}"
+            )
+        except struct.error as e:
+            logger.error(f"Metadata file {self.path} is corrupted: {e}")
+            raise RuntimeError(
+                f"Unrecoverable error: Metadata file {self.path} is corrupted: {e}"
+            )
+        # version 1 relations have no page LSNs, another slot format and fixed-width
+        # rows; they are not upgraded but must be reloaded into a new table
+        if self.version != RELATION_FILE_VERSION:
+            logger.error(
+                "Relation %s has unsupported file version %s", self.path, self.version
+            )
+            raise CurrentlyNotSupported(
+                f"Relation {self.path} has file version {self.version}, only version "
+                f"{RELATION_FILE_VERSION} can be read. Reload its rows into a new table"
+            )
+
+    def __write(self):
+        """Replace the metadata file with the metadata in memory."""
+        logger.debug(
+            "RelationHandle: Writing %s with total_pages as %s and tail_page_id as %s",
+            self.path,
+            self.total_pages,
+            self.tail_page_id,
+        )
+        data = struct.pack(
+            META_FORMAT,
+            self.version,  # version
+            self.page_size,  # page_size
+            self.relation.segment_count(self.total_pages),  # segment_count
+            self.total_pages,  # total_pages
+            self.tail_page_id,  # tail_page_id
+            self.created_at,  # created_at
+        )
+        try:
+            started = metrics.start()
+            FileStorage.replace_data(self.path, data)
+            metrics.stop("metadata_write_seconds", started)
+        except (FileAccessError, FileNotFoundError) as e:
+            logger.error(f"Failed to write metadata to {self.path}: {e}")
+            raise RuntimeError(
+                f"Unrecoverable error: Failed to write metadata to {self.path}: {e}"
+            )
+        self.dirty = False
+
+    def create(self):
+        """Write the metadata file of a new relation, unless it already exists.
+
+        The check and the write are made under the lock, so threads creating the same
+        relation at once write the file once and never reset the page counts of pages
+        another thread has already allocated.
+
+        Raises:
+            RuntimeError: If there are unrecoverable I/O errors during metadata writing.
+        """
+        with self.lock:
+            if not os.path.exists(self.path):
+                self.__write()
+
+    def metadata(self):
+        """Return the metadata, see Relation.read_metadata."""
+        with self.lock:
+            return (
+                self.version,
+                self.page_size,
+                self.relation.segment_count(self.total_pages),
+                self.total_pages,
+                self.tail_page_id,
+                self.created_at,
+            )
+
+    def allocate(self, persist=True):
+        """Return the ID of a new page after the tail of the relation.
+
+        Args:
+            persist (bool, optional): Write the metadata before returning. Bulk writers
+                that allocate many pages pass False and call save once. Defaults to True.
+
+        Returns:
+            int: The page ID.
+
+        Raises:
+            RuntimeError: If there are unrecoverable I/O errors during metadata writing.
+        """
+        with self.lock:
+            page_id = self.tail_page_id + 1 if self.total_pages else 0
+            self.total_pages, self.tail_page_id = page_id + 1, page_id
+            self.dirty = True
+            if persist:
+                self.__write()
+            logger.debug("RelationHandle: Allocated page %s", page_id)
+            return page_id
+
+    def extend(self, page_id):
+        """Make sure a page is counted in the relation, e.g. when it is recovered.
+
+        The metadata is written by the next save.
+
+        Args:
+            page_id (int): The page ID.
+        """
+        with self.lock:
+            if page_id >= self.total_pages:
+                self.total_pages, self.tail_page_id = page_id + 1, page_id
+                self.dirty = True
+
+    def update(self, total_pages, tail_page_id):
+        """Set the page counts and write the metadata.
+
+        Args:
+            total_pages (int): The total number of pages in the relation.
+            tail_page_id (int): The ID of the last (tail) page in the relation.
+
+        Raises:
+            RuntimeError: If there are unrecoverable I/O errors during metadata writing.
+        """
+        with self.lock:
+            self.total_pages, self.tail_page_id = total_pages, tail_page_id
+            self.__write()
+
+    def save(self):
+        """Write the metadata if it changed since it was last written.
+
+        Raises:
+            RuntimeError: If there are unrecoverable I/O errors during metadata writing.
+        """
+        with self.lock:
+            if self.dirty:
+                self.__write()
+
+
+# Relation handles shared by every Relation of a table, keyed by relation folder
+relation_handles = {}
+relation_handles_lock = threading.Lock()
+
+
+def get_relation_handle(relation):
+    """Return the shared handle of a relation, loading its metadata on first use.
+
+    Args:
+        relation (Relation): The relation.
+
+    Returns:
+        RelationHandle: The relation handle.
+    """
+    with relation_handles_lock:
+        handle = relation_handles.get(relation.folder)
+        if handle is None:
+            handle = relation_handles[relation.folder] = RelationHandle(relation)
+        return handle
+
+
+def save_relation_handles():
+    """Write the metadata of every relation changed since it was last written.
+
+    Raises:
+        RuntimeError: If there are unrecoverable I/O errors during writing.
+    """
+    with relation_handles_lock:
+        handles = list(relation_handles.values())
+    for handle in handles:
+        handle.save()
@@ -0,0 +1,174 @@
+import os
+import struct
+import threading
+
+from core.constants import (
+    COMPRESSION_LEVEL,
+    DATA_FOLDER,
+    PAGE_SIZE,
+    TOAST_FOLDER_NAME,
+    TOAST_POINTER_FORMAT,
+)
+from core.utils import logger
+
+from .page import LOCATION_FORMAT, LOCATION_SIZE, PAGE_HEADER_SIZE, SLOT_SIZE, Page
+
+NO_CHUNK = 0xFFFFFFFF
+# a chunk holds the location of the next chunk and as much data as fits in a page
+TOAST_CHUNK_SIZE = PAGE_SIZE - PAGE_HEADER_SIZE - SLOT_SIZE - 2 * LOCATION_SIZE
+
+
+class ToastStore:
+    """Stores oversized values out of line, in the toast relation of a table.
+
+    The toast relation is an ordinary relation in a folder inside the table folder,
+    created on first use. A value is split into chunks of TOAST_CHUNK_SIZE bytes that
+    each fill one of its pages, and every chunk starts with the location of the next
+    one. The main tuple keeps only a pointer to the first chunk and the value length
+    (see RowCodec.pack), so main pages stay dense and a value is read only when asked
+    for. Chunks are written and logged like any tuple, last to first so each one knows
+    where the next one is.
+    """
+
+    def __init__(
+        self,
+        table_id,
+        durability,
+        use_mmap=False,
+        compression=None,
+        compression_level=COMPRESSION_LEVEL,
+    ):
+        """Initialize the toast store of a table. The relation is opened lazily.
+
+        Args:
+            table_id (str): The table the values belong to.
+            durability (str): Durability mode of the table.
+            use_mmap (bool, optional): Read the relation through a memory mapping. Defaults to False.
+            compression (str, optional): Codec of a new toast relation. Defaults to None.
+            compression_level (int, optional): Its compression level. Defaults to COMPRESSION_LEVEL.
+        """
+        self.table_id = os.path.join(table_id, TOAST_FOLDER_NAME)
+        self.durability = durability
+        self.use_mmap = use_mmap
+        self.compression = compression
+        self.compression_level = compression_level
+        self.lock = threading.Lock()
+        self.__page = None
+
+    def __get_page(self, create=True):
+        """Return the Page of the toast relation, or None if it does not exist and create is not set."""
+        with self.lock:
+            if self.__page is None:
+                if not create and not os.path.isdir(
+                    os.path.join(DATA_FOLDER, self.table_id)
+                ):
+                    return None
+                self.__page = Page(
+                    self.table_id,
+                    self.durability,
+                    self.use_mmap,
+                    self.compression,
+                    self.compression_level,
+                )
+            return self.__page
+
+    def store(self, data):
+        """Store a value out of line.
+
+        Args:
+            data (bytes): The value.
+
+        Returns:
+            bytes: The packed pointer to the value.
+        """
+        logger.debug("ToastStore: Storing %s bytes out of line", len(data))
+        page = self.__get_page()
+        location = (NO_CHUNK, 0)
+        for start in reversed(range(0, len(data), TOAST_CHUNK_SIZE)):
+            chunk = data[start : start + TOAST_CHUNK_SIZE]
+            location = page.write_page(struct.pack(LOCATION_FORMAT, *location) + chunk)
+        return struct.pack(TOAST_POINTER_FORMAT, *location, len(data))
+
+    def fetch(self, pointer):
+        """Read a value stored out of line.
+
+        Args:
+            pointer (ToastPointer): The pointer to the value.
+
+        Returns:
+            bytes: The value.
+
+        Raises:
+            KeyError: If a chunk of the value is missing.
+        """
+        page = self.__get_page(create=False)
+        if page is None:
+            raise KeyError(f"No out-of-line value at {pointer}")
+        return read_value(page.view_tuple, pointer)
+
+    def delete(self, pointer):
+        """Delete a value stored out of line.
+
+        Args:
+            pointer (ToastPointer): The pointer to the value.
+        """
+        page = self.__get_page(create=False)
+        if page is None:
+            return
+        logger.debug("ToastStore: Deleting %s bytes stored out of line", pointer.length)
+        locations = [chunk[:2] for chunk in value_chunks(page.view_tuple, pointer)]
+        for location in locations:
+            page.delete_page(*location)
+
+    def vacuum(self):
+        """Compact the pages of the toast relation, see Page.vacuum.
+
+        Returns:
+            int: Number of bytes reclaimed.
+        """
+        page = self.__get_page(create=False)
+        return 0 if page is None else page.vacuum()
+
+    def flush(self):
+        """Write the cached changes of the toast relation to its files, see Page.flush."""
+        page = self.__get_page(create=False)
+        if page is not None:
+            page.flush()
+
+
+def value_chunks(view_tuple, pointer):
+    """Iterate over the chunks of a value stored out of line.
+
+    Args:
+        view_tuple (Callable): Returns (buffer, offset) of a tuple of the toast relation
+            from its page_id and slot_id, like Page.view_tuple.
+        pointer (ToastPointer): The pointer to the value.
+
+    Yields:
+        tuple: (page_id, slot_id, buffer, offset, size) of every chunk.
+    """
+    location = (pointer.page_id, pointer.slot_id)
+    remaining = pointer.length
+    while remaining > 0 and location[0] != NO_CHUNK:
+        buffer, offset = view_tuple(*location)
+        size = min(remaining, TOAST_CHUNK_SIZE)
+        yield (*location, buffer, offset + LOCATION_SIZE, size)
+        remaining -= size
+        location = struct.unpack_from(LOCATION_FORMAT, buffer, offset)
+
+
+def read_value(view_tuple, pointer):
+    """Read a value stored out of line, see value_chunks.
+
+    Returns:
+        bytes: The value.
+
+    Raises:
+        KeyError: If a chunk of the value is missing.
+    """
+    data = bytearray()
+    for _, _, buffer, offset, size in value_chunks(view_tuple, pointer):
+        data += buffer[offset : offset + size]
+    if len(data) != pointer.length:
+        raise KeyError(f"Out-of-line value at {pointer} is incomplete")
+    return bytes(data)
@@ -1,24 +1,248 @@
 from typing import List
 
+from core.constants import (
+    AGGREGATE_CHUNK_PAGES,
+    COMPRESSION_LEVEL,
+    DURABILITY_FSYNC,
+    INDEX_BTREE,
+    READAHEAD_PAGES,
+    SCAN_BATCH_SIZE,
+    SCAN_WORKERS,
+)
+from core.utils import metrics
+
+from .aggregate import AggregateQuery
 from .page import Page
-from .binary import pack_row, unpack_row
+from .binary import ToastPointer, get_codec
+from .columnar import ColumnBatchDecoder
+from .predicate import Predicate
+from .toast import ToastStore
 
 
 class Tuple:
-    def __init__(self, table_id):
-        self.page = Page(table_id)
+    def __init__(
+        self,
+        table_id,
+        durability=DURABILITY_FSYNC,
+        use_mmap=False,
+        compression=None,
+        compression_level=COMPRESSION_LEVEL,
+    ):
+        self.page = Page(table_id, durability, use_mmap, compression, compression_level)
+        self.toast = ToastStore(
+            table_id, durability, use_mmap, compression, compression_level
+        )
+        self.row_format = self.page.relation.row_format
+
+    def __codec(self, columns):
+        return get_codec(columns, self.row_format)
+
+    def __pack(self, codec, record):
+        started = metrics.start()
+        tuple_data = codec.pack(record, self.toast.store)
+        metrics.stop("row_encode_seconds", started)
+        return tuple_data
 
-    def read_tuple(self, page_id, slot_id, columns):
-        page_data = self.page.read_page(page_id)
-        raw_data = page_data[7]
+    def __unpack(self, codec, page, offset, names):
+        # only the projected TEXT values stored out of line are fetched
+        started = metrics.start()
+        row = codec.unpack(page, offset, names)
+        metrics.stop("row_decode_seconds", started)
+        for name in codec.text_names:
+            value = row.get(name)
+            if isinstance(value, ToastPointer):
+                row[name] = self.toast.fetch(value).decode("utf-8")
+        return row
 
-        return unpack_row(raw_data[slot_id:], columns)
+    def __toasted(self, codec, page_id, slot_id):
+        page, offset = self.page.view_tuple(page_id, slot_id)
+        values = codec.unpack(page, offset, codec.text_names).values()
+        return [value for value in values if isinstance(value, ToastPointer)]
+
+    def read_tuple(self, page_id, slot_id, columns, names=None, page=None):
+        raw_data, offset = self.page.view_tuple(page_id, slot_id, page)
+
+        return self.__unpack(self.__codec(columns), raw_data, offset, names)
 
     def write_tuple(self, record: dict, columns: List[dict]):
-        return self.page.write_page(pack_row(record, columns))
+        tuple_data = self.__pack(self.__codec(columns), record)
+        location = self.page.write_page(tuple_data)
+        self.page.relation.commit()
+        return location
+
+    def write_tuples(self, records, columns: list[dict]):
+        codec = self.__codec(columns)
+        locations = self.page.write_pages(
+            self.__pack(codec, record) for record in records
+        )
+        self.page.relation.commit()
+        return locations
+
+    def __matching(self, codec, predicate, tuples, names):
+        if not predicate.conditions:
+            for _, _, offset, page in tuples:
+                yield self.__unpack(codec, page, offset, names)
+            return
+        # the columns of conditions checked on decoded rows are decoded too
+        decoded = names
+        if names is not None:
+            decoded = tuple(dict.fromkeys((*names, *predicate.columns)))
+        for _, _, offset, page in tuples:
+            if not predicate.matches_raw(page, offset):
+                continue
+            row = self.__unpack(codec, page, offset, decoded)
+            if not predicate.matches(row):
+                continue
+            if decoded is not names:
+                row = {name: row[name] for name in names}
+            yield row
+
+    def scan(self, columns, readahead=READAHEAD_PAGES, names=None, where=None):
+        codec = self.__codec(columns)
+        predicate = Predicate(codec, where)
+        page_filter = self.page.zone_filter(predicate.bounds)
+        tuples = self.page.scan(readahead, page_filter)
+        yield from self.__matching(codec, predicate, tuples, names)
+
+    def parallel_scan(
+        self,
+        columns,
+        workers=SCAN_WORKERS,
+        readahead=READAHEAD_PAGES,
+        names=None,
+        where=None,
+    ):
+        codec = self.__codec(columns)
+        predicate = Predicate(codec, where)
+        page_filter = self.page.zone_filter(predicate.bounds)
+        tuples = self.page.parallel_scan(workers, readahead, page_filter)
+        yield from self.__matching(codec, predicate, tuples, names)
+
+    def scan_batches(
+        self,
+        columns,
+        names=None,
+        batch_size=SCAN_BATCH_SIZE,
+        readahead=READAHEAD_PAGES,
+    ):
+        decoder = ColumnBatchDecoder(self.__codec(columns), names)
+        return decoder.scan(self.page.scan_pages(readahead), batch_size)
+
+    def aggregate(self, columns, aggregates, group_by=None, where=None, parallel=True):
+        query = AggregateQuery(columns, self.row_format, aggregates, group_by, where)
+        page_filter = self.page.zone_filter(query.predicate.bounds)
+        total_pages = self.page.relation.read_metadata()[3]
+        if not parallel or total_pages <= AGGREGATE_CHUNK_PAGES:
+            pages = self.page.scan_pages(page_filter=page_filter)
+            return query.run(pages, self.toast.fetch)
+        # workers read the relation files, which must hold every change made so far
+        self.page.flush()
+        self.toast.flush()
+        return query.run_parallel(
+            self.page.relation.table_id, total_pages, page_filter=page_filter
+        )
+
+    def create_index(self, column, columns, using=INDEX_BTREE):
+        codec = self.__codec(columns)
+        if column not in codec.names:
+            raise KeyError(f"Unknown column '{column}'")
+        i = codec.names.index(column)
+        key_length = codec.lengths[i] if codec.base_types[i] == "varchar" else 8
+        return self.page.create_index(
+            column,
+            codec.key_offsets[i],
+            codec.base_types[i],
+            using,
+            key_length,
+            codec.null_bits[i],
+        )
+
+    def create_zone_map(self, column, columns):
+        codec = self.__codec(columns)
+        if column not in codec.names:
+            raise KeyError(f"Unknown column '{column}'")
+        i = codec.names.index(column)
+        self.page.create_zone_map(
+            column, codec.key_offsets[i], codec.base_types[i], codec.null_bits[i]
+        )
+
+    def create_bloom_filter(self, column, columns):
+        codec = self.__codec(columns)
+        if column not in codec.names:
+            raise KeyError(f"Unknown column '{column}'")
+        i = codec.names.index(column)
+        key_length = codec.lengths[i] if codec.base_types[i] == "varchar" else 8
+        return self.page.create_bloom_filter(
+            column,
+            codec.key_offsets[i],
+            codec.base_types[i],
+            key_length,
+            codec.null_bits[i],
+        )
+
+    def contains(self, column, value):
+        return value in self.contains_many(column, [value])
+
+    def contains_many(self, column, values):
+        bloom_filter = self.page.get_bloom_filter(column)
+        if bloom_filter is None:
+            raise KeyError(f"No Bloom filter on column '{column}'")
+        keys = {value: bloom_filter.encode(value) for value in values}
+        found = self.page.probe(column, (key for key in keys.values() if key))
+        return {value for value, key in keys.items() if key in found}
+
+    def lookup(self, column, value):
+        index = self.__get_index(column)
+        return index.search(index.encode(value))
+
+    def lookup_many(self, column, values):
+        index = self.__get_index(column)
+        keys = {value: index.encode(value) for value in values}
+        locations = index.lookup_many(keys.values())
+        return {value: locations[key] for value, key in keys.items()}
+
+    def find_tuples(self, column, value, columns, names=None):
+        codec = self.__codec(columns)
+        locations = self.lookup(column, value)
+        return [
+            self.__unpack(codec, page, offset, names)
+            for page, offset in self.page.view_tuples(locations)
+        ]
+
+    def range_tuples(self, column, low, high, columns, names=None):
+        index = self.__get_index(column)
+        low = None if low is None else index.encode(low)
+        high = None if high is None else index.encode(high)
+
+        codec = self.__codec(columns)
+        locations = (
+            (page_id, slot_id) for _, page_id, slot_id in index.range(low, high)
+        )
+        for page, offset in self.page.view_tuples(locations):
+            yield self.__unpack(codec, page, offset, names)
+
+    def __get_index(self, column):
+        index = self.page.get_index(column)
+        if index is None:
+            raise KeyError(f"No index on column '{column}'")
+        return index
+
+    def update_tuple(self, page_id, slot_id, record: dict, columns: list[dict]):
+        codec = self.__codec(columns)
+        toasted = self.__toasted(codec, page_id, slot_id)
+        self.page.update_page(page_id, slot_id, self.__pack(codec, record))
+        for pointer in toasted:
+            self.toast.delete(pointer)
+        self.page.relation.commit()
 
-    def update_tuple(self, table_id, page_id, slot_id, record: dict):
-        pass
+    def delete_tuple(self, page_id, slot_id, columns: list[dict]):
+        toasted = self.__toasted(self.__codec(columns), page_id, slot_id)
+        self.page.delete_page(page_id, slot_id)
+        for pointer in toasted:
+            self.toast.delete(pointer)
+        self.page.relation.commit()
 
-    def delete_tuple(self, table_id, page_id, slot_id):
-        pass
+    def vacuum(self):
+        reclaimed = self.page.vacuum() + self.toast.vacuum()
+        self.page.relation.commit()
+        return reclaimed
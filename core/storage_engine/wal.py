@@ -0,0 +1,388 @@
+import os
+import struct
+import threading
+import zlib
+
+from core.constants import (
+    DATA_FOLDER,
+    DURABILITY_ASYNC,
+    WAL_COMPACT,
+    WAL_DELETE,
+    WAL_FILE_NAME,
+    WAL_HEADER_FORMAT,
+    WAL_INSERT,
+    WAL_RECORD_FORMAT,
+    WAL_UPDATE,
+    WAL_VERSION,
+)
+from core.exceptions import DirectoryAccessError, FileAccessError, FileNotFoundError
+from core.utils import logger
+
+from .durability import commit_files
+from .file_manager import FileStorage
+
+WAL_HEADER_SIZE = struct.calcsize(WAL_HEADER_FORMAT)
+WAL_RECORD_SIZE = struct.calcsize(WAL_RECORD_FORMAT)
+
+
+class WriteAheadLog:
+    """A sequential log of page changes shared by every relation.
+
+    Every change is appended to the log before the page it touches is modified in the
+    buffer pool, so dirty pages can stay in memory and only the log has to be synced
+    on commit. A log sequence number (LSN) is the position just past a record; pages
+    store the LSN of the last record applied to them, which makes redo idempotent.
+
+    The log file starts with a header holding the LSN of its first byte. A checkpoint
+    writes every dirty page, syncs the data files and empties the log, moving the
+    start LSN forward.
+    """
+
+    def __init__(self, folder=DATA_FOLDER):
+        """Initialize a write-ahead log. The file is opened lazily by open().
+
+        Args:
+            folder (str, optional): Folder holding the log file. Defaults to DATA_FOLDER.
+        """
+        self.folder = folder
+        self.path = os.path.join(folder, WAL_FILE_NAME)
+        self.lock = threading.RLock()  # guards appends and checkpoints
+        self.flush_lock = threading.Lock()
+        self.opened = False
+        self.start_lsn = 0
+        self.end_lsn = 0
+        self.flushed_lsn = 0
+        self.unsynced_files = set()
+        self.redo_handlers = {}
+        self.replay_end_handlers = []
+
+    def __offset(self, lsn):
+        return WAL_HEADER_SIZE + lsn - self.start_lsn
+
+    def __write_header(self, start_lsn):
+        header = struct.pack(WAL_HEADER_FORMAT, WAL_VERSION, start_lsn)
+        FileStorage.write_data(self.path, header)
+
+    def open(self):
+        """Open the log file, creating it if it does not exist.
+
+        Returns:
+            bool: True if this call opened the log, False if it was already open.
+
+        Raises:
+            RuntimeError: If there are unrecoverable I/O errors or the header is corrupted.
+        """
+        with self.lock:
+            if self.opened:
+                return False
+
+            logger.debug("WAL: Opening write-ahead log %s", self.path)
+            try:
+                FileStorage.create_folder_if_not_exists(self.folder)
+                if not os.path.exists(self.path):
+                    self.__write_header(0)
+                raw = FileStorage.read_data(self.path, 0, WAL_HEADER_SIZE)
+                _, self.start_lsn = struct.unpack(WAL_HEADER_FORMAT, raw)
+                size = os.path.getsize(self.path)
+            except (DirectoryAccessError, FileAccessError, FileNotFoundError) as e:
+                logger.error(f"Failed to open write-ahead log {self.path}: {e}")
+                raise RuntimeError(
+                    f"Unrecoverable error: Failed to open write-ahead log {self.path}: {e}"
+                )
+            except struct.error as e:
+                logger.error(f"Write-ahead log {self.path} is corrupted: {e}")
+                raise RuntimeError(
+                    f"Unrecoverable error: Write-ahead log {self.path} is corrupted: {e}"
+                )
+
+            self.end_lsn = self.start_lsn + size - WAL_HEADER_SIZE
+            self.flushed_lsn = self.end_lsn
+            self.opened = True
+            return True
+
+    def append(self, record_type, table_id, page_id, slot, payload):
+        """Append a record to the log without syncing it.
+
+        Args:
+            record_type (int): The record type, e.g. WAL_INSERT.
+            table_id (str): The relation the change belongs to.
+            page_id (int): The page the change applies to.
+            slot (int): The slot the change applies to.
+            payload (bytes): Type specific record data.
+
+        Returns:
+            int: The LSN of the record.
+
+        Raises:
+            RuntimeError: If there are unrecoverable I/O errors during writing.
+        """
+        table = table_id.encode("utf-8")
+        length = WAL_RECORD_SIZE + len(table) + len(payload)
+        record = bytearray(
+            struct.pack(
+                WAL_RECORD_FORMAT, length, 0, record_type, page_id, slot, len(table)
+            )
+        )
+        record += table
+        record += payload
+        # the checksum covers everything after the length and checksum fields
+        struct.pack_into("<I", record, 4, zlib.crc32(memoryview(record)[8:]))
+
+        with self.lock:
+            try:
+                FileStorage.write_data(
+                    self.path, record, self.__offset(self.end_lsn), sync=False
+                )
+            except (FileAccessError, FileNotFoundError) as e:
+                logger.error(f"Failed to append to write-ahead log {self.path}: {e}")
+                raise RuntimeError(
+                    f"Unrecoverable error: Failed to append to write-ahead log {self.path}: {e}"
+                )
+            self.end_lsn += len(record)
+            return self.end_lsn
+
+    def log_insert(self, table_id, page_id, slot, tuple_data):
+        """Log a tuple insert.
+
+        Args:
+            table_id (str): The relation the tuple was inserted into.
+            page_id (int): The page holding the tuple.
+            slot (int): The slot of the tuple.
+            tuple_data (bytes): The tuple data.
+
+        Returns:
+            int: The LSN of the record.
+        """
+        return self.append(WAL_INSERT, table_id, page_id, slot, tuple_data)
+
+    def log_update(self, table_id, page_id, slot, state, data):
+        """Log new contents of a slot.
+
+        Args:
+            table_id (str): The relation the slot belongs to.
+            page_id (int): The page holding the slot.
+            slot (int): The slot.
+            state (int): The new slot state, e.g. SLOT_NORMAL.
+            data (bytes): The new data stored in the slot.
+
+        Returns:
+            int: The LSN of the record.
+        """
+        return self.append(WAL_UPDATE, table_id, page_id, slot, bytes([state]) + data)
+
+    def log_delete(self, table_id, page_id, slot):
+        """Log a tuple delete.
+
+        Args:
+            table_id (str): The relation the tuple was deleted from.
+            page_id (int): The page holding the tuple.
+            slot (int): The slot of the tuple.
+
+        Returns:
+            int: The LSN of the record.
+        """
+        return self.append(WAL_DELETE, table_id, page_id, slot, b"")
+
+    def log_compact(self, table_id, page_id):
+        """Log a page compaction.
+
+        Args:
+            table_id (str): The relation the page belongs to.
+            page_id (int): The compacted page.
+
+        Returns:
+            int: The LSN of the record.
+        """
+        return self.append(WAL_COMPACT, table_id, page_id, 0, b"")
+
+    def flush(self, lsn=None):
+        """Sync the log up to at least the given LSN.
+
+        Args:
+            lsn (int, optional): The LSN that must be durable. Defaults to None (everything).
+
+        Raises:
+            RuntimeError: If there are unrecoverable I/O errors during syncing.
+        """
+        target = self.end_lsn if lsn is None else lsn
+        if self.flushed_lsn >= target:
+            return
+
+        with self.flush_lock:
+            if self.flushed_lsn >= target:
+                return
+            end_lsn = self.end_lsn
+            try:
+                FileStorage.sync(self.path)
+            except (FileAccessError, FileNotFoundError) as e:
+                logger.error(f"Failed to sync write-ahead log {self.path}: {e}")
+                raise RuntimeError(
+                    f"Unrecoverable error: Failed to sync write-ahead log {self.path}: {e}"
+                )
+            self.flushed_lsn = max(self.flushed_lsn, end_lsn)
+
+    def commit(self, durability):
+        """Make every appended record durable according to a durability mode.
+
+        Args:
+            durability (str): One of DURABILITY_MODES.
+
+        Raises:
+            RuntimeError: If there are unrecoverable I/O errors during syncing.
+        """
+        end_lsn = self.end_lsn
+        if self.flushed_lsn >= end_lsn:
+            return
+        try:
+            commit_files([self.path], end_lsn - self.flushed_lsn, durability)
+        except (FileAccessError, FileNotFoundError) as e:
+            logger.error(f"Failed to commit write-ahead log {self.path}: {e}")
+            raise RuntimeError(
+                f"Unrecoverable error: Failed to commit write-ahead log {self.path}: {e}"
+            )
+        if durability != DURABILITY_ASYNC:
+            with self.flush_lock:
+                self.flushed_lsn = max(self.flushed_lsn, end_lsn)
+
+    def size(self):
+        """Return the number of bytes of records in the log."""
+        return self.end_lsn - self.start_lsn
+
+    def track(self, path):
+        """Remember a data file written without sync, to be synced at the next checkpoint.
+
+        Args:
+            path (str): The file path.
+        """
+        self.unsynced_files.add(path)
+
+    def sync_tracked(self):
+        """Sync every data file written since the last checkpoint.
+
+        Raises:
+            RuntimeError: If there are unrecoverable I/O errors during syncing.
+        """
+        paths, self.unsynced_files = self.unsynced_files, set()
+        for path in paths:
+            try:
+                FileStorage.sync(path)
+            except (FileAccessError, FileNotFoundError) as e:
+                logger.error(f"Failed to sync {path} during checkpoint: {e}")
+                raise RuntimeError(
+                    f"Unrecoverable error: Failed to sync {path} during checkpoint: {e}"
+                )
+
+    def reset(self):
+        """Empty the log once everything in it is reflected in the synced data files.
+
+        Raises:
+            RuntimeError: If there are unrecoverable I/O errors during truncating.
+        """
+        with self.lock:
+            logger.debug("WAL: Truncating write-ahead log at lsn %s", self.end_lsn)
+            try:
+                # truncate first, a crash in between must not leave old records
+                # behind a header that renumbers them
+                FileStorage.truncate(self.path, WAL_HEADER_SIZE)
+                self.__write_header(self.end_lsn)
+            except (FileAccessError, FileNotFoundError) as e:
+                logger.error(f"Failed to truncate write-ahead log {self.path}: {e}")
+                raise RuntimeError(
+                    f"Unrecoverable error: Failed to truncate write-ahead log {self.path}: {e}"
+                )
+            self.start_lsn = self.end_lsn
+            self.flushed_lsn = self.end_lsn
+
+    def records(self):
+        """Iterate over the valid records in the log.
+
+        Reading stops at the first incomplete or corrupted record, which is what a crash
+        in the middle of an append leaves behind; the log end is moved back to it.
+
+        Yields:
+            tuple: (lsn, record_type, table_id, page_id, slot, payload).
+        """
+        data = FileStorage.read_data(self.path)
+        offset = WAL_HEADER_SIZE
+
+        while offset + WAL_RECORD_SIZE <= len(data):
+            length, crc, record_type, page_id, slot, table_len = struct.unpack_from(
+                WAL_RECORD_FORMAT, data, offset
+            )
+            end = offset + length
+            if length < WAL_RECORD_SIZE or end > len(data):
+                break
+            if zlib.crc32(data[offset + 8 : end]) != crc:
+                break
+
+            table_end = offset + WAL_RECORD_SIZE + table_len
+            table_id = data[offset + WAL_RECORD_SIZE : table_end].decode("utf-8")
+            payload = data[table_end:end]
+            offset = end
+            yield (
+                self.start_lsn + end - WAL_HEADER_SIZE,
+                record_type,
+                table_id,
+                page_id,
+                slot,
+                payload,
+            )
+
+        if offset != len(data):
+            logger.warning(
+                "WAL: Ignoring %s bytes of torn records in %s",
+                len(data) - offset,
+                self.path,
+            )
+        self.end_lsn = self.start_lsn + offset - WAL_HEADER_SIZE
+
+    def register_redo(self, record_type, handler):
+        """Register the function that re-applies records of a type during recovery.
+
+        Args:
+            record_type (int): The record type.
+            handler (Callable): Called as handler(table_id, page_id, slot, payload, lsn).
+        """
+        self.redo_handlers[record_type] = handler
+
+    def register_replay_end(self, handler):
+        """Register a function called without arguments once a replay is over, e.g. to
+        drop state the redo handlers kept between records.
+
+        Args:
+            handler (Callable): The function.
+        """
+        self.replay_end_handlers.append(handler)
+
+    def replay(self):
+        """Re-apply every record in the log through the registered redo handlers.
+
+        Returns:
+            int: Number of records replayed.
+
+        Raises:
+            RuntimeError: If there are unrecoverable I/O errors during reading.
+        """
+        logger.debug("WAL: Replaying write-ahead log %s", self.path)
+        count = 0
+        try:
+            for lsn, record_type, table_id, page_id, slot, payload in self.records():
+                handler = self.redo_handlers.get(record_type)
+                if handler is None:
+                    logger.error(f"WAL: No redo handler for record type {record_type}")
+                    continue
+                handler(table_id, page_id, slot, payload, lsn)
+                count += 1
+        except (FileAccessError, FileNotFoundError) as e:
+            logger.error(f"Failed to read write-ahead log {self.path}: {e}")
+            raise RuntimeError(
+                f"Unrecoverable error: Failed to read write-ahead log {self.path}: {e}"
+            )
+        finally:
+            for handler in self.replay_end_handlers:
+                handler()
+        return count
+
+
+# Shared write-ahead log instance
+wal = WriteAheadLog()
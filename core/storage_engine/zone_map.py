@@ -0,0 +1,348 @@
+import os
+import struct
+import threading
+from array import array
+
+from core.constants import (
+    ZONE_MAP_COLUMN_FORMAT,
+    ZONE_MAP_FILE_NAME,
+    ZONE_MAP_HEADER_FORMAT,
+    ZONE_MAP_VERSION,
+)
+from core.exceptions import FileAccessError, FileNotFoundError
+from core.utils import logger
+
+from .binary import FIXED_FORMATS, NO_NULL_BIT
+from .file_manager import FileStorage
+
+ZONE_MAP_HEADER_SIZE = struct.calcsize(ZONE_MAP_HEADER_FORMAT)
+ZONE_MAP_COLUMN_SIZE = struct.calcsize(ZONE_MAP_COLUMN_FORMAT)
+ZONE_MAP_CLEAN_OFFSET = struct.calcsize("<H")
+# zones of pages without values, every test of may_match fails on them
+EMPTY_ZONES = {"q": (2**63 - 1, -(2**63)), "d": (float("inf"), float("-inf"))}
+# operator -> test(low, high, stored value) of whether a zone may hold a match
+ZONE_TESTS = {
+    "=": lambda low, high, value: low <= value <= high,
+    "!=": lambda low, high, value: not low == high == value,
+    "<": lambda low, high, value: low < value,
+    "<=": lambda low, high, value: low <= value,
+    ">": lambda low, high, value: high > value,
+    ">=": lambda low, high, value: high >= value,
+    "between": lambda low, high, value: low <= value[1] and high >= value[0],
+}
+
+
+class ZoneColumn:
+    """The zones of one column: the smallest and largest value in every page."""
+
+    def __init__(self, key_offset, key_type, null_bit=NO_NULL_BIT, page_count=0):
+        self.key_offset = key_offset
+        self.key_type = key_type
+        self.null_bit = null_bit
+        self.field = struct.Struct("<" + FIXED_FORMATS[key_type])
+        self.typecode = "d" if key_type == "decimal" else "q"
+        low, high = EMPTY_ZONES[self.typecode]
+        self.lows = array(self.typecode, [low]) * page_count
+        self.highs = array(self.typecode, [high]) * page_count
+
+    def value_of(self, tuple_data, offset=0):
+        """Read the column from a packed row, None if it is NULL."""
+        null_bit = self.null_bit
+        if (
+            null_bit != NO_NULL_BIT
+            and tuple_data[offset + null_bit // 8] >> (null_bit % 8) & 1
+        ):
+            return None
+        return self.field.unpack_from(tuple_data, offset + self.key_offset)[0]
+
+    def resize(self, page_count):
+        missing = page_count - len(self.lows)
+        if missing > 0:
+            low, high = EMPTY_ZONES[self.typecode]
+            self.lows.extend(array(self.typecode, [low]) * missing)
+            self.highs.extend(array(self.typecode, [high]) * missing)
+
+
+class ZoneMap:
+    """Keeps the smallest and largest value of selected columns in every page of a relation.
+
+    Scans with conditions on a column skip the pages whose zone, the range between the
+    smallest and largest value of the column in the page, cannot hold a match. A zone
+    only grows as tuples are written to its page, so it may be wider than the values
+    left after deletes and updates; vacuum recomputes the zones of the pages it
+    compacts. NULLs are not part of a zone. Only fixed-width columns have zones.
+
+    The zones of every column are kept in memory and stored in zonemap.pydb next to
+    the relation files. Like indexes, zone maps are not logged but have a clean flag,
+    cleared durably before the first change after a checkpoint and set by the next
+    checkpoint once the map is written. A map that is not clean when it is loaded may
+    be missing changes and is rebuilt from the relation.
+    """
+
+    def __init__(self, folder):
+        """Load the zone map of a relation, or prepare an empty one.
+
+        Args:
+            folder (str): The relation folder holding zonemap.pydb.
+
+        Raises:
+            RuntimeError: If there are unrecoverable I/O errors or the map is corrupted.
+        """
+        self.path = os.path.join(folder, ZONE_MAP_FILE_NAME)
+        self.lock = threading.RLock()
+        self.build_lock = threading.Lock()
+        self.columns = {}  # column -> ZoneColumn
+        self.page_count = 0
+        self.clean = False
+        self.needs_rebuild = False
+        self.dirty = False
+        if os.path.exists(self.path):
+            self.__load()
+
+    def __load(self):
+        logger.debug("ZoneMap: Loading %s", self.path)
+        try:
+            raw = FileStorage.read_data(self.path)
+            _, clean, column_count, self.page_count = struct.unpack_from(
+                ZONE_MAP_HEADER_FORMAT, raw
+            )
+            position = ZONE_MAP_HEADER_SIZE
+            for _ in range(column_count):
+                column, key_type, key_offset, null_bit = struct.unpack_from(
+                    ZONE_MAP_COLUMN_FORMAT, raw, position
+                )
+                position += ZONE_MAP_COLUMN_SIZE
+                self.columns[column.rstrip(b"\x00").decode("utf-8")] = ZoneColumn(
+                    key_offset, key_type.rstrip(b"\x00").decode("utf-8"), null_bit
+                )
+            # the zones follow the columns, lows then highs of every column
+            for zones in self.columns.values():
+                zone_format = f"<{self.page_count}{zones.typecode}"
+                for values in (zones.lows, zones.highs):
+                    values.extend(struct.unpack_from(zone_format, raw, position))
+                    position += struct.calcsize(zone_format)
+        except (FileAccessError, FileNotFoundError) as e:
+            logger.error(f"Failed to read zone map {self.path}: {e}")
+            raise RuntimeError(
+                f"Unrecoverable error: Failed to read zone map {self.path}: {e}"
+            )
+        except (struct.error, KeyError, ValueError) as e:
+            logger.error(f"Zone map {self.path} is corrupted: {e}")
+            raise RuntimeError(
+                f"Unrecoverable error: Zone map {self.path} is corrupted: {e}"
+            )
+        self.clean = bool(clean)
+        self.needs_rebuild = not self.clean
+
+    def __write(self):
+        """Replace the map on disk with the zones in memory and the current clean flag."""
+        data = bytearray(
+            struct.pack(
+                ZONE_MAP_HEADER_FORMAT,
+                ZONE_MAP_VERSION,
+                self.clean,
+                len(self.columns),
+                self.page_count,
+            )
+        )
+        for column, zones in self.columns.items():
+            data += struct.pack(
+                ZONE_MAP_COLUMN_FORMAT,
+                column.encode("utf-8"),
+                zones.key_type.encode("utf-8"),
+                zones.key_offset,
+                zones.null_bit,
+            )
+        for zones in self.columns.values():
+            zone_format = f"<{self.page_count}{zones.typecode}"
+            data += struct.pack(zone_format, *zones.lows[: self.page_count])
+            data += struct.pack(zone_format, *zones.highs[: self.page_count])
+        try:
+            FileStorage.replace_data(self.path, data)
+        except (FileAccessError, FileNotFoundError) as e:
+            logger.error(f"Failed to write zone map {self.path}: {e}")
+            raise RuntimeError(
+                f"Unrecoverable error: Failed to write zone map {self.path}: {e}"
+            )
+
+    def has(self, column):
+        """Return whether a column has zones."""
+        return column in self.columns
+
+    def add_column(self, column, key_offset, key_type, null_bit=NO_NULL_BIT):
+        """Start keeping zones for a column, filled when the map is next rebuilt.
+
+        The map is written at once, marked as changed, so the column is kept and the
+        map rebuilt if the process stops before the next checkpoint.
+
+        Args:
+            column (str): The column.
+            key_offset (int): Where the column is in a row, see the key_offsets of the row codec.
+            key_type (str): Base type of the column, a fixed-width type.
+            null_bit (int, optional): Bit of the column in the null bitmap of a row.
+                Defaults to NO_NULL_BIT.
+
+        Raises:
+            RuntimeError: If there are unrecoverable I/O errors during writing.
+        """
+        with self.lock:
+            logger.debug("ZoneMap: Adding zones for %s", column)
+            self.columns[column] = ZoneColumn(
+                key_offset, key_type, null_bit, self.page_count
+            )
+            self.clean = False
+            self.needs_rebuild = True
+            self.__write()
+
+    def begin_write(self):
+        """Durably mark the map as changed before its first change after a checkpoint.
+
+        Raises:
+            RuntimeError: If there are unrecoverable I/O errors during writing.
+        """
+        with self.lock:
+            if not self.clean:
+                return
+            logger.debug("ZoneMap: Marking %s as changed", self.path)
+            try:
+                FileStorage.write_data(self.path, b"\x00", ZONE_MAP_CLEAN_OFFSET)
+            except (FileAccessError, FileNotFoundError) as e:
+                logger.error(f"Failed to write zone map {self.path}: {e}")
+                raise RuntimeError(
+                    f"Unrecoverable error: Failed to write zone map {self.path}: {e}"
+                )
+            self.clean = False
+
+    def add(self, page_id, tuple_data, offset=0):
+        """Widen the zones of a page to hold the values of a packed row.
+
+        Args:
+            page_id (int): The page the row was written to.
+            tuple_data (bytes | bytearray | memoryview): Buffer holding the row.
+            offset (int, optional): Offset of the row in the buffer. Defaults to 0.
+        """
+        if not self.columns:
+            return
+        with self.lock:
+            self.__resize(page_id + 1)
+            for zones in self.columns.values():
+                value = zones.value_of(tuple_data, offset)
+                if value is None:
+                    continue
+                zones.lows[page_id] = min(zones.lows[page_id], value)
+                zones.highs[page_id] = max(zones.highs[page_id], value)
+            self.dirty = True
+
+    def reset(self, page_id, rows):
+        """Recompute the zones of a page from the rows it holds.
+
+        Args:
+            page_id (int): The page.
+            rows (Iterable[tuple]): (buffer, offset) of every row in the page.
+        """
+        if not self.columns:
+            return
+        zones = list(self.columns.values())
+        ranges = [EMPTY_ZONES[column.typecode] for column in zones]
+        for buffer, offset in rows:
+            for i, column in enumerate(zones):
+                value = column.value_of(buffer, offset)
+                if value is not None:
+                    low, high = ranges[i]
+                    ranges[i] = (min(low, value), max(high, value))
+        with self.lock:
+            self.__resize(page_id + 1)
+            for column, (low, high) in zip(zones, ranges):
+                column.lows[page_id] = low
+                column.highs[page_id] = high
+            self.dirty = True
+
+    def clear(self):
+        """Empty the zones of every page, before the map is rebuilt."""
+        with self.lock:
+            for zones in self.columns.values():
+                zones.lows = array(zones.typecode)
+                zones.highs = array(zones.typecode)
+            self.page_count = 0
+            self.dirty = True
+
+    def __resize(self, page_count):
+        if page_count > self.page_count:
+            self.page_count = page_count
+            for zones in self.columns.values():
+                zones.resize(page_count)
+
+    def may_match(self, page_id, bounds):
+        """Return whether a page may hold rows matching conditions on columns with zones.
+
+        Args:
+            page_id (int): The page.
+            bounds (Iterable[tuple]): (column, operator, stored value) conditions, see
+                Predicate.bounds. Conditions on columns without zones are ignored.
+
+        Returns:
+            bool: False if no row of the page can match every condition.
+        """
+        with self.lock:
+            for column, op, value in bounds:
+                zones = self.columns.get(column)
+                if zones is None:
+                    continue
+                if page_id >= self.page_count:
+                    return False
+                if not ZONE_TESTS[op](zones.lows[page_id], zones.highs[page_id], value):
+                    return False
+            return True
+
+    def save(self):
+        """Write the map to disk and mark it clean. Used by checkpoints.
+
+        Raises:
+            RuntimeError: If there are unrecoverable I/O errors during writing.
+        """
+        with self.lock:
+            if not self.columns or self.needs_rebuild:
+                return
+            if self.clean and not self.dirty:
+                return
+            logger.debug("ZoneMap: Saving %s", self.path)
+            self.clean = True
+            try:
+                self.__write()
+            except RuntimeError:
+                self.clean = False
+                raise
+            self.dirty = False
+
+
+# Zone maps shared by every Page of a relation, keyed by relation folder
+zone_maps = {}
+zone_maps_lock = threading.Lock()
+
+
+def get_zone_map(relation):
+    """Return the shared zone map of a relation, loading it on first use.
+
+    Args:
+        relation (Relation): The relation.
+
+    Returns:
+        ZoneMap: The zone map, without columns if the relation has none.
+    """
+    with zone_maps_lock:
+        zone_map = zone_maps.get(relation.folder)
+        if zone_map is None:
+            zone_map = zone_maps[relation.folder] = ZoneMap(relation.folder)
+        return zone_map
+
+
+def save_zone_maps():
+    """Write every changed zone map to disk and mark it clean.
+
+    Raises:
+        RuntimeError: If there are unrecoverable I/O errors during writing.
+    """
+    with zone_maps_lock:
+        maps = list(zone_maps.values())
+    for zone_map in maps:
+        zone_map.save()
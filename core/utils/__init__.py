@@ -1,3 +1,4 @@
 from .logger import setup_logger, logger
+from .metrics import Metrics, metrics
 
-__all__ = ["setup_logger", "logger"]
+__all__ = ["setup_logger", "logger", "Metrics", "metrics"]
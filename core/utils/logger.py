@@ -1,10 +1,19 @@
+import atexit
 import logging
 import logging.handlers
+import os
+import queue
 from pathlib import Path
 import colorama
 from colorama import Fore, Back, Style
 
 
+LOG_LEVEL_ENV = (
+    "STORAGE_ENGINE_LOG_LEVEL"  # environment variable with the default level
+)
+DEFAULT_LOG_LEVEL = "INFO"
+
+
 class ColoredFormatter(logging.Formatter):
     """Custom formatter with colors for console output."""
 
@@ -35,23 +44,34 @@ class ColoredFormatter(logging.Formatter):
         return result
 
 
-def setup_logger(name: str = "storage_engine", level: str = "DEBUG") -> logging.Logger:
+def setup_logger(
+    name: str = "storage_engine", level: str | None = None
+) -> logging.Logger:
     """
     Set up a logger with console and file handlers.
 
+    Records are put on a queue by the logger and written to the console and the log
+    file by a background thread, so logging never blocks the thread that logs. Messages
+    are formatted lazily: call the logger with a format string and its arguments, e.g.
+    logger.debug("Page: Reading page %s", page_id), so records below the level cost
+    only the level check.
+
     Args:
         name: Name of the logger
-        level: Logging level (DEBUG, INFO, WARNING, ERROR, CRITICAL)
+        level: Logging level (DEBUG, INFO, WARNING, ERROR, CRITICAL). Defaults to the
+            STORAGE_ENGINE_LOG_LEVEL environment variable, or INFO if it is not set.
 
     Returns:
         Configured logger instance
     """
+    level = (level or os.environ.get(LOG_LEVEL_ENV) or DEFAULT_LOG_LEVEL).upper()
+
     # Initialize colorama
     colorama.init()
 
     # Create logger
     logger = logging.getLogger(name)
-    logger.setLevel(getattr(logging, level.upper()))
+    logger.setLevel(getattr(logging, level))
 
     # Prevent duplicate handlers
     if logger.handlers:
@@ -68,9 +88,8 @@ def setup_logger(name: str = "storage_engine", level: str = "DEBUG") -> logging.
 
     # Console handler with colors
     console_handler = logging.StreamHandler()
-    console_handler.setLevel(getattr(logging, level.upper()))
+    console_handler.setLevel(getattr(logging, level))
     console_handler.setFormatter(console_formatter)
-    logger.addHandler(console_handler)
 
     # File handler with rotation (no colors for files)
     log_dir = Path("logs")
@@ -81,9 +100,18 @@ def setup_logger(name: str = "storage_engine", level: str = "DEBUG") -> logging.
         maxBytes=10 * 1024 * 1024,  # 10MB
         backupCount=5,
     )
-    file_handler.setLevel(getattr(logging, level.upper()))
+    file_handler.setLevel(getattr(logging, level))
     file_handler.setFormatter(file_formatter)
-    logger.addHandler(file_handler)
+
+    # Both handlers run on the listener thread, the logger only enqueues records
+    records = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(
+        records, console_handler, file_handler, respect_handler_level=True
+    )
+    logger.addHandler(logging.handlers.QueueHandler(records))
+    listener.start()
+    # registered before the storage engine's exit hooks, so it stops after them
+    atexit.register(listener.stop)
 
     return logger
 
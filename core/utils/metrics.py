@@ -0,0 +1,206 @@
+import atexit
+import os
+import threading
+from bisect import bisect_left
+from time import perf_counter
+
+METRICS_ENV = "STORAGE_ENGINE_METRICS"  # set to 1 to collect metrics from the start
+METRICS_FILE_ENV = "STORAGE_ENGINE_METRICS_FILE"  # export the metrics here at exit
+METRICS_PREFIX = "storage_engine_"
+# upper bounds in seconds of the latency histogram buckets, from 1µs to 10s
+LATENCY_BUCKETS = (
+    0.000001,
+    0.00001,
+    0.00005,
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.5,
+    1.0,
+    10.0,
+)
+
+
+class Histogram:
+    """A latency histogram with fixed buckets, like a Prometheus histogram."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # the last one is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self):
+        """Return (upper bound, observations up to it) of every bucket, ending with +Inf."""
+        total = 0
+        result = []
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+
+class Metrics:
+    """Counters and latency histograms of storage operations.
+
+    Instrumented code reports through the shared metrics instance:
+
+        started = metrics.start()
+        data = os.pread(fd, size, offset)
+        metrics.stop("file_read_seconds", started)
+        metrics.increment("file_read_bytes", len(data))
+
+    While metrics are disabled, the default unless STORAGE_ENGINE_METRICS is set, start
+    returns None and every call returns at once without reading the clock or taking a
+    lock. Metrics are kept per process: the workers of parallel aggregates report to
+    their own instance.
+
+    Metrics are exported with snapshot, or in the Prometheus text format with
+    prometheus and write_prometheus, under names prefixed with storage_engine_.
+    Counters are exported with a _total suffix. If STORAGE_ENGINE_METRICS_FILE is set,
+    the metrics are written to that file when the process exits.
+    """
+
+    def __init__(self, enabled=False):
+        """Initialize empty metrics.
+
+        Args:
+            enabled (bool, optional): Collect metrics from the start. Defaults to False.
+        """
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+
+    def enable(self):
+        """Start collecting metrics."""
+        self.enabled = True
+
+    def disable(self):
+        """Stop collecting metrics, keeping the values collected so far."""
+        self.enabled = False
+
+    def reset(self):
+        """Drop every value collected so far."""
+        with self.lock:
+            self.counters = {}
+            self.histograms = {}
+
+    def increment(self, name, value=1):
+        """Add to a counter.
+
+        Args:
+            name (str): The counter, e.g. "file_read_bytes".
+            value (int, optional): The amount to add. Defaults to 1.
+        """
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name, seconds):
+        """Add a latency to a histogram.
+
+        Args:
+            name (str): The histogram, e.g. "file_read_seconds".
+            seconds (float): The latency.
+        """
+        if not self.enabled:
+            return
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(seconds)
+
+    def start(self):
+        """Return the start time of a timed operation, None while metrics are disabled."""
+        return perf_counter() if self.enabled else None
+
+    def stop(self, name, started):
+        """Add the time since start to a histogram.
+
+        Args:
+            name (str): The histogram.
+            started (float | None): What start returned. None records nothing.
+        """
+        if started is not None:
+            self.observe(name, perf_counter() - started)
+
+    def snapshot(self):
+        """Return a copy of the values collected so far.
+
+        Returns:
+            dict: {"counters": {name: value}, "histograms": {name: {"count", "sum",
+                "buckets"}}} where buckets is a list of (upper bound, cumulative count).
+        """
+        with self.lock:
+            return {
+                "counters": dict(self.counters),
+                "histograms": {
+                    name: {
+                        "count": histogram.count,
+                        "sum": histogram.sum,
+                        "buckets": histogram.cumulative(),
+                    }
+                    for name, histogram in self.histograms.items()
+                },
+            }
+
+    def prometheus(self):
+        """Return the values collected so far in the Prometheus text exposition format.
+
+        Returns:
+            str: The metrics, one family per counter and histogram.
+        """
+        snapshot = self.snapshot()
+        lines = []
+        for name, value in sorted(snapshot["counters"].items()):
+            name = f"{METRICS_PREFIX}{name}_total"
+            lines.append(f"# TYPE {name} counter")
+            lines.append(f"{name} {value}")
+        for name, histogram in sorted(snapshot["histograms"].items()):
+            name = f"{METRICS_PREFIX}{name}"
+            lines.append(f"# TYPE {name} histogram")
+            for bound, count in histogram["buckets"]:
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'{name}_bucket{{le="{le}"}} {count}')
+            lines.append(f"{name}_sum {histogram['sum']!r}")
+            lines.append(f"{name}_count {histogram['count']}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        """Write the metrics to a file in the Prometheus text format, e.g. for the
+        textfile collector of the node exporter.
+
+        The file is replaced atomically, so a scraper never reads it half written.
+
+        Args:
+            path (str): The file path.
+
+        Raises:
+            OSError: If the file cannot be written.
+        """
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            file.write(self.prometheus())
+        os.replace(temp_path, path)
+
+
+# Shared metrics instance
+metrics = Metrics(enabled=os.environ.get(METRICS_ENV, "") not in ("", "0"))
+
+if os.environ.get(METRICS_FILE_ENV):
+    atexit.register(metrics.write_prometheus, os.environ[METRICS_FILE_ENV])
@@ -0,0 +1,36 @@
+import json
+import os
+import subprocess
+import sys
+import textwrap
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def run(tmp_path):
+    """Return a function running a Python snippet in a new process inside tmp_path.
+
+    The engine keeps its data files, write-ahead log and logs in the working directory,
+    and process-wide state such as the buffer pool, so every run starts from what is
+    on disk, as after a restart. A snippet can end the process with os._exit to crash
+    without a checkpoint. It reports back by printing one JSON value as its last line.
+    """
+
+    def run(code):
+        result = subprocess.run(
+            [sys.executable, "-c", textwrap.dedent(code)],
+            check=False,
+            cwd=tmp_path,
+            env={**os.environ, "PYTHONPATH": ROOT, "STORAGE_ENGINE_LOG_LEVEL": "INFO"},
+            capture_output=True,
+            text=True,
+            timeout=300,
+        )
+        assert result.returncode == 0, result.stderr
+        lines = result.stdout.splitlines()
+        return json.loads(lines[-1]) if lines else None, result.stderr
+
+    return run
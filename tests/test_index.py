@@ -0,0 +1,85 @@
+import pytest
+
+from core.constants import INDEX_BTREE, INDEX_HASH
+
+PREAMBLE = """
+import json
+import os
+
+from core.storage_engine import Tuple
+from core.storage_engine.index import get_indexes
+
+COLUMNS = [("id", "INTEGER"), ("code", "INTEGER"), ("name", "VARCHAR(40)")]
+table = Tuple("items")
+"""
+
+CREATE = """
+locations = table.write_tuples(
+    ({"id": i, "code": i % 50, "name": f"n{i}"} for i in range(2000)), COLUMNS
+)
+table.create_index("id", COLUMNS, USING)
+table.create_index("code", COLUMNS, USING)
+print(json.dumps(locations))
+"""
+
+# changes after the checkpoint of a clean exit, then a crash
+CHANGE = """
+locations = json.loads(os.environ["LOCATIONS"])
+for i in range(2000, 2500):
+    table.write_tuple({"id": i, "code": i % 50, "name": f"n{i}"}, COLUMNS)
+for i in range(0, 2000, 4):
+    row = {"id": i, "code": 99, "name": "u" * 40}
+    table.update_tuple(*locations[i], row, COLUMNS)
+for i in range(1, 2000, 10):
+    table.delete_tuple(*locations[i], COLUMNS)
+print(json.dumps(None), flush=True)
+os._exit(0)
+"""
+
+CHECK = """
+rebuilt = {column: index.needs_rebuild for column, index in
+           get_indexes(table.page.relation).items()}
+ids = {i: [row["name"] for row in table.find_tuples("id", i, COLUMNS)]
+       for i in range(-1, 2501)}
+codes = {code: sorted(row["id"] for row in table.find_tuples("code", code, COLUMNS))
+         for code in (0, 7, 49, 99)}
+if USING == "btree":
+    codes["48-"] = sorted(row["id"] for row in table.range_tuples("code", 48, None, COLUMNS))
+print(json.dumps([rebuilt, ids, codes]))
+"""
+
+
+def expected():
+    names = {i: f"n{i}" for i in range(2500)}
+    codes = {i: i % 50 for i in range(2500)}
+    for i in range(0, 2000, 4):
+        names[i], codes[i] = "u" * 40, 99
+    for i in range(1, 2000, 10):
+        del names[i], codes[i]
+    ids = {str(i): [names[i]] if i in names else [] for i in range(-1, 2501)}
+    by_code = {
+        str(code): sorted(i for i in codes if codes[i] == code)
+        for code in (0, 7, 49, 99)
+    }
+    by_code["48-"] = sorted(i for i in codes if codes[i] >= 48)
+    return ids, by_code
+
+
+@pytest.mark.parametrize("using", [INDEX_BTREE, INDEX_HASH])
+def test_index_rebuilt_after_unclean_shutdown(run, monkeypatch, using):
+    header = PREAMBLE + f"USING = {using!r}\n"
+    locations, _ = run(header + CREATE)
+
+    # a clean exit checkpoints the indexes, they are used as they are
+    (rebuilt, _, _), _ = run(header + CHECK)
+    assert rebuilt == {"id": False, "code": False}
+
+    monkeypatch.setenv("LOCATIONS", str(locations))
+    run(header + CHANGE)
+
+    (rebuilt, ids, codes), _ = run(header + CHECK)
+    assert rebuilt == {"id": True, "code": True}
+    expected_ids, expected_codes = expected()
+    if using == INDEX_HASH:
+        del expected_codes["48-"]
+    assert (ids, codes) == (expected_ids, expected_codes)
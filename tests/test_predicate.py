@@ -0,0 +1,46 @@
+from decimal import Decimal
+
+import pytest
+
+SCRIPT = """
+import json
+from decimal import Decimal
+
+from core.storage_engine import Tuple
+
+COLUMNS = [("id", "INTEGER"), ("price", "DECIMAL"), ("name", "VARCHAR(10)")]
+table = Tuple("items")
+table.write_tuples(
+    ({{"id": i, "price": Decimal(i) / 4, "name": f"n{{i}}"}} for i in range(2000)),
+    COLUMNS,
+)
+if {zoned}:
+    table.create_zone_map("id", COLUMNS)
+    table.create_zone_map("price", COLUMNS)
+where = {where!r}
+ids = sorted(row["id"] for row in table.scan(COLUMNS, names=["id"], where=where))
+count = table.aggregate(COLUMNS, {{"n": ("count", None)}}, where=where, parallel=False)
+print(json.dumps([ids, count["n"]]))
+"""
+
+CASES = [
+    ([("id", "<", 4.5)], list(range(5))),
+    ([("id", "<=", 4.5)], list(range(5))),
+    ([("id", ">", 1995.5)], list(range(1996, 2000))),
+    ([("id", ">=", Decimal("1995.5"))], list(range(1996, 2000))),
+    ([("id", "=", 4.9)], []),
+    ([("id", "=", 4.0)], [4]),
+    ([("id", "!=", 4.5), ("id", "<", 3)], [0, 1, 2]),
+    ([("id", "<", Decimal("2.5"))], [0, 1, 2]),
+    ([("id", "between", (2.5, Decimal("6.5")))], [3, 4, 5, 6]),
+    ([("id", "between", (-1.5, 0.5))], [0]),
+    ([("price", "<", 1.1)], [0, 1, 2, 3, 4]),
+]
+
+
+@pytest.mark.parametrize("zoned", [False, True])
+@pytest.mark.parametrize("where, expected", CASES)
+def test_bounds_with_a_fraction_on_integer_columns(run, zoned, where, expected):
+    (ids, count), _ = run(SCRIPT.format(zoned=zoned, where=where))
+    assert ids == expected
+    assert count == len(expected)
@@ -0,0 +1,66 @@
+import pytest
+
+WRITE = """
+import json
+import os
+
+from core.storage_engine import Tuple
+
+COLUMNS = [("id", "INTEGER"), ("name", "VARCHAR(40)"), ("note", "TEXT")]
+table = Tuple("items", compression={compression!r})
+locations = [
+    table.write_tuple({{"id": i, "name": f"n{{i}}", "note": "x" * (i % 7)}}, COLUMNS)
+    for i in range(500)
+]
+locations += table.write_tuples(
+    ({{"id": i, "name": f"n{{i}}", "note": None}} for i in range(500, 900)), COLUMNS
+)
+for i in range(0, 900, 3):
+    # longer rows do not fit in place and move to another page
+    row = {{"id": i, "name": "u" * 40, "note": "y" * 3000}}
+    table.update_tuple(*locations[i], row, COLUMNS)
+for i in range(1, 900, 5):
+    table.delete_tuple(*locations[i], COLUMNS)
+print(json.dumps(locations), flush=True)
+os._exit(0)  # crash: no checkpoint, dirty pages are lost
+"""
+
+READ = """
+import json
+
+from core.storage_engine import Tuple
+
+COLUMNS = [("id", "INTEGER"), ("name", "VARCHAR(40)"), ("note", "TEXT")]
+table = Tuple("items", compression={compression!r})
+rows = sorted(
+    ([row["id"], row["name"], row["note"]] for row in table.scan(COLUMNS)),
+    key=lambda row: row[0],
+)
+print(json.dumps(rows))
+"""
+
+
+def expected_rows():
+    rows = {}
+    for i in range(900):
+        if i % 3 == 0:
+            rows[i] = [i, "u" * 40, "y" * 3000]
+        else:
+            rows[i] = [i, f"n{i}", "x" * (i % 7) if i < 500 else None]
+    for i in range(1, 900, 5):
+        del rows[i]
+    return [rows[i] for i in sorted(rows)]
+
+
+@pytest.mark.parametrize("compression", [None, "zlib"])
+def test_crash_then_redo(run, compression):
+    run(WRITE.format(compression=compression))
+
+    rows, log = run(READ.format(compression=compression))
+    assert "Replayed" in log
+    assert rows == expected_rows()
+
+    # the recovered state was checkpointed, a second restart replays nothing
+    rows, log = run(READ.format(compression=compression))
+    assert "Replayed" not in log
+    assert rows == expected_rows()